@@ -0,0 +1,57 @@
+"""Add voice_jobs table
+
+Revision ID: 3f1c9a7d2b64
+Revises: ac09247fad7a
+Create Date: 2026-10-17 10:12:41.204518
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3f1c9a7d2b64'
+down_revision: Union[str, None] = 'ac09247fad7a'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('voice_jobs',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('message_sid', sa.String(), nullable=False),
+    sa.Column('media_url', sa.String(), nullable=False),
+    sa.Column('phone_number', sa.String(), nullable=False),
+    sa.Column('stage', sa.String(), nullable=True),
+    sa.Column('status', sa.String(), server_default='pending', nullable=False),
+    sa.Column('attempts', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('next_attempt_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.Column('locked_at', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('last_error', sa.Text(), nullable=True),
+    sa.Column('encrypted_transcript', sa.LargeBinary(), nullable=True),
+    sa.Column('encrypted_recipe', sa.LargeBinary(), nullable=True),
+    sa.Column('embedding', postgresql.ARRAY(sa.Float()), nullable=True),
+    sa.Column('message_id', sa.Integer(), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.ForeignKeyConstraint(['message_id'], ['messages.id'], ondelete='SET NULL'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_voice_jobs_id'), 'voice_jobs', ['id'], unique=False)
+    op.create_index(op.f('ix_voice_jobs_message_sid'), 'voice_jobs', ['message_sid'], unique=True)
+    op.create_index(op.f('ix_voice_jobs_phone_number'), 'voice_jobs', ['phone_number'], unique=False)
+    op.create_index(op.f('ix_voice_jobs_status'), 'voice_jobs', ['status'], unique=False)
+    # Workers claim with: status = 'pending' AND next_attempt_at <= now() ORDER BY next_attempt_at
+    op.create_index('ix_voice_jobs_claim', 'voice_jobs', ['status', 'next_attempt_at'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_voice_jobs_claim', table_name='voice_jobs')
+    op.drop_index(op.f('ix_voice_jobs_status'), table_name='voice_jobs')
+    op.drop_index(op.f('ix_voice_jobs_phone_number'), table_name='voice_jobs')
+    op.drop_index(op.f('ix_voice_jobs_message_sid'), table_name='voice_jobs')
+    op.drop_index(op.f('ix_voice_jobs_id'), table_name='voice_jobs')
+    op.drop_table('voice_jobs')
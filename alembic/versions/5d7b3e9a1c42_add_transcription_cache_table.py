@@ -0,0 +1,40 @@
+"""Add transcription_cache table and voice_jobs.audio_hash
+
+Revision ID: 5d7b3e9a1c42
+Revises: 8a4e2d1f6c37
+Create Date: 2026-10-17 11:40:52.118306
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5d7b3e9a1c42'
+down_revision: Union[str, None] = '8a4e2d1f6c37'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('transcription_cache',
+    sa.Column('audio_hash', sa.String(), nullable=False),
+    sa.Column('encrypted_transcript', sa.LargeBinary(), nullable=False),
+    sa.Column('encrypted_recipe', sa.LargeBinary(), nullable=False),
+    sa.Column('embedding', postgresql.ARRAY(sa.Float()), nullable=True),
+    sa.Column('hits', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.Column('last_used_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.PrimaryKeyConstraint('audio_hash')
+    )
+    op.create_index(op.f('ix_transcription_cache_last_used_at'), 'transcription_cache', ['last_used_at'], unique=False)
+    op.add_column('voice_jobs', sa.Column('audio_hash', sa.String(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('voice_jobs', 'audio_hash')
+    op.drop_index(op.f('ix_transcription_cache_last_used_at'), table_name='transcription_cache')
+    op.drop_table('transcription_cache')
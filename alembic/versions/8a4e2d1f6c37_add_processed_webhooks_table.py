@@ -0,0 +1,33 @@
+"""Add processed_webhooks table
+
+Revision ID: 8a4e2d1f6c37
+Revises: 3f1c9a7d2b64
+Create Date: 2026-10-17 11:02:15.873240
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8a4e2d1f6c37'
+down_revision: Union[str, None] = '3f1c9a7d2b64'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('processed_webhooks',
+    sa.Column('key', sa.String(), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.Column('expires_at', sa.DateTime(timezone=True), nullable=False),
+    sa.PrimaryKeyConstraint('key')
+    )
+    op.create_index(op.f('ix_processed_webhooks_expires_at'), 'processed_webhooks', ['expires_at'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_processed_webhooks_expires_at'), table_name='processed_webhooks')
+    op.drop_table('processed_webhooks')
@@ -0,0 +1,30 @@
+"""Add partial index on recipes with an embedding by user
+
+Revision ID: a3f8c5d2e917
+Revises: e9c3b6f1a4d8
+Create Date: 2026-10-17 23:48:12.604215
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a3f8c5d2e917'
+down_revision: Union[str, None] = 'e9c3b6f1a4d8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_messages_user_id_embedded', 'messages', ['user_id', 'id'],
+            unique=False, postgresql_where=sa.text('embedding IS NOT NULL'), postgresql_concurrently=True
+        )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_messages_user_id_embedded', table_name='messages')
@@ -0,0 +1,58 @@
+"""Add user_id to messages with per-user indexes
+
+Revision ID: a7c4e1b9d352
+Revises: f3a9d2c7b815
+Create Date: 2026-10-17 20:31:12.904715
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a7c4e1b9d352'
+down_revision: Union[str, None] = 'f3a9d2c7b815'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BACKFILL_BATCH_SIZE = 10000
+
+
+def upgrade() -> None:
+    op.add_column('messages', sa.Column('user_id', sa.Integer(), nullable=True))
+    op.create_foreign_key('fk_messages_user_id_users', 'messages', 'users', ['user_id'], ['id'])
+
+    # Backfill by id range, committing each batch so no long transaction holds
+    # row locks on messages while the app keeps writing
+    with op.get_context().autocommit_block():
+        connection = op.get_bind()
+        max_id = connection.execute(sa.text("SELECT coalesce(max(id), 0) FROM messages")).scalar()
+        for start in range(0, max_id, BACKFILL_BATCH_SIZE):
+            connection.execute(sa.text("""
+                UPDATE messages
+                SET user_id = users.id
+                FROM users
+                WHERE messages.phone_number = users.phone_number
+                  AND messages.user_id IS NULL
+                  AND messages.id > :start AND messages.id <= :stop
+            """), {"start": start, "stop": start + BACKFILL_BATCH_SIZE})
+
+        op.create_index(
+            'ix_messages_user_id_created_at', 'messages', ['user_id', sa.text('created_at DESC')],
+            unique=False, postgresql_include=['slug', 'is_private'], postgresql_concurrently=True
+        )
+        op.create_index(
+            'ix_messages_user_id_slug', 'messages', ['user_id', 'slug'],
+            unique=True, postgresql_concurrently=True
+        )
+    op.drop_index('ix_messages_slug', table_name='messages')
+
+
+def downgrade() -> None:
+    op.create_index('ix_messages_slug', 'messages', ['slug'], unique=True)
+    op.drop_index('ix_messages_user_id_slug', table_name='messages')
+    op.drop_index('ix_messages_user_id_created_at', table_name='messages')
+    op.drop_constraint('fk_messages_user_id_users', 'messages', type_='foreignkey')
+    op.drop_column('messages', 'user_id')
@@ -0,0 +1,26 @@
+"""Add recipe_streamed column to voice_jobs
+
+Revision ID: b2e8f4c6a913
+Revises: 5d7b3e9a1c42
+Create Date: 2026-10-17 12:21:09.551874
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b2e8f4c6a913'
+down_revision: Union[str, None] = '5d7b3e9a1c42'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('voice_jobs', sa.Column('recipe_streamed', sa.Boolean(), server_default='false', nullable=False))
+
+
+def downgrade() -> None:
+    op.drop_column('voice_jobs', 'recipe_streamed')
@@ -0,0 +1,62 @@
+"""Key slug_counters by user and base slug
+
+Revision ID: b6d2f8a4c193
+Revises: a3f8c5d2e917
+Create Date: 2026-10-18 09:12:37.548120
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b6d2f8a4c193'
+down_revision: Union[str, None] = 'a3f8c5d2e917'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# As when the table was created: a slug ending in -N may be a numbered copy of
+# its prefix or a title ending in a number, so both readings are counted;
+# overcounting only skips numbers
+EXISTING_SLUGS = """
+    SELECT coalesce(user_id, 0) AS user_id, slug AS base_slug, 0 AS number
+    FROM messages
+    WHERE slug IS NOT NULL
+    UNION ALL
+    SELECT coalesce(user_id, 0), substring(slug from '^(.*)-[0-9]{1,9}$'), substring(slug from '-([0-9]{1,9})$')::integer
+    FROM messages
+    WHERE slug ~ '.-[0-9]{1,9}$'
+"""
+
+
+def upgrade() -> None:
+    # Allocations wait for the new counters instead of reading the old ones
+    op.execute("LOCK TABLE slug_counters IN EXCLUSIVE MODE")
+    op.execute("DELETE FROM slug_counters")
+    op.drop_constraint('slug_counters_pkey', 'slug_counters', type_='primary')
+    op.add_column('slug_counters', sa.Column('user_id', sa.Integer(), nullable=False))
+    op.create_primary_key('slug_counters_pkey', 'slug_counters', ['user_id', 'base_slug'])
+    # Recipes without a user share user_id 0, as in their /yaya0 URLs
+    op.execute(f"""
+        INSERT INTO slug_counters (user_id, base_slug, last_number)
+        SELECT user_id, base_slug, max(number)
+        FROM ({EXISTING_SLUGS}) existing
+        GROUP BY user_id, base_slug
+    """)
+
+
+def downgrade() -> None:
+    op.execute("LOCK TABLE slug_counters IN EXCLUSIVE MODE")
+    op.execute("DELETE FROM slug_counters")
+    op.drop_constraint('slug_counters_pkey', 'slug_counters', type_='primary')
+    op.drop_column('slug_counters', 'user_id')
+    op.create_primary_key('slug_counters_pkey', 'slug_counters', ['base_slug'])
+    op.execute(f"""
+        INSERT INTO slug_counters (base_slug, last_number)
+        SELECT base_slug, max(number)
+        FROM ({EXISTING_SLUGS}) existing
+        GROUP BY base_slug
+    """)
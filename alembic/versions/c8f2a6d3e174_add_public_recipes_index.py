@@ -0,0 +1,30 @@
+"""Add partial index on public recipes by creation time
+
+Revision ID: c8f2a6d3e174
+Revises: a7c4e1b9d352
+Create Date: 2026-10-17 20:52:40.117382
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c8f2a6d3e174'
+down_revision: Union[str, None] = 'a7c4e1b9d352'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_messages_public_created_at', 'messages', [sa.text('created_at DESC')],
+            unique=False, postgresql_where=sa.text('is_private = false'), postgresql_concurrently=True
+        )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_messages_public_created_at', table_name='messages')
@@ -0,0 +1,84 @@
+"""Add title, description, ingredient count and section offsets to messages
+
+Revision ID: d4b7e9a2c618
+Revises: c8f2a6d3e174
+Create Date: 2026-10-17 21:14:06.582931
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+from database import fernet
+from handlers.recipe_summary import summarize_recipe
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd4b7e9a2c618'
+down_revision: Union[str, None] = 'c8f2a6d3e174'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BACKFILL_BATCH_SIZE = 500
+
+
+def upgrade() -> None:
+    op.add_column('messages', sa.Column('encrypted_title', sa.LargeBinary(), nullable=True))
+    op.add_column('messages', sa.Column('encrypted_description', sa.LargeBinary(), nullable=True))
+    op.add_column('messages', sa.Column('ingredient_count', sa.Integer(), nullable=True))
+    op.add_column('messages', sa.Column('section_offsets', postgresql.ARRAY(sa.Integer()), nullable=True))
+
+    # Each recipe is decrypted once here so listings never have to; batches are
+    # committed separately to keep row locks short
+    with op.get_context().autocommit_block():
+        connection = op.get_bind()
+        last_id = 0
+        while True:
+            rows = connection.execute(sa.text("""
+                SELECT id, encrypted_text FROM messages
+                WHERE id > :last_id AND encrypted_text IS NOT NULL
+                ORDER BY id
+                LIMIT :batch_size
+            """), {"last_id": last_id, "batch_size": BACKFILL_BATCH_SIZE}).all()
+            if not rows:
+                break
+            updates = []
+            for message_id, encrypted_text in rows:
+                summary = summarize_recipe(fernet.decrypt(bytes(encrypted_text)).decode())
+                updates.append({
+                    "id": message_id,
+                    "encrypted_title": fernet.encrypt(summary.title.encode()),
+                    "encrypted_description": fernet.encrypt(summary.description.encode()),
+                    "ingredient_count": summary.ingredient_count,
+                    "section_offsets": summary.section_offsets,
+                })
+            connection.execute(sa.text("""
+                UPDATE messages
+                SET encrypted_title = :encrypted_title,
+                    encrypted_description = :encrypted_description,
+                    ingredient_count = :ingredient_count,
+                    section_offsets = :section_offsets
+                WHERE id = :id
+            """), updates)
+            last_id = rows[-1][0]
+
+        # The listing reads the title from the index too
+        op.drop_index('ix_messages_user_id_created_at', table_name='messages', postgresql_concurrently=True)
+        op.create_index(
+            'ix_messages_user_id_created_at', 'messages', ['user_id', sa.text('created_at DESC')],
+            unique=False, postgresql_include=['slug', 'is_private', 'encrypted_title'], postgresql_concurrently=True
+        )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_messages_user_id_created_at', table_name='messages')
+    op.create_index(
+        'ix_messages_user_id_created_at', 'messages', ['user_id', sa.text('created_at DESC')],
+        unique=False, postgresql_include=['slug', 'is_private']
+    )
+    op.drop_column('messages', 'section_offsets')
+    op.drop_column('messages', 'ingredient_count')
+    op.drop_column('messages', 'encrypted_description')
+    op.drop_column('messages', 'encrypted_title')
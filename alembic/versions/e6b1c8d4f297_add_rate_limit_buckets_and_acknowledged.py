@@ -0,0 +1,33 @@
+"""Add rate_limit_buckets table and acknowledged column to voice_jobs
+
+Revision ID: e6b1c8d4f297
+Revises: b2e8f4c6a913
+Create Date: 2026-10-17 19:42:37.218406
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e6b1c8d4f297'
+down_revision: Union[str, None] = 'b2e8f4c6a913'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('rate_limit_buckets',
+    sa.Column('name', sa.String(), nullable=False),
+    sa.Column('tokens', sa.Float(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(timezone=True), nullable=False),
+    sa.PrimaryKeyConstraint('name')
+    )
+    op.add_column('voice_jobs', sa.Column('acknowledged', sa.Boolean(), server_default='false', nullable=False))
+
+
+def downgrade() -> None:
+    op.drop_column('voice_jobs', 'acknowledged')
+    op.drop_table('rate_limit_buckets')
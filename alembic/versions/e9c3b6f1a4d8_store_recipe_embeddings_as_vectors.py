@@ -0,0 +1,124 @@
+"""Store recipe embeddings as float32 bytes or pgvector vectors
+
+Revision ID: e9c3b6f1a4d8
+Revises: d4b7e9a2c618
+Create Date: 2026-10-17 23:02:41.319572
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import numpy as np
+import sqlalchemy as sa
+
+from database import EMBEDDING_DIMENSIONS, VECTOR_INDEX_METHOD, VECTOR_STORAGE_BACKEND
+from handlers.vector_storage import FLOAT32, PGVECTOR_INDEX_METHODS
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e9c3b6f1a4d8'
+down_revision: Union[str, None] = 'd4b7e9a2c618'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+CONVERSION_BATCH_SIZE = 500
+# Rows per IVFFlat list; more lists make searches faster and recall lower
+IVFFLAT_ROWS_PER_LIST = 1000
+
+
+def convert_in_batches(connection, convert):
+    """Fill embedding_new from embedding one batch of ids at a time, committing each batch."""
+    last_id = 0
+    while True:
+        ids = connection.execute(sa.text("""
+            SELECT id FROM messages
+            WHERE id > :last_id AND embedding IS NOT NULL
+            ORDER BY id
+            LIMIT :batch_size
+        """), {"last_id": last_id, "batch_size": CONVERSION_BATCH_SIZE}).scalars().all()
+        if not ids:
+            break
+        convert(connection, ids)
+        last_id = ids[-1]
+
+
+def convert_to_float32(connection, ids):
+    rows = connection.execute(
+        sa.text("SELECT id, embedding FROM messages WHERE id = ANY(:ids)"), {"ids": ids}
+    ).all()
+    connection.execute(sa.text("UPDATE messages SET embedding_new = :embedding WHERE id = :id"), [
+        {"id": message_id, "embedding": np.asarray(embedding, dtype=FLOAT32).tobytes()}
+        for message_id, embedding in rows
+    ])
+
+
+def convert_from_float32(connection, ids):
+    rows = connection.execute(
+        sa.text("SELECT id, embedding FROM messages WHERE id = ANY(:ids)"), {"ids": ids}
+    ).all()
+    connection.execute(sa.text("UPDATE messages SET embedding_new = :embedding WHERE id = :id"), [
+        {"id": message_id, "embedding": np.frombuffer(embedding, dtype=FLOAT32).tolist()}
+        for message_id, embedding in rows
+    ])
+
+
+def convert_in_sql(cast: str, dimensions: int = None):
+    # A vector column only takes embeddings of its length; others are left
+    # empty, for reembed_recipes.py --missing-only to fill
+    condition = f"array_length(embedding, 1) = {dimensions}" if dimensions else "true"
+
+    def convert(connection, ids):
+        connection.execute(sa.text(f"""
+            UPDATE messages SET embedding_new = CASE WHEN {condition} THEN embedding::{cast} END
+            WHERE id = ANY(:ids)
+        """), {"ids": ids})
+    return convert
+
+
+def replace_embedding_column():
+    op.drop_column('messages', 'embedding')
+    op.alter_column('messages', 'embedding_new', new_column_name='embedding')
+
+
+def upgrade() -> None:
+    if VECTOR_STORAGE_BACKEND == "pgvector":
+        if VECTOR_INDEX_METHOD not in PGVECTOR_INDEX_METHODS:
+            raise ValueError(f"Unknown VECTOR_INDEX_METHOD {VECTOR_INDEX_METHOD}")
+        op.execute("CREATE EXTENSION IF NOT EXISTS vector")
+        column_type = f"vector({EMBEDDING_DIMENSIONS})"
+        convert = convert_in_sql(f"real[]::{column_type}", EMBEDDING_DIMENSIONS)
+    else:
+        column_type = "bytea"
+        convert = convert_to_float32
+    # The batches are committed as they go, so a failed run may have left the column behind
+    op.execute(f"ALTER TABLE messages ADD COLUMN IF NOT EXISTS embedding_new {column_type}")
+
+    with op.get_context().autocommit_block():
+        convert_in_batches(op.get_bind(), convert)
+
+    replace_embedding_column()
+
+    if VECTOR_STORAGE_BACKEND == "pgvector":
+        with op.get_context().autocommit_block():
+            # Built after the conversion, as IVFFlat picks its lists from the rows present
+            if VECTOR_INDEX_METHOD == "ivfflat":
+                count = op.get_bind().execute(sa.text("SELECT count(*) FROM messages WHERE embedding IS NOT NULL")).scalar()
+                options = f"WITH (lists = {max(1, count // IVFFLAT_ROWS_PER_LIST)})"
+            else:
+                options = ""
+            op.execute(
+                f"CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_messages_embedding ON messages "
+                f"USING {VECTOR_INDEX_METHOD} (embedding vector_cosine_ops) {options}"
+            )
+
+
+def downgrade() -> None:
+    is_vector = op.get_bind().execute(sa.text("""
+        SELECT data_type = 'USER-DEFINED' FROM information_schema.columns
+        WHERE table_name = 'messages' AND column_name = 'embedding'
+    """)).scalar()
+    op.execute("DROP INDEX IF EXISTS ix_messages_embedding")
+    op.execute("ALTER TABLE messages ADD COLUMN IF NOT EXISTS embedding_new double precision[]")
+    with op.get_context().autocommit_block():
+        convert_in_batches(op.get_bind(), convert_in_sql("real[]::float8[]") if is_vector else convert_from_float32)
+    replace_embedding_column()
@@ -0,0 +1,65 @@
+"""Add slug_counters table and make message slugs unique
+
+Revision ID: f3a9d2c7b815
+Revises: e6b1c8d4f297
+Create Date: 2026-10-17 20:05:48.361920
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f3a9d2c7b815'
+down_revision: Union[str, None] = 'e6b1c8d4f297'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('slug_counters',
+    sa.Column('base_slug', sa.String(), nullable=False),
+    sa.Column('last_number', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('base_slug')
+    )
+
+    # Concurrent inserts could give two recipes the same slug. The oldest keeps
+    # it; the others were unreachable by URL and get their id appended
+    op.execute("""
+        UPDATE messages
+        SET slug = messages.slug || '-' || messages.id
+        FROM (
+            SELECT id, row_number() OVER (PARTITION BY slug ORDER BY id) AS position
+            FROM messages
+            WHERE slug IS NOT NULL
+        ) ranked
+        WHERE messages.id = ranked.id AND ranked.position > 1
+    """)
+    op.drop_index('ix_messages_slug', table_name='messages')
+    op.create_index('ix_messages_slug', 'messages', ['slug'], unique=True)
+
+    # Seed the counters from existing slugs. A slug ending in -N may be a
+    # numbered copy of its prefix or a title ending in a number, so both readings
+    # are counted; overcounting only skips numbers
+    op.execute("""
+        INSERT INTO slug_counters (base_slug, last_number)
+        SELECT base_slug, max(number)
+        FROM (
+            SELECT slug AS base_slug, 0 AS number
+            FROM messages
+            WHERE slug IS NOT NULL
+            UNION ALL
+            SELECT substring(slug from '^(.*)-[0-9]{1,9}$'), substring(slug from '-([0-9]{1,9})$')::integer
+            FROM messages
+            WHERE slug ~ '.-[0-9]{1,9}$'
+        ) existing
+        GROUP BY base_slug
+    """)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_messages_slug', table_name='messages')
+    op.create_index('ix_messages_slug', 'messages', ['slug'], unique=False)
+    op.drop_table('slug_counters')
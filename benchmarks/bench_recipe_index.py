@@ -0,0 +1,124 @@
+"""
+Benchmark of the user recipe index query: the full-row load that decrypted each
+recipe body for its title, versus the projection of the listing columns with
+the embedding deferred and the stored title.
+
+Needs the database from DATABASE_URL with migrations applied. A synthetic user
+with --recipes recipes, each with a random 1536-dimension embedding, is created
+and deleted afterwards. Bytes are the size of the result rows in the text
+format the driver receives them in.
+
+Run with: python -m benchmarks.bench_recipe_index [--recipes 1000] [--rounds 20]
+"""
+import argparse
+import random
+import statistics
+import time
+
+from sqlalchemy import func, select, text
+from sqlalchemy.orm import load_only, undefer
+
+from database import Message, SessionLocal, User
+
+PHONE_NUMBER = "+00bench-index"
+EMBEDDING_DIMENSIONS = 1536
+RECIPE_TEXT = """# Tortilla de patatas {number}
+
+## Ingredientes
+- 4 patatas
+- 6 huevos
+- 1 cebolla
+- Aceite de oliva
+- Sal
+
+## Preparación
+1. Pela las patatas con cuidadito y córtalas en rodajas finitas.
+2. Pocha las patatas y la cebolla en abundante aceite a fuego lento.
+3. Bate los huevos, mezcla con las patatas escurridas y cuaja la tortilla por los dos lados.
+"""
+
+
+LISTING_COLUMNS = (Message.slug, Message.encrypted_title, Message.created_at)
+
+
+def full_row_titles(db, user_id: int) -> list[str]:
+    # The listing as it was before the embedding was deferred and the title stored
+    messages = db.query(Message)\
+        .options(undefer(Message.embedding))\
+        .filter(Message.user_id == user_id)\
+        .order_by(Message.created_at.desc())
+    return [message.text.splitlines()[0].replace('# ', '') for message in messages]
+
+
+def projected_titles(db, user_id: int) -> list[str]:
+    messages = db.query(Message)\
+        .options(load_only(*LISTING_COLUMNS))\
+        .filter(Message.user_id == user_id)\
+        .order_by(Message.created_at.desc())
+    return [message.title for message in messages]
+
+
+def result_bytes(db, user_id: int, columns) -> int:
+    """Size of the listing's result rows as the driver receives them."""
+    rows = select(*columns).where(Message.user_id == user_id).subquery("listing")
+    return db.execute(select(func.sum(func.octet_length(text("listing::text")))).select_from(rows)).scalar()
+
+
+def create_user(db, recipes: int) -> int:
+    user = User(phone_number=PHONE_NUMBER)
+    db.add(user)
+    db.flush()
+    for number in range(recipes):
+        message = Message(
+            phone_number=PHONE_NUMBER,
+            user_id=user.id,
+            slug=f"tortilla-de-patatas-{number}",
+            hash=f"bench-index-{number}",
+            embedding=[random.uniform(-1, 1) for _ in range(EMBEDDING_DIMENSIONS)],
+        )
+        message.text = RECIPE_TEXT.format(number=number)
+        db.add(message)
+    db.commit()
+    return user.id
+
+
+def cleanup(db):
+    db.query(Message).filter(Message.phone_number == PHONE_NUMBER).delete()
+    db.query(User).filter(User.phone_number == PHONE_NUMBER).delete()
+    db.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--recipes", type=int, default=1000, help="Recipes of the synthetic user")
+    parser.add_argument("--rounds", type=int, default=20, help="Listings timed per method")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        cleanup(db)
+        user_id = create_user(db, args.recipes)
+        print(f"{'method':<10} {'mean ms':>9} {'rows/s':>10} {'bytes':>12} {'bytes/row':>10}")
+        for label, list_titles, columns in (
+            ("full row", full_row_titles, Message.__table__.columns),
+            ("projected", projected_titles, LISTING_COLUMNS),
+        ):
+            latencies = []
+            for _ in range(args.rounds):
+                # A fresh identity map each round, as each request gets its own session
+                db.expunge_all()
+                started = time.perf_counter()
+                titles = list_titles(db, user_id)
+                latencies.append(time.perf_counter() - started)
+            assert len(titles) == args.recipes
+            size = result_bytes(db, user_id, columns)
+            mean = statistics.mean(latencies)
+            print(f"{label:<10} {mean * 1000:9.1f} {args.recipes / mean:10.0f} {size:12d} {size // args.recipes:10d}")
+    finally:
+        db.rollback()
+        cleanup(db)
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
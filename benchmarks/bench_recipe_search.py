@@ -0,0 +1,94 @@
+"""
+Benchmark of semantic recipe search for one user as their recipes pile up:
+loading the user's embedding matrix, ranking it in memory, and a cached search
+including the freshness check against the database. The query embedding call
+to OpenAI is not included.
+
+Needs the database from DATABASE_URL with migrations applied. A synthetic user
+with random 1536-dimension embeddings is created and deleted afterwards.
+
+Run with: python -m benchmarks.bench_recipe_search [--sizes 1000,5000] [--rounds 200]
+"""
+import argparse
+import statistics
+import time
+
+import numpy as np
+
+from database import EMBEDDING_DIMENSIONS, Message, SessionLocal, User
+from handlers.recipe_search import RecipeEmbeddingIndex, unit_vector
+
+PHONE_NUMBER = "+00bench-search"
+RESULTS = 5
+
+
+def grow_to(db, user_id: int, size: int, rng: np.random.Generator):
+    """Add recipes with random embeddings until the user has size of them."""
+    current = db.query(Message).filter(Message.user_id == user_id).count()
+    for number in range(current, size):
+        db.add(Message(
+            phone_number=PHONE_NUMBER,
+            user_id=user_id,
+            slug=f"receta-{number}",
+            hash=f"bench-search-{number}",
+            is_private=number % 4 == 0,
+            embedding=rng.standard_normal(EMBEDDING_DIMENSIONS, dtype=np.float32),
+        ))
+    db.commit()
+
+
+def timed(function, rounds: int) -> list[float]:
+    latencies = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        function()
+        latencies.append(time.perf_counter() - started)
+    return sorted(latencies)
+
+
+def cleanup(db):
+    db.query(Message).filter(Message.phone_number == PHONE_NUMBER).delete()
+    db.query(User).filter(User.phone_number == PHONE_NUMBER).delete()
+    db.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", default="1000,5000", help="Comma-separated numbers of recipes")
+    parser.add_argument("--rounds", type=int, default=200, help="Searches timed per size and step")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    db = SessionLocal()
+    try:
+        cleanup(db)
+        user = User(phone_number=PHONE_NUMBER)
+        db.add(user)
+        db.commit()
+        print(f"{'recipes':>8} {'step':<8} {'mean ms':>9} {'p95 ms':>9}")
+        for size in sorted(int(value) for value in args.sizes.split(",")):
+            grow_to(db, user.id, size, rng)
+            index = RecipeEmbeddingIndex(dimensions=EMBEDDING_DIMENSIONS)
+            query = rng.standard_normal(EMBEDDING_DIMENSIONS, dtype=np.float32)
+            embeddings = index.get(db, user.id)
+            unit_query = unit_vector(query)
+            steps = (
+                ("load", lambda: index._load(db, user.id), max(1, args.rounds // 20)),
+                ("rank", lambda: embeddings.search(unit_query, RESULTS, include_private=False), args.rounds),
+                ("search", lambda: index.search(db, user.id, query, RESULTS, include_private=False), args.rounds),
+            )
+            for label, function, rounds in steps:
+                latencies = timed(function, rounds)
+                print(
+                    f"{size:>8} {label:<8} {statistics.mean(latencies) * 1000:9.3f} "
+                    f"{latencies[max(0, int(0.95 * len(latencies)) - 1)] * 1000:9.3f}"
+                )
+            db.rollback()
+    finally:
+        db.rollback()
+        cleanup(db)
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+Benchmark of recipe slug allocation as recipes sharing a title pile up: the old
+LIKE scan, which loads every matching slug and regexes out the highest suffix,
+versus the slug_counters upsert.
+
+Needs the database from DATABASE_URL with migrations applied. Rows are added
+under a dedicated phone number and base slug and deleted afterwards; each
+allocation is rolled back so the table size stays fixed per step.
+
+Run with: python -m benchmarks.bench_slug_allocation [--sizes 1000,10000,100000] [--rounds 50]
+"""
+import argparse
+import re
+import statistics
+import time
+
+from sqlalchemy import text
+
+from database import Message, SessionLocal, SlugCounter
+from handlers.slug_allocator import SlugAllocator
+
+PHONE_NUMBER = "+00bench-slugs"
+BASE_SLUG = "bench-tortilla-de-patatas"
+
+
+def legacy_allocate(db, base_slug: str) -> str:
+    # The allocation store_recipe used to do
+    existing_slugs = db.query(Message.slug).filter(Message.slug.like(f"{base_slug}%")).all()
+    if not existing_slugs:
+        return base_slug
+    max_number = 0
+    for slug in existing_slugs:
+        match = re.search(r'-(\d+)$', slug[0])
+        if match:
+            max_number = max(max_number, int(match.group(1)))
+    return f"{base_slug}-{max_number + 1}"
+
+
+def grow_to(db, size: int):
+    """Add numbered copies of BASE_SLUG until there are size of them, and sync the counter."""
+    current = db.query(Message).filter(Message.phone_number == PHONE_NUMBER).count()
+    if size > current:
+        db.execute(text("""
+            INSERT INTO messages (phone_number, slug, hash, is_private)
+            SELECT :phone_number,
+                   CASE WHEN n = 0 THEN :base_slug ELSE :base_slug || '-' || n END,
+                   md5(:phone_number || n),
+                   false
+            FROM generate_series(:start, :stop) AS n
+        """), {"phone_number": PHONE_NUMBER, "base_slug": BASE_SLUG, "start": current, "stop": size - 1})
+    db.execute(text("""
+        INSERT INTO slug_counters (user_id, base_slug, last_number) VALUES (0, :base_slug, :number)
+        ON CONFLICT (user_id, base_slug) DO UPDATE SET last_number = :number
+    """), {"base_slug": BASE_SLUG, "number": size - 1})
+    db.commit()
+
+
+def measure(db, allocate, rounds: int) -> list[float]:
+    latencies = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        allocate(db, BASE_SLUG)
+        latencies.append(time.perf_counter() - started)
+        db.rollback()
+    return sorted(latencies)
+
+
+def cleanup(db):
+    db.query(Message).filter(Message.phone_number == PHONE_NUMBER).delete()
+    db.query(SlugCounter).filter(SlugCounter.user_id == 0, SlugCounter.base_slug == BASE_SLUG).delete()
+    db.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", default="1000,10000,100000", help="Comma-separated numbers of existing copies")
+    parser.add_argument("--rounds", type=int, default=50, help="Allocations timed per size and method")
+    args = parser.parse_args()
+
+    allocator = SlugAllocator()
+    db = SessionLocal()
+    try:
+        cleanup(db)
+        print(f"{'rows':>8} {'method':<8} {'mean ms':>9} {'p95 ms':>9}")
+        for size in sorted(int(value) for value in args.sizes.split(",")):
+            grow_to(db, size)
+            for label, allocate in (("like", legacy_allocate), ("counter", lambda db, base_slug: allocator.next_slug(db, None, base_slug))):
+                latencies = measure(db, allocate, args.rounds)
+                print(
+                    f"{size:>8} {label:<8} {statistics.mean(latencies) * 1000:9.3f} "
+                    f"{latencies[int(0.95 * len(latencies)) - 1] * 1000:9.3f}"
+                )
+    finally:
+        cleanup(db)
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
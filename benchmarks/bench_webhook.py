@@ -0,0 +1,102 @@
+"""
+Benchmark of the /whatsapp webhook path: building TwilioWhatsAppHandler and its
+clients on every request (the old behaviour) versus reusing the app-scoped handler.
+
+Requests carry an invalid signature, so no Twilio, OpenAI or database I/O happens;
+what is measured is the overhead the route adds before any work starts.
+
+Run with: python -m benchmarks.bench_webhook [--requests 200]
+"""
+import argparse
+import asyncio
+import logging
+import statistics
+import time
+import tracemalloc
+from urllib.parse import urlencode
+
+from starlette.requests import Request
+from twilio.rest import Client
+
+from handlers.llm_handler import LLMHandler
+from handlers.message_sender import MessageSender
+from handlers.openai_client import create_openai_client
+from handlers.stripe_handler import StripeHandler
+from handlers.twilio_whatsapp_handler import TwilioWhatsAppHandler
+from config import TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN, OPENAI_API_KEY
+
+FORM = urlencode({
+    "From": "whatsapp:+34600000000",
+    "MessageSid": "SM00000000000000000000000000000000",
+    "Body": "hola",
+}).encode()
+
+
+def build_request() -> Request:
+    scope = {
+        "type": "http",
+        "method": "POST",
+        "scheme": "https",
+        "server": ("localhost", 443),
+        "path": "/whatsapp",
+        "query_string": b"",
+        "headers": [
+            (b"content-type", b"application/x-www-form-urlencoded"),
+            (b"x-twilio-signature", b"invalid"),
+        ],
+    }
+
+    async def receive():
+        return {"type": "http.request", "body": FORM, "more_body": False}
+
+    return Request(scope, receive)
+
+
+def build_per_request_handler() -> TwilioWhatsAppHandler:
+    # Mirrors what the route used to construct for every request
+    handler = TwilioWhatsAppHandler(
+        twilio_client=Client(TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN),
+        llm_handler=LLMHandler(api_key=OPENAI_API_KEY, client=create_openai_client()),
+        message_sender=MessageSender(TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN)
+    )
+    handler.openai_client = create_openai_client()
+    StripeHandler(twilio_handler=handler)
+    return handler
+
+
+async def run(label: str, get_handler, requests: int):
+    latencies = []
+    allocations = []
+    for _ in range(requests):
+        tracemalloc.reset_peak()
+        before, _ = tracemalloc.get_traced_memory()
+        started = time.perf_counter()
+        handler = get_handler()
+        await handler.handle_whatsapp_request(build_request(), None)
+        latencies.append(time.perf_counter() - started)
+        _, peak = tracemalloc.get_traced_memory()
+        allocations.append(peak - before)
+    latencies.sort()
+    print(
+        f"{label:<14} mean {statistics.mean(latencies) * 1000:7.3f} ms  "
+        f"p95 {latencies[int(0.95 * len(latencies)) - 1] * 1000:7.3f} ms  "
+        f"peak alloc {statistics.mean(allocations) / 1024:8.1f} KiB/request"
+    )
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=200)
+    args = parser.parse_args()
+    # Every request fails validation on purpose; don't log each one
+    logging.disable(logging.WARNING)
+
+    shared_handler = TwilioWhatsAppHandler()
+    tracemalloc.start()
+    await run("per-request", build_per_request_handler, args.requests)
+    await run("app-scoped", lambda: shared_handler, args.requests)
+    tracemalloc.stop()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
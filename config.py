@@ -10,12 +10,16 @@ STRIPE_PAYMENT_LINK = os.getenv('STRIPE_PAYMENT_LINK')
 STRIPE_CUSTOMER_PORTAL_URL = os.getenv('STRIPE_CUSTOMER_PORTAL_URL')
 STRIPE_API_KEY = os.getenv('STRIPE_API_KEY')
 STRIPE_WEBHOOK_SECRET = os.getenv('STRIPE_WEBHOOK_SECRET')
+# Point the Stripe API at another host, e.g. the fake providers in loadtest/
+STRIPE_API_BASE = os.getenv('STRIPE_API_BASE') or None
 
 
 #TWILIO
 TWILIO_ACCOUNT_SID = os.getenv('TWILIO_ACCOUNT_SID')
 TWILIO_AUTH_TOKEN = os.getenv('TWILIO_AUTH_TOKEN')
 TWILIO_WHATSAPP_NUMBER = os.getenv('TWILIO_WHATSAPP_NUMBER')
+# Point the Twilio REST API at another host, e.g. the fake providers in loadtest/
+TWILIO_API_BASE_URL = os.getenv('TWILIO_API_BASE_URL') or None
 WELCOME_MESSAGE = "¡Hola! 👋 Me gustaria guardar una receta familiar. 👩‍🍳"
 WHATSAPP_LINK = f"https://api.whatsapp.com/send/?phone={TWILIO_WHATSAPP_NUMBER.replace('whatsapp:', '').replace('+', '')}&text={WELCOME_MESSAGE.replace(' ', '%20')}&type=phone_number&app_absent=0"
 
@@ -24,6 +28,34 @@ OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
 TRANSCRIPTION_MODEL = "whisper-1"
 LLM_MODEL = "gpt-4o-mini"
 EMBEDDING_MODEL = "text-embedding-ada-002"
+OPENAI_BASE_URL = os.getenv('OPENAI_BASE_URL') or None
+OPENAI_TIMEOUT = float(os.getenv('OPENAI_TIMEOUT', '60'))
+OPENAI_TRANSCRIPTION_TIMEOUT = float(os.getenv('OPENAI_TRANSCRIPTION_TIMEOUT', '180'))
+OPENAI_CHAT_TIMEOUT = float(os.getenv('OPENAI_CHAT_TIMEOUT', '60'))
+OPENAI_EMBEDDING_TIMEOUT = float(os.getenv('OPENAI_EMBEDDING_TIMEOUT', '20'))
+EMBEDDING_BATCH_SIZE = int(os.getenv('EMBEDDING_BATCH_SIZE', '64'))
+EMBEDDING_BATCH_WINDOW = float(os.getenv('EMBEDDING_BATCH_WINDOW', '0.02'))
+OPENAI_MAX_CONNECTIONS = int(os.getenv('OPENAI_MAX_CONNECTIONS', '100'))
+OPENAI_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv('OPENAI_MAX_KEEPALIVE_CONNECTIONS', '20'))
+# Retries, circuit breaking and hedging of OpenAI calls (handlers/resilience.py)
+OPENAI_RETRY_ATTEMPTS = int(os.getenv('OPENAI_RETRY_ATTEMPTS', '3'))
+OPENAI_RETRY_BACKOFF = float(os.getenv('OPENAI_RETRY_BACKOFF', '0.5'))
+OPENAI_RETRY_BACKOFF_MAX = float(os.getenv('OPENAI_RETRY_BACKOFF_MAX', '8'))
+OPENAI_BREAKER_FAILURES = int(os.getenv('OPENAI_BREAKER_FAILURES', '5'))
+OPENAI_BREAKER_RESET_SECONDS = float(os.getenv('OPENAI_BREAKER_RESET_SECONDS', '30'))
+OPENAI_HEDGING = os.getenv('OPENAI_HEDGING', '1') == '1'
+OPENAI_HEDGE_MIN_DELAY = float(os.getenv('OPENAI_HEDGE_MIN_DELAY', '0.5'))
+OPENAI_HEDGE_MIN_SAMPLES = int(os.getenv('OPENAI_HEDGE_MIN_SAMPLES', '20'))
+# Token-bucket limits on OpenAI requests per minute (handlers/rate_limiter.py); 0 disables a limit.
+# 'database' shares the buckets across workers and nodes; 'memory' is for single-node use
+OPENAI_RATE_LIMIT_BACKEND = os.getenv('OPENAI_RATE_LIMIT_BACKEND', 'database')
+OPENAI_TRANSCRIPTION_RPM = float(os.getenv('OPENAI_TRANSCRIPTION_RPM', '50'))
+OPENAI_CHAT_RPM = float(os.getenv('OPENAI_CHAT_RPM', '500'))
+OPENAI_EMBEDDING_RPM = float(os.getenv('OPENAI_EMBEDDING_RPM', '3000'))
+# Requests that may be sent in a burst, as seconds' worth of the per-minute rate
+OPENAI_RATE_LIMIT_BURST_SECONDS = float(os.getenv('OPENAI_RATE_LIMIT_BURST_SECONDS', '10'))
+# A call throttled for longer than this fails with RateLimitExceeded; voice jobs are deferred
+OPENAI_RATE_LIMIT_MAX_WAIT = float(os.getenv('OPENAI_RATE_LIMIT_MAX_WAIT', '60'))
 LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
 
 MAX_WHATSAPP_MESSAGE_LENGTH = 1500
@@ -31,5 +63,86 @@ ADMIN_PHONE_NUMBER = os.getenv('ADMIN_PHONE_NUMBER')
 
 VERIFICATION_TEMPLATE_SID = "HXcd4f6126f23f0e113c4fba5afc68f4a2"
 
+# Long voice notes are split at silences and the chunks transcribed in parallel
+TRANSCRIPTION_CHUNKING = os.getenv('TRANSCRIPTION_CHUNKING', '1') == '1'
+TRANSCRIPTION_CHUNKING_THRESHOLD_SECONDS = float(os.getenv('TRANSCRIPTION_CHUNKING_THRESHOLD_SECONDS', '180'))
+TRANSCRIPTION_CHUNK_SECONDS = float(os.getenv('TRANSCRIPTION_CHUNK_SECONDS', '120'))
+TRANSCRIPTION_CHUNK_OVERLAP_SECONDS = float(os.getenv('TRANSCRIPTION_CHUNK_OVERLAP_SECONDS', '2'))
+TRANSCRIPTION_CHUNK_CONCURRENCY = int(os.getenv('TRANSCRIPTION_CHUNK_CONCURRENCY', '8'))
+# Whisper rejects uploads over 25 MB
+TRANSCRIPTION_MAX_UPLOAD_BYTES = int(os.getenv('TRANSCRIPTION_MAX_UPLOAD_BYTES', str(24 * 1024 * 1024)))
+
+# Trim silences and re-encode voice notes as mono 16 kHz Opus before transcribing (needs ffmpeg)
+AUDIO_PREPROCESSING = os.getenv('AUDIO_PREPROCESSING', '1') == '1'
+AUDIO_SILENCE_THRESHOLD_DB = float(os.getenv('AUDIO_SILENCE_THRESHOLD_DB', '-40'))
+AUDIO_SILENCE_MIN_SECONDS = float(os.getenv('AUDIO_SILENCE_MIN_SECONDS', '1.0'))
+AUDIO_PREPROCESS_BITRATE = os.getenv('AUDIO_PREPROCESS_BITRATE', '24k')
+
+# Structuring long transcripts: above the threshold the transcript is structured
+# in fragments in parallel and the partial recipes merged in a second call
+RECIPE_MAX_TOKENS = int(os.getenv('RECIPE_MAX_TOKENS', '1500'))
+RECIPE_MAP_REDUCE_THRESHOLD_TOKENS = int(os.getenv('RECIPE_MAP_REDUCE_THRESHOLD_TOKENS', '1200'))
+RECIPE_FRAGMENT_TOKENS = int(os.getenv('RECIPE_FRAGMENT_TOKENS', '1000'))
+RECIPE_FRAGMENT_MAX_TOKENS = int(os.getenv('RECIPE_FRAGMENT_MAX_TOKENS', '1200'))
+RECIPE_MERGE_MODEL = os.getenv('RECIPE_MERGE_MODEL', LLM_MODEL)
+RECIPE_MERGE_MAX_TOKENS = int(os.getenv('RECIPE_MERGE_MAX_TOKENS', '4000'))
+
+# Send recipe sections to WhatsApp while the LLM is still writing the rest
+STREAM_RECIPE_SECTIONS = os.getenv('STREAM_RECIPE_SECTIONS', '1') == '1'
+
+#MEDIA DOWNLOADS
+MEDIA_MAX_BYTES = int(os.getenv('MEDIA_MAX_BYTES', str(16 * 1024 * 1024)))
+MEDIA_MAX_DURATION_SECONDS = float(os.getenv('MEDIA_MAX_DURATION_SECONDS', '1800'))
+MEDIA_SPOOL_BYTES = int(os.getenv('MEDIA_SPOOL_BYTES', str(1024 * 1024)))
+MEDIA_DOWNLOAD_TIMEOUT = float(os.getenv('MEDIA_DOWNLOAD_TIMEOUT', '30'))
+MEDIA_MAX_CONNECTIONS = int(os.getenv('MEDIA_MAX_CONNECTIONS', '20'))
+
+#VOICE JOBS
+VOICE_WORKER_CONCURRENCY = int(os.getenv('VOICE_WORKER_CONCURRENCY', '4'))
+VOICE_QUEUE_DRAIN_TIMEOUT = float(os.getenv('VOICE_QUEUE_DRAIN_TIMEOUT', '60'))
+VOICE_JOB_POLL_INTERVAL = float(os.getenv('VOICE_JOB_POLL_INTERVAL', '2'))
+VOICE_JOB_MAX_ATTEMPTS = int(os.getenv('VOICE_JOB_MAX_ATTEMPTS', '5'))
+VOICE_JOB_LEASE_SECONDS = float(os.getenv('VOICE_JOB_LEASE_SECONDS', '600'))
+VOICE_JOB_RETRY_BACKOFF = float(os.getenv('VOICE_JOB_RETRY_BACKOFF', '10'))
+VOICE_JOB_RETRY_BACKOFF_MAX = float(os.getenv('VOICE_JOB_RETRY_BACKOFF_MAX', '600'))
+# Done and failed voice jobs are purged after this many seconds
+VOICE_JOB_RETENTION_SECONDS = float(os.getenv('VOICE_JOB_RETENTION_SECONDS', str(7 * 24 * 3600)))
+# Set to 0 on web nodes that should only enqueue and leave processing to worker.py
+VOICE_WORKERS_IN_WEB = os.getenv('VOICE_WORKERS_IN_WEB', '1') == '1'
+# Running voice jobs per phone number, so one sender can't occupy every worker; 0 disables the cap
+VOICE_JOB_MAX_RUNNING_PER_PHONE = int(os.getenv('VOICE_JOB_MAX_RUNNING_PER_PHONE', '1'))
+# Above this many pending jobs, new voice notes get a "busy, your recipe is queued" reply; 0 disables it
+VOICE_BACKLOG_BUSY_THRESHOLD = int(os.getenv('VOICE_BACKLOG_BUSY_THRESHOLD', '50'))
+
+#TRANSCRIPTION CACHE
+# Voice notes cached by audio hash; 0 disables the cache
+TRANSCRIPTION_CACHE_MAX_ENTRIES = int(os.getenv('TRANSCRIPTION_CACHE_MAX_ENTRIES', '10000'))
+
+#TEXT MESSAGES
+# Greetings, thanks and questions about how it works or pricing get pre-written replies without the LLM;
+# 0 sends every text message to the LLM
+TEXT_INTENT_REPLIES = os.getenv('TEXT_INTENT_REPLIES', '1') == '1'
+# Other messages already answered by the LLM reuse the answer; 0 disables reuse
+TEXT_REPLY_CACHE_MAX_ENTRIES = int(os.getenv('TEXT_REPLY_CACHE_MAX_ENTRIES', '1000'))
+TEXT_REPLY_CACHE_TTL_SECONDS = float(os.getenv('TEXT_REPLY_CACHE_TTL_SECONDS', '3600'))
+
+#HOMEPAGE
+# Latest public recipes on the homepage, cached in process and rebuilt after recipe changes
+HOMEPAGE_FEED_SIZE = int(os.getenv('HOMEPAGE_FEED_SIZE', '3'))
+HOMEPAGE_FEED_TTL_SECONDS = float(os.getenv('HOMEPAGE_FEED_TTL_SECONDS', '300'))
+
+#RECIPE SEARCH
+# Recipes returned by the web search and the WhatsApp "buscar ..." command
+RECIPE_SEARCH_RESULTS = int(os.getenv('RECIPE_SEARCH_RESULTS', '5'))
+# Users whose embedding matrix is kept in process memory. Privacy is always checked
+# in the database; a change made by another process reaches the cached ranking once the matrix expires
+RECIPE_SEARCH_CACHE_USERS = int(os.getenv('RECIPE_SEARCH_CACHE_USERS', '1000'))
+RECIPE_SEARCH_CACHE_TTL_SECONDS = float(os.getenv('RECIPE_SEARCH_CACHE_TTL_SECONDS', '600'))
+
+#WEBHOOK DEDUPLICATION
+# 'database' shares seen MessageSids across workers; 'memory' is for single-node use
+WEBHOOK_DEDUP_BACKEND = os.getenv('WEBHOOK_DEDUP_BACKEND', 'database')
+WEBHOOK_DEDUP_TTL_SECONDS = float(os.getenv('WEBHOOK_DEDUP_TTL_SECONDS', str(24 * 3600)))
+
 if not all([BASE_URL, STRIPE_PAYMENT_LINK, STRIPE_CUSTOMER_PORTAL_URL]):
     raise ValueError("Missing required environment variables")
\ No newline at end of file
@@ -1,6 +1,11 @@
+import logging
+import time
 from datetime import datetime
-from sqlalchemy.orm import Session
-from database import Message, User
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session, load_only, object_session
+from database import Message, SessionLocal
+from handlers.recipe_summary import DEFAULT_DESCRIPTION, DEFAULT_TITLE
+from config import HOMEPAGE_FEED_SIZE, HOMEPAGE_FEED_TTL_SECONDS
 
 def get_sample_recipes(db: Session = None) -> list:
     if not db:
@@ -16,51 +21,97 @@ def get_sample_recipes(db: Session = None) -> list:
             }
         ]
     
-    # Get latest 3 public recipes from database with their users
-    latest_recipes = db.query(Message, Message.phone_number)\
+    return recent_recipes_feed.get(db)
+
+def build_recent_recipes(db: Session, limit: int) -> list:
+    # Get latest public recipes from database with their users; the title and
+    # description were derived when the recipe was written, so no body is decrypted
+    latest_recipes = db.query(Message)\
+        .options(load_only(
+            Message.encrypted_title, Message.encrypted_description,
+            Message.created_at, Message.slug, Message.user_id
+        ))\
         .filter(Message.is_private == False)\
         .order_by(Message.created_at.desc())\
-        .limit(3)\
+        .limit(limit)\
         .all()
     
     samples = []
-    for recipe, phone_number in latest_recipes:
-        # Get user_id from phone_number
-        user = db.query(User).filter_by(phone_number=phone_number).first()
-        user_id = user.id if user else 1
-        
-        # Extract title from first line of text
-        title = recipe.text.splitlines()[0].replace('# ', '') if recipe.text else "Sin título"
-        
-        # Extract first steps from Preparación section
-        description = ""
-        in_preparation = False
-        lines = recipe.text.splitlines()
-        for line in lines:
-            if '## Preparación' in line:
-                in_preparation = True
-                continue
-            if in_preparation and line.strip():
-                if line.startswith('##'):  # Next section started
-                    break
-                if line.strip().startswith('1.'):  # First step
-                    description = line.strip()[2:].strip()  # Remove "1." and whitespace
-                    break
-        
-        if not description:  # Fallback if no preparation section found
-            description = "Una receta familiar llena de sabor..."
-        
-        # Limit description to 80 chars and add ellipsis
-        if len(description) > 80:
-            description = description[:80].rstrip() + "..."
-        
+    for recipe in latest_recipes:
         samples.append({
-            "title": title,
-            "description": description,
-            "text": recipe.text,
+            "title": recipe.title or DEFAULT_TITLE,
+            "description": recipe.description or DEFAULT_DESCRIPTION,
             "created_at": recipe.created_at,
             "slug": recipe.slug,
-            "user_id": user_id
+            "user_id": recipe.user_id or 1
         })
     
-    return samples
\ No newline at end of file
+    return samples
+
+
+class RecentRecipesFeed:
+    """
+    The latest public recipes shown on the homepage, kept in process memory.
+
+    The feed is rebuilt when it is older than ttl_seconds or after a commit that
+    inserted, edited or deleted a recipe in this process, so a homepage hit in
+    steady state needs no query and no decrypt. Other processes see the change
+    once their copy expires.
+    """
+
+    def __init__(self, size: int = 3, ttl_seconds: float = 300):
+        self.size = size
+        self.ttl_seconds = ttl_seconds
+        self.recipes = None
+        self.built_at = 0.0
+        self.hits = 0
+        self.rebuilds = 0
+        self.invalidations = 0
+        self.logger = logging.getLogger(f"{__name__}.RecentRecipesFeed")
+
+    def get(self, db: Session) -> list:
+        if self.recipes is not None and time.monotonic() - self.built_at < self.ttl_seconds:
+            self.hits += 1
+            return self.recipes
+        self.recipes = build_recent_recipes(db, self.size)
+        self.built_at = time.monotonic()
+        self.rebuilds += 1
+        return self.recipes
+
+    def invalidate(self):
+        self.recipes = None
+        self.invalidations += 1
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "rebuilds": self.rebuilds, "invalidations": self.invalidations}
+
+
+recent_recipes_feed = RecentRecipesFeed(size=HOMEPAGE_FEED_SIZE, ttl_seconds=HOMEPAGE_FEED_TTL_SECONDS)
+
+
+# Changes are noted on the session and the feed invalidated only once they are
+# committed, so a rebuild never caches a recipe that is rolled back
+def _note_recipe_change(session: Session):
+    if session is not None:
+        session.info["recipes_changed"] = True
+
+@event.listens_for(Message, "after_insert")
+@event.listens_for(Message, "after_delete")
+def _recipe_added_or_deleted(mapper, connection, target):
+    _note_recipe_change(object_session(target))
+
+@event.listens_for(Message, "after_update")
+def _recipe_updated(mapper, connection, target):
+    state = inspect(target)
+    # Saving an embedding doesn't change what the homepage shows
+    if any(state.attrs[name].history.has_changes() for name in ("encrypted_title", "encrypted_description", "is_private", "slug")):
+        _note_recipe_change(object_session(target))
+
+@event.listens_for(SessionLocal, "after_commit")
+def _invalidate_feed(session):
+    if session.info.pop("recipes_changed", False):
+        recent_recipes_feed.invalidate()
+
+@event.listens_for(SessionLocal, "after_rollback")
+def _discard_changes(session):
+    session.info.pop("recipes_changed", None)
@@ -1,11 +1,14 @@
-from sqlalchemy import create_engine, Column, Integer, String, DateTime, ARRAY, Float, LargeBinary, Boolean
+from sqlalchemy import create_engine, Column, Integer, String, DateTime, ARRAY, Float, LargeBinary, Boolean, ForeignKey, Text, Index
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import deferred, sessionmaker
 from sqlalchemy.sql import func
+from sqlalchemy.sql import text as sql_text
 import os
 from datetime import datetime, timezone
 from dotenv import load_dotenv
 from cryptography.fernet import Fernet
+from handlers.recipe_summary import summarize_recipe
+from handlers.vector_storage import embedding_type
 
 load_dotenv()
 
@@ -19,6 +22,13 @@ if ENCRYPTION_KEY is None:
 
 fernet = Fernet(ENCRYPTION_KEY)
 
+# 'float32' stores recipe embeddings as float32 bytes; 'pgvector' uses the vector
+# type with an ANN index. Changing it needs the migration run again (downgrade, upgrade)
+VECTOR_STORAGE_BACKEND = os.getenv("VECTOR_STORAGE_BACKEND", "float32")
+# 'hnsw' or 'ivfflat', for the pgvector backend
+VECTOR_INDEX_METHOD = os.getenv("VECTOR_INDEX_METHOD", "hnsw")
+EMBEDDING_DIMENSIONS = int(os.getenv("EMBEDDING_DIMENSIONS", "1536"))
+
 engine = create_engine(DATABASE_URL)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
@@ -30,11 +40,32 @@ class Message(Base):
     id = Column(Integer, primary_key=True, index=True)
     phone_number = Column(String, index=True)
     encrypted_text = Column(LargeBinary)
-    embedding = Column(ARRAY(Float))
+    # Kilobytes per row that no web route reads; loaded only when accessed
+    embedding = deferred(Column(embedding_type(VECTOR_STORAGE_BACKEND, EMBEDDING_DIMENSIONS)))
     created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
     hash = Column(String, unique=True, index=True, nullable=True)
-    slug = Column(String, index=True, nullable=True)
+    slug = Column(String, nullable=True)
     is_private = Column(Boolean, default=False, nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=True)
+    # Listing fields derived from the text whenever it is set, so listings never decrypt the body
+    encrypted_title = Column(LargeBinary, nullable=True)
+    encrypted_description = Column(LargeBinary, nullable=True)
+    ingredient_count = Column(Integer, nullable=True)
+    section_offsets = Column(ARRAY(Integer), nullable=True)
+
+    __table_args__ = (
+        # Per-user listings read the newest recipes straight off the index
+        Index(
+            "ix_messages_user_id_created_at", "user_id", created_at.desc(),
+            postgresql_include=["slug", "is_private", "encrypted_title"]
+        ),
+        # Slugs only need to be unique within a user's URLs
+        Index("ix_messages_user_id_slug", "user_id", "slug", unique=True),
+        # Newest public recipes for the homepage feed
+        Index("ix_messages_public_created_at", created_at.desc(), postgresql_where=(is_private == False)),
+        # Freshness checks and loads of a user's embeddings for recipe search
+        Index("ix_messages_user_id_embedded", "user_id", "id", postgresql_where=sql_text("embedding IS NOT NULL")),
+    )
 
     @property
     def text(self):
@@ -43,6 +74,19 @@ class Message(Base):
     @text.setter
     def text(self, value):
         self.encrypted_text = fernet.encrypt(value.encode())
+        summary = summarize_recipe(value)
+        self.encrypted_title = fernet.encrypt(summary.title.encode())
+        self.encrypted_description = fernet.encrypt(summary.description.encode())
+        self.ingredient_count = summary.ingredient_count
+        self.section_offsets = summary.section_offsets
+
+    @property
+    def title(self):
+        return fernet.decrypt(self.encrypted_title).decode() if self.encrypted_title else None
+
+    @property
+    def description(self):
+        return fernet.decrypt(self.encrypted_description).decode() if self.encrypted_description else None
 
 class WhitelistedNumber(Base):
     __tablename__ = "whitelisted_numbers"
@@ -60,6 +104,105 @@ class User(Base):
     free_trial_remaining = Column(Integer, default=3)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
+class VoiceJob(Base):
+    __tablename__ = "voice_jobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    message_sid = Column(String, unique=True, index=True, nullable=False)
+    media_url = Column(String, nullable=False)
+    phone_number = Column(String, index=True, nullable=False)
+    # Last completed stage: downloaded, transcribed, structured, stored, sent, embedded
+    stage = Column(String, nullable=True)
+    # pending, running, done or failed
+    status = Column(String, default="pending", nullable=False, index=True)
+    attempts = Column(Integer, default=0, nullable=False)
+    next_attempt_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    locked_at = Column(DateTime(timezone=True), nullable=True)
+    last_error = Column(Text, nullable=True)
+    encrypted_transcript = Column(LargeBinary, nullable=True)
+    encrypted_recipe = Column(LargeBinary, nullable=True)
+    embedding = Column(ARRAY(Float), nullable=True)
+    message_id = Column(Integer, ForeignKey("messages.id", ondelete="SET NULL"), nullable=True)
+    # SHA-256 of the downloaded audio, the key of the transcription cache
+    audio_hash = Column(String, nullable=True)
+    # Whether any recipe section already reached the user, so a retry sends only the link
+    recipe_streamed = Column(Boolean, default=False, nullable=False)
+    # Whether the user was already told the recipe is queued, so no processing confirmation is sent
+    acknowledged = Column(Boolean, default=False, nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+    __table_args__ = (
+        Index("ix_voice_jobs_claim", "status", "next_attempt_at"),
+    )
+
+    @property
+    def transcript(self):
+        return fernet.decrypt(self.encrypted_transcript).decode() if self.encrypted_transcript else None
+
+    @transcript.setter
+    def transcript(self, value):
+        self.encrypted_transcript = fernet.encrypt(value.encode())
+
+    @property
+    def recipe(self):
+        return fernet.decrypt(self.encrypted_recipe).decode() if self.encrypted_recipe else None
+
+    @recipe.setter
+    def recipe(self, value):
+        self.encrypted_recipe = fernet.encrypt(value.encode())
+
+class TranscriptionCacheEntry(Base):
+    __tablename__ = "transcription_cache"
+
+    audio_hash = Column(String, primary_key=True)
+    encrypted_transcript = Column(LargeBinary, nullable=False)
+    encrypted_recipe = Column(LargeBinary, nullable=False)
+    embedding = Column(ARRAY(Float), nullable=True)
+    hits = Column(Integer, default=0, nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    last_used_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False, index=True)
+
+    @property
+    def transcript(self):
+        return fernet.decrypt(self.encrypted_transcript).decode()
+
+    @transcript.setter
+    def transcript(self, value):
+        self.encrypted_transcript = fernet.encrypt(value.encode())
+
+    @property
+    def recipe(self):
+        return fernet.decrypt(self.encrypted_recipe).decode()
+
+    @recipe.setter
+    def recipe(self, value):
+        self.encrypted_recipe = fernet.encrypt(value.encode())
+
+class ProcessedWebhook(Base):
+    __tablename__ = "processed_webhooks"
+
+    key = Column(String, primary_key=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    expires_at = Column(DateTime(timezone=True), nullable=False, index=True)
+
+class SlugCounter(Base):
+    __tablename__ = "slug_counters"
+
+    # Highest suffix handed out for a base slug in one user's URLs; 0 means only
+    # the bare slug is taken. Recipes without a user are counted under user_id 0
+    user_id = Column(Integer, primary_key=True)
+    base_slug = Column(String, primary_key=True)
+    last_number = Column(Integer, nullable=False)
+
+class RateLimitBucket(Base):
+    __tablename__ = "rate_limit_buckets"
+
+    # One token bucket per rate-limited operation, shared by every worker
+    name = Column(String, primary_key=True)
+    tokens = Column(Float, nullable=False)
+    updated_at = Column(DateTime(timezone=True), nullable=False)
+
 def get_db():
     db = SessionLocal()
     
@@ -0,0 +1,258 @@
+# handlers/audio_processor.py
+
+import asyncio
+import logging
+import os
+import re
+import shutil
+import unicodedata
+from typing import Optional
+
+SILENCE_START = re.compile(r"silence_start:\s*(-?[\d.]+)")
+SILENCE_END = re.compile(r"silence_end:\s*(-?[\d.]+)")
+DURATION = re.compile(r"Duration:\s*(\d+):(\d+):([\d.]+)")
+PROGRESS_TIME = re.compile(r"time=\s*(\d+):(\d+):([\d.]+)")
+
+
+def parse_silences(ffmpeg_output: str, duration: float) -> list[tuple[float, float]]:
+    """
+    Parse the silence intervals printed by ffmpeg's silencedetect filter.
+
+    :param ffmpeg_output: ffmpeg's stderr.
+    :param duration: Audio duration, used to close a silence that runs to the end.
+    :return: (start, end) pairs in seconds.
+    """
+    silences = []
+    start = None
+    for line in ffmpeg_output.splitlines():
+        match = SILENCE_START.search(line)
+        if match:
+            start = max(0.0, float(match.group(1)))
+            continue
+        match = SILENCE_END.search(line)
+        if match and start is not None:
+            silences.append((start, float(match.group(1))))
+            start = None
+    if start is not None:
+        silences.append((start, duration))
+    return silences
+
+
+def plan_chunks(
+    duration: float,
+    silences: list[tuple[float, float]],
+    target_seconds: float,
+    overlap_seconds: float
+) -> list[tuple[float, float]]:
+    """
+    Plan chunk boundaries close to target_seconds apart, cutting in the middle
+    of the silence nearest to each target. Every chunk but the last runs
+    overlap_seconds into the next one so words at a cut are not lost.
+
+    :return: (start, end) pairs in seconds.
+    """
+    if duration <= target_seconds:
+        return [(0.0, duration)]
+
+    cut_points = [(start + end) / 2 for start, end in silences]
+    cuts = []
+    position = 0.0
+    while duration - position > target_seconds * 1.25:
+        target = position + target_seconds
+        # Only silences that keep chunks between half and one and a half targets long
+        candidates = [
+            cut for cut in cut_points
+            if position + target_seconds / 2 <= cut <= position + target_seconds * 1.5
+        ]
+        cut = min(candidates, key=lambda point: abs(point - target)) if candidates else target
+        cuts.append(cut)
+        position = cut
+
+    boundaries = [0.0] + cuts + [duration]
+    chunks = []
+    for i in range(len(boundaries) - 1):
+        end = boundaries[i + 1]
+        if i < len(boundaries) - 2:
+            end = min(duration, end + overlap_seconds)
+        chunks.append((boundaries[i], end))
+    return chunks
+
+
+def _to_seconds(hours: str, minutes: str, seconds: str) -> float:
+    return int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+
+
+def _normalize_word(word: str) -> str:
+    word = unicodedata.normalize("NFKD", word.lower()).encode("ASCII", "ignore").decode()
+    return re.sub(r"[^\w]", "", word)
+
+
+def stitch_transcripts(texts: list[str], max_overlap_words: int = 40, min_overlap_words: int = 2) -> str:
+    """
+    Join chunk transcripts, dropping the words repeated because chunks overlap.
+
+    The longest run of words that ends one transcript and starts the next is
+    removed from the start of the next, comparing words case-, accent- and
+    punctuation-insensitively.
+    """
+    result_words: list[str] = []
+    for text in texts:
+        words = text.split()
+        if not result_words:
+            result_words = words
+            continue
+        tail = [_normalize_word(word) for word in result_words[-max_overlap_words:]]
+        head = [_normalize_word(word) for word in words[:max_overlap_words]]
+        overlap = 0
+        for size in range(min(len(tail), len(head)), min_overlap_words - 1, -1):
+            if tail[-size:] == head[:size]:
+                overlap = size
+                break
+        result_words.extend(words[overlap:])
+    return " ".join(result_words)
+
+
+class AudioProcessor:
+    """
+    Runs ffmpeg to inspect and cut audio. All methods need the ffmpeg binary;
+    check available before using them.
+    """
+
+    def __init__(self, ffmpeg_path: Optional[str] = None):
+        self.ffmpeg_path = ffmpeg_path or shutil.which("ffmpeg")
+        self.preprocessed = 0
+        self.preprocess_failures = 0
+        self.bytes_saved = 0
+        self.seconds_removed = 0.0
+        self.logger = logging.getLogger(f"{__name__}.AudioProcessor")
+
+    @property
+    def available(self) -> bool:
+        return self.ffmpeg_path is not None
+
+    async def run_ffmpeg(self, *args: str) -> str:
+        """Run ffmpeg with the given arguments and return its stderr."""
+        process = await asyncio.create_subprocess_exec(
+            self.ffmpeg_path, "-hide_banner", "-nostdin", *args,
+            stdout=asyncio.subprocess.DEVNULL,
+            stderr=asyncio.subprocess.PIPE
+        )
+        _, stderr = await process.communicate()
+        output = stderr.decode(errors="replace")
+        if process.returncode != 0:
+            raise RuntimeError(f"ffmpeg failed with code {process.returncode}: {output[-500:]}")
+        return output
+
+    async def get_duration(self, path: str) -> float:
+        output = await self.run_ffmpeg("-i", path, "-f", "null", "-")
+        match = DURATION.search(output)
+        if not match:
+            raise RuntimeError("Could not read audio duration")
+        return _to_seconds(*match.groups())
+
+    async def detect_silences(
+        self,
+        path: str,
+        duration: float,
+        noise_db: float = -35,
+        min_silence_seconds: float = 0.5
+    ) -> list[tuple[float, float]]:
+        output = await self.run_ffmpeg(
+            "-i", path,
+            "-af", f"silencedetect=noise={noise_db}dB:d={min_silence_seconds}",
+            "-f", "null", "-"
+        )
+        return parse_silences(output, duration)
+
+    async def preprocess(
+        self,
+        path: str,
+        output_path: str,
+        silence_db: float = -40,
+        min_silence_seconds: float = 1.0,
+        bitrate: str = "24k"
+    ) -> float:
+        """
+        Trim leading, trailing and long internal silences and re-encode as mono
+        16 kHz Opus at a low bitrate, which is all Whisper needs for speech.
+        Internal pauses longer than min_silence_seconds are cut down to a short gap.
+
+        :param path: The input audio file.
+        :param output_path: Where to write the processed .ogg file.
+        :return: Duration of the processed audio in seconds.
+        """
+        silence_filter = (
+            f"silenceremove=start_periods=1:start_threshold={silence_db}dB:start_silence=0.2"
+            f":stop_periods=-1:stop_duration={min_silence_seconds}:stop_threshold={silence_db}dB:stop_silence=0.3"
+        )
+        try:
+            output = await self.run_ffmpeg(
+                "-i", path,
+                "-af", silence_filter,
+                "-ac", "1", "-ar", "16000",
+                "-c:a", "libopus", "-b:a", bitrate, "-application", "voip",
+                "-y", output_path
+            )
+        except Exception:
+            self.preprocess_failures += 1
+            raise
+
+        duration_match = DURATION.search(output)
+        progress = PROGRESS_TIME.findall(output)
+        output_duration = _to_seconds(*progress[-1]) if progress else 0.0
+        input_duration = _to_seconds(*duration_match.groups()) if duration_match else output_duration
+        bytes_saved = os.path.getsize(path) - os.path.getsize(output_path)
+        seconds_removed = max(0.0, input_duration - output_duration)
+
+        self.preprocessed += 1
+        self.bytes_saved += bytes_saved
+        self.seconds_removed += seconds_removed
+        self.logger.info(
+            f"Preprocessed audio: {bytes_saved} bytes saved, {seconds_removed:.1f}s of silence removed"
+        )
+        return output_duration
+
+    def stats(self) -> dict:
+        return {
+            "available": self.available,
+            "preprocessed": self.preprocessed,
+            "preprocess_failures": self.preprocess_failures,
+            "bytes_saved": self.bytes_saved,
+            "seconds_removed": round(self.seconds_removed, 1),
+        }
+
+    async def split(
+        self,
+        path: str,
+        duration: float,
+        target_seconds: float,
+        overlap_seconds: float,
+        output_dir: str
+    ) -> list[str]:
+        """
+        Split an audio file at silences into overlapping chunks.
+
+        :return: Paths of the chunk files, in order.
+        """
+        silences = await self.detect_silences(path, duration)
+        chunks = plan_chunks(duration, silences, target_seconds, overlap_seconds)
+        extension = os.path.splitext(path)[1] or ".ogg"
+        paths = [os.path.join(output_dir, f"chunk_{i:03d}{extension}") for i in range(len(chunks))]
+        await asyncio.gather(*[
+            self.run_ffmpeg(
+                "-ss", f"{start:.3f}", "-t", f"{end - start:.3f}",
+                "-i", path, "-c", "copy", "-y", chunk_path
+            )
+            for (start, end), chunk_path in zip(chunks, paths)
+        ])
+        self.logger.info(f"Split {duration:.0f}s of audio into {len(chunks)} chunks")
+        return paths
+
+
+def write_temp_audio(audio_file, filename: str, directory: str) -> str:
+    """Copy a file object to a named file in directory so ffmpeg can read it."""
+    path = os.path.join(directory, filename)
+    audio_file.seek(0)
+    with open(path, "wb") as output:
+        shutil.copyfileobj(audio_file, output)
+    return path
@@ -7,8 +7,8 @@ from handlers.message_sender import MessageSender
 from config import TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN, VERIFICATION_TEMPLATE_SID
 
 class AuthHandler:
-    def __init__(self):
-        self.message_sender = MessageSender(
+    def __init__(self, message_sender: MessageSender = None):
+        self.message_sender = message_sender or MessageSender(
             account_sid=TWILIO_ACCOUNT_SID,
             auth_token=TWILIO_AUTH_TOKEN
         )
@@ -0,0 +1,151 @@
+# handlers/embedding_service.py
+
+import asyncio
+import logging
+from typing import Optional
+
+from openai import AsyncOpenAI
+
+from handlers.resilience import ResilientCaller, get_resilient_caller
+from config import EMBEDDING_MODEL, OPENAI_EMBEDDING_TIMEOUT
+
+# The embeddings endpoint accepts at most 2048 inputs per request
+MAX_API_BATCH_SIZE = 2048
+BATCH_SIZE_BUCKETS = [1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024, 2048]
+
+
+class EmbeddingService:
+    """
+    Gathers concurrent embedding requests into batched API calls.
+
+    Requests arriving within max_wait_seconds of each other, up to
+    max_batch_size inputs, share one embeddings.create call and each caller
+    gets its own vector back.
+    """
+
+    def __init__(
+        self,
+        client: AsyncOpenAI,
+        model: str = EMBEDDING_MODEL,
+        max_batch_size: int = 64,
+        max_wait_seconds: float = 0.02,
+        resilience: Optional[ResilientCaller] = None
+    ):
+        """
+        Initializes the EmbeddingService.
+
+        :param client: AsyncOpenAI client used for the batched calls.
+        :param model: The embedding model name.
+        :param max_batch_size: Most inputs sent in a single call.
+        :param max_wait_seconds: How long the first request of a batch waits for others.
+        :param resilience: Retries and hedges the batched calls. Defaults to the shared embeddings caller.
+        """
+        self.client = client
+        self.model = model
+        self.max_batch_size = min(max_batch_size, MAX_API_BATCH_SIZE)
+        self.max_wait_seconds = max_wait_seconds
+        self.resilience = resilience or get_resilient_caller("embeddings", hedge=True)
+        self.pending: list[tuple[str, asyncio.Future]] = []
+        self.flush_handle: Optional[asyncio.TimerHandle] = None
+        # Batches being sent; the event loop only keeps weak references to tasks
+        self._inflight: set[asyncio.Task] = set()
+        self.batches = 0
+        self.inputs = 0
+        self.batch_size_counts = {bucket: 0 for bucket in BATCH_SIZE_BUCKETS}
+        self.logger = logging.getLogger(f"{__name__}.EmbeddingService")
+
+    async def embed(self, text: str) -> list[float]:
+        """
+        Embed one text, batched with other concurrent calls.
+
+        :param text: The text to embed.
+        :return: The embedding vector.
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self.pending.append((text, future))
+        if len(self.pending) >= self.max_batch_size:
+            self._flush()
+        elif self.flush_handle is None:
+            self.flush_handle = loop.call_later(self.max_wait_seconds, self._flush)
+        return await future
+
+    async def embed_many(self, texts: list[str]) -> list[list[float]]:
+        """
+        Embed many texts in as few calls as possible, e.g. for bulk re-embedding.
+
+        :param texts: The texts to embed.
+        :return: One vector per text, in order.
+        """
+        vectors = []
+        for start in range(0, len(texts), self.max_batch_size):
+            vectors.extend(await self._create(texts[start:start + self.max_batch_size]))
+        return vectors
+
+    def stats(self) -> dict:
+        """Return batch counters and a cumulative histogram of batch sizes."""
+        return {
+            "batches": self.batches,
+            "inputs": self.inputs,
+            "average_batch_size": round(self.inputs / self.batches, 2) if self.batches else 0.0,
+            "batch_size_buckets": dict(self.batch_size_counts),
+        }
+
+    async def close(self, timeout: float = 10.0):
+        """
+        Send what is still pending and wait for the batches in flight.
+
+        :param timeout: Seconds to wait before cancelling the batches still running.
+        """
+        self._flush()
+        if not self._inflight:
+            return
+        _, running = await asyncio.wait(set(self._inflight), timeout=timeout)
+        for task in running:
+            task.cancel()
+        if running:
+            self.logger.warning(f"Cancelled {len(running)} embedding batches still running on close")
+            await asyncio.gather(*running, return_exceptions=True)
+
+    def _flush(self):
+        if self.flush_handle is not None:
+            self.flush_handle.cancel()
+            self.flush_handle = None
+        batch, self.pending = self.pending, []
+        if batch:
+            task = asyncio.ensure_future(self._send(batch))
+            self._inflight.add(task)
+            task.add_done_callback(self._inflight.discard)
+
+    async def _send(self, batch: list[tuple[str, asyncio.Future]]):
+        try:
+            vectors = await self._create([text for text, _ in batch])
+        except asyncio.CancelledError:
+            for _, future in batch:
+                future.cancel()
+            raise
+        except Exception as e:
+            self.logger.error(f"Error generating {len(batch)} embeddings: {str(e)}")
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), vector in zip(batch, vectors):
+            if not future.done():
+                future.set_result(vector)
+
+    async def _create(self, texts: list[str]) -> list[list[float]]:
+        response = await self.resilience.call(lambda: self.client.embeddings.create(
+            input=texts,
+            model=self.model,
+            timeout=OPENAI_EMBEDDING_TIMEOUT
+        ))
+        self._record_batch(len(texts))
+        return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+
+    def _record_batch(self, size: int):
+        self.batches += 1
+        self.inputs += size
+        for bucket in BATCH_SIZE_BUCKETS:
+            if size <= bucket:
+                self.batch_size_counts[bucket] += 1
@@ -0,0 +1,113 @@
+# handlers/idempotency.py
+
+import logging
+import random
+from datetime import datetime, timedelta, timezone
+
+from cachetools import TTLCache
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from database import ProcessedWebhook
+
+
+class InMemoryIdempotencyStore:
+    """
+    Remembers webhook keys in process memory. Only suitable for a single worker.
+    """
+
+    def __init__(self, ttl_seconds: float, maxsize: int = 100000):
+        self.keys = TTLCache(maxsize=maxsize, ttl=ttl_seconds)
+
+    def claim(self, db: Session, key: str) -> bool:
+        """Return True if the key was not seen within the TTL, and remember it."""
+        if key in self.keys:
+            return False
+        self.keys[key] = True
+        return True
+
+    def release(self, db: Session, key: str):
+        """Forget a key so a later delivery is processed again."""
+        self.keys.pop(key, None)
+
+
+class DatabaseIdempotencyStore:
+    """
+    Remembers webhook keys in the processed_webhooks table so every worker and
+    node sees the same deliveries.
+    """
+
+    def __init__(self, ttl_seconds: float, purge_probability: float = 0.01):
+        """
+        :param ttl_seconds: How long a key is remembered.
+        :param purge_probability: Chance that a claim also deletes expired keys.
+        """
+        self.ttl = timedelta(seconds=ttl_seconds)
+        self.purge_probability = purge_probability
+        self.logger = logging.getLogger(f"{__name__}.DatabaseIdempotencyStore")
+
+    def claim(self, db: Session, key: str) -> bool:
+        """
+        Return True if the key was not seen within the TTL, and remember it.
+
+        A single INSERT ... ON CONFLICT makes the check and the write atomic, so two
+        concurrent deliveries of the same key can't both claim it. Expired keys are
+        taken over by the update branch.
+        """
+        now = datetime.now(timezone.utc)
+        statement = insert(ProcessedWebhook).values(key=key, created_at=now, expires_at=now + self.ttl)
+        statement = statement.on_conflict_do_update(
+            index_elements=[ProcessedWebhook.key],
+            set_={"created_at": now, "expires_at": now + self.ttl},
+            where=ProcessedWebhook.expires_at < now
+        ).returning(ProcessedWebhook.key)
+        claimed = db.execute(statement).first() is not None
+        if random.random() < self.purge_probability:
+            self.purge_expired(db)
+        db.commit()
+        return claimed
+
+    def release(self, db: Session, key: str):
+        """Forget a key so a later delivery is processed again."""
+        db.query(ProcessedWebhook).filter(ProcessedWebhook.key == key).delete()
+        db.commit()
+
+    def purge_expired(self, db: Session):
+        deleted = db.query(ProcessedWebhook)\
+            .filter(ProcessedWebhook.expires_at < datetime.now(timezone.utc))\
+            .delete(synchronize_session=False)
+        if deleted:
+            self.logger.info(f"Purged {deleted} expired webhook keys")
+
+
+class WebhookDeduplicator:
+    """
+    Drops repeated deliveries of the same webhook, e.g. Twilio retries keyed on MessageSid.
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self.duplicates = 0
+        self.logger = logging.getLogger(f"{__name__}.WebhookDeduplicator")
+
+    def first_delivery(self, db: Session, key: str) -> bool:
+        """
+        Return True the first time a key is seen. Deliveries without a key are always processed.
+        """
+        if not key:
+            return True
+        if self.store.claim(db, key):
+            return True
+        self.duplicates += 1
+        self.logger.info(f"Ignoring duplicate delivery of {key}")
+        return False
+
+    def failed(self, db: Session, key: str):
+        """Forget a key whose processing failed, so the provider's retry is handled."""
+        if not key:
+            return
+        try:
+            self.store.release(db, key)
+        except Exception as e:
+            db.rollback()
+            self.logger.error(f"Failed to release webhook key {key}: {str(e)}")
@@ -0,0 +1,150 @@
+# handlers/job_queue.py
+
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable
+
+from sqlalchemy.orm import Session
+
+from database import VoiceJob
+from handlers.resilience import RetryLaterError
+from handlers.voice_job_store import VoiceJobStore
+
+
+class VoiceJobQueue:
+    """
+    Runs durable voice jobs on a bounded pool of background workers so the
+    /whatsapp webhook can be acknowledged before the pipeline starts.
+
+    Jobs live in the voice_jobs table. Workers claim them with
+    SELECT ... FOR UPDATE SKIP LOCKED, so any number of processes can run a
+    pool against the same database without processing a job twice.
+    """
+
+    def __init__(
+        self,
+        job_handler: Callable[[VoiceJob, Session], Awaitable[None]],
+        job_store: VoiceJobStore,
+        session_factory: Callable[[], Session],
+        concurrency: int = 4,
+        poll_interval: float = 2.0
+    ):
+        """
+        Initializes the VoiceJobQueue.
+
+        :param job_handler: Coroutine function that runs a claimed job with a DB session.
+        :param job_store: Store used to claim jobs and record their outcome.
+        :param session_factory: Callable returning a new DB session.
+        :param concurrency: Number of workers processing jobs at the same time.
+        :param poll_interval: Seconds between polls for jobs enqueued by other processes or due for retry.
+        """
+        if concurrency < 1:
+            raise ValueError("concurrency must be at least 1")
+        self.job_handler = job_handler
+        self.job_store = job_store
+        self.session_factory = session_factory
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.wakeups: asyncio.Queue = asyncio.Queue()
+        self.workers: list[asyncio.Task] = []
+        self.claiming = False
+        self.in_flight = 0
+        self.completed = 0
+        self.failed = 0
+        self.deferred = 0
+        self.last_wait_seconds = 0.0
+        self.logger = logging.getLogger(f"{__name__}.VoiceJobQueue")
+
+    async def start(self):
+        """Start the worker pool."""
+        if self.workers:
+            return
+        self.claiming = True
+        self.workers = [
+            asyncio.create_task(self._worker(i), name=f"voice-worker-{i}")
+            for i in range(self.concurrency)
+        ]
+        self.logger.info(f"Started {self.concurrency} voice workers")
+
+    async def stop(self, timeout: float = 60.0):
+        """
+        Stop claiming jobs and let running jobs finish.
+
+        Jobs still running after the timeout are cancelled; their lease expires and
+        another worker resumes them from the last completed stage.
+
+        :param timeout: Seconds to wait for running jobs before cancelling them.
+        """
+        self.claiming = False
+        if not self.workers:
+            return
+        self.logger.info(f"Draining voice workers ({self.in_flight} running)")
+        for _ in self.workers:
+            self.wakeups.put_nowait(None)
+        done, pending = await asyncio.wait(self.workers, timeout=timeout)
+        if pending:
+            self.logger.warning(f"Voice worker drain timed out after {timeout}s with {self.in_flight} running jobs")
+            for worker in pending:
+                worker.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+        self.workers = []
+        self.logger.info("Voice workers stopped")
+
+    def notify(self):
+        """Wake an idle worker after a job has been enqueued."""
+        self.wakeups.put_nowait(None)
+
+    def stats(self) -> dict:
+        """Return a snapshot of the worker counters for this process."""
+        return {
+            "in_flight": self.in_flight,
+            "concurrency": self.concurrency,
+            "completed": self.completed,
+            "failed": self.failed,
+            "deferred": self.deferred,
+            "last_wait_seconds": round(self.last_wait_seconds, 3),
+        }
+
+    async def _worker(self, worker_id: int):
+        while self.claiming:
+            if await self._run_next(worker_id):
+                continue
+            try:
+                await asyncio.wait_for(self.wakeups.get(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _run_next(self, worker_id: int) -> bool:
+        db = self.session_factory()
+        try:
+            try:
+                job = self.job_store.claim(db)
+            except Exception:
+                db.rollback()
+                self.logger.exception(f"Worker {worker_id} failed to claim a voice job")
+                return False
+            if job is None:
+                return False
+
+            self.in_flight += 1
+            if job.attempts == 1 and job.created_at:
+                self.last_wait_seconds = time.time() - job.created_at.timestamp()
+            try:
+                await self.job_handler(job, db)
+                self.job_store.mark_done(db, job)
+                self.completed += 1
+            except RetryLaterError as e:
+                self.deferred += 1
+                db.rollback()
+                self.job_store.defer(db, job, e.retry_after, str(e))
+            except Exception as e:
+                self.failed += 1
+                self.logger.exception(f"Worker {worker_id} failed voice job {job.id} for {job.phone_number}")
+                db.rollback()
+                self.job_store.mark_failed(db, job, str(e))
+            finally:
+                self.in_flight -= 1
+            return True
+        finally:
+            db.close()
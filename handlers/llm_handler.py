@@ -2,27 +2,46 @@
 
 import logging
 from typing import List
-from openai import OpenAI
-from config import LLM_MODEL, EMBEDDING_MODEL
+from openai import AsyncOpenAI
+from handlers.openai_client import get_openai_client
+from handlers.embedding_service import EmbeddingService
+from handlers.metrics import observe_stage
+from handlers.resilience import get_resilient_caller
+from handlers.text_intents import TextReplyCache
+from config import LLM_MODEL, EMBEDDING_MODEL, OPENAI_CHAT_TIMEOUT, OPENAI_EMBEDDING_TIMEOUT
 
 class LLMHandler:
     """
     Handles interactions with the Language Learning Model (LLM) API.
     """
 
-    def __init__(self, api_key: str, model: str = LLM_MODEL):
+    def __init__(
+        self,
+        api_key: str,
+        model: str = LLM_MODEL,
+        client: AsyncOpenAI = None,
+        embedding_service: EmbeddingService = None,
+        reply_cache: TextReplyCache = None
+    ):
         """
         Initializes the LLMHandler.
 
         :param api_key: The API key for OpenAI.
         :param model: The model name to use.
+        :param client: AsyncOpenAI client to use. Defaults to the shared process-wide client.
+        :param embedding_service: Optional service that batches concurrent embedding calls.
+        :param reply_cache: Optional cache answering small talk without calling the LLM.
         """
         self.api_key = api_key
         self.model = model
-        self.client = OpenAI(api_key=self.api_key)
+        self.client = client or get_openai_client()
+        self.embedding_service = embedding_service
+        self.reply_cache = reply_cache
+        self.chat_resilience = get_resilient_caller("chat", hedge=True)
+        self.embedding_resilience = get_resilient_caller("embeddings", hedge=True)
         self.logger = logging.getLogger(f"{__name__}.LLMHandler")
 
-    def generate_embedding(self, text: str) -> list[float]:
+    async def generate_embedding(self, text: str) -> list[float]:
         """
         Generates an embedding vector for the given text.
 
@@ -30,11 +49,15 @@ class LLMHandler:
         :return: A list of floats representing the embedding vector.
         """
         try:
-            response = self.client.embeddings.create(
-                input=text, 
-                model=EMBEDDING_MODEL
-            )
-            return response.data[0].embedding
+            with observe_stage("embedding"):
+                if self.embedding_service:
+                    return await self.embedding_service.embed(text)
+                response = await self.embedding_resilience.call(lambda: self.client.embeddings.create(
+                    input=text,
+                    model=EMBEDDING_MODEL,
+                    timeout=OPENAI_EMBEDDING_TIMEOUT
+                ))
+                return response.data[0].embedding
         except Exception as e:
             self.logger.error(f"Error generating embedding: {str(e)}")
             raise
@@ -47,9 +70,14 @@ class LLMHandler:
         :param context: Contextual information to guide the response.
         :return: The AI-generated response as a string.
         """
+        if self.reply_cache:
+            cached = self.reply_cache.get(message, context)
+            if cached is not None:
+                return cached
         try:
-            response = self.client.chat.completions.create(
+            response = await self.chat_resilience.call(lambda: self.client.chat.completions.create(
                 model=self.model,
+                timeout=OPENAI_CHAT_TIMEOUT,
                 messages=[
                     {
                         "role": "system",
@@ -77,8 +105,11 @@ Ejemplo de respuestas:
                         "content": f"Contexto: {context}\nMensaje del usuario: {message}\nResponde como Yayarecetas en menos de 50 palabras:"
                     }
                 ]
-            )
-            return response.choices[0].message.content
+            ))
+            reply = response.choices[0].message.content
+            if self.reply_cache:
+                self.reply_cache.put(message, context, reply)
+            return reply
         except Exception as e:
             self.logger.error(f"Error generando respuesta AI: {str(e)}")
             return "¡Hola! Estoy aquí para ayudarte con tus recetas. ¿Cómo puedo ayudarte hoy?"
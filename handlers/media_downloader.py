@@ -0,0 +1,321 @@
+# handlers/media_downloader.py
+
+import hashlib
+import logging
+import struct
+import tempfile
+import time
+from collections import deque
+from typing import Optional
+
+import httpx
+
+from config import (
+    MEDIA_MAX_BYTES, MEDIA_MAX_DURATION_SECONDS, MEDIA_SPOOL_BYTES,
+    MEDIA_DOWNLOAD_TIMEOUT, MEDIA_MAX_CONNECTIONS
+)
+
+logger = logging.getLogger(__name__)
+
+
+class MediaLimitError(ValueError):
+    """
+    Raised when a media file exceeds the configured size or duration limits.
+    """
+
+
+class DownloadedMedia:
+    """
+    A downloaded media file spooled to memory or disk.
+    """
+
+    def __init__(self, file, size: int, sha256: str, content_type: str, duration_seconds: Optional[float]):
+        self.file = file
+        self.size = size
+        self.sha256 = sha256
+        self.content_type = content_type
+        self.duration_seconds = duration_seconds
+
+    @property
+    def filename(self) -> str:
+        extension = {
+            "audio/ogg": "ogg",
+            "audio/mpeg": "mp3",
+            "audio/mp4": "m4a",
+            "audio/amr": "amr",
+            "audio/aac": "aac",
+        }.get(self.content_type.split(";")[0].strip(), "ogg")
+        return f"voice_message.{extension}"
+
+    def read(self) -> bytes:
+        """Read the whole file. Only for small files or callers that need the bytes."""
+        self.file.seek(0)
+        return self.file.read()
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _ogg_crc_table() -> list[int]:
+    table = []
+    for byte in range(256):
+        crc = byte << 24
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x04C11DB7) if crc & 0x80000000 else crc << 1
+        table.append(crc & 0xFFFFFFFF)
+    return table
+
+
+OGG_CRC_TABLE = _ogg_crc_table()
+
+
+def ogg_page_crc(page: bytes) -> int:
+    """CRC-32 of an Ogg page (polynomial 0x04C11DB7, unreflected) with its checksum field zeroed."""
+    crc = 0
+    for i, byte in enumerate(page):
+        if 22 <= i < 26:
+            byte = 0
+        crc = ((crc << 8) & 0xFFFFFFFF) ^ OGG_CRC_TABLE[(crc >> 24) ^ byte]
+    return crc
+
+
+class OggDurationTracker:
+    """
+    Tracks the playback duration of an Ogg stream from its page headers as the
+    bytes arrive, so over-long audio can be rejected before it is fully downloaded.
+
+    The first page is found by its capture pattern and only trusted once its
+    version and checksum are valid; later pages are reached by skipping whole
+    pages, so "OggS" inside the audio payload is never read as a header. A
+    page that doesn't start where the previous one ended makes the tracker
+    search for the next verified page again.
+    """
+
+    HEADER_SIZE = 27
+
+    def __init__(self):
+        self.buffer = b""
+        self.sample_rate: Optional[int] = None
+        self.granule = 0
+        # Whether the buffer starts at a page boundary
+        self.synced = False
+
+    def feed(self, chunk: bytes):
+        data = self.buffer + chunk
+        position = 0
+        while True:
+            if not self.synced:
+                index = data.find(b"OggS", position)
+                if index == -1:
+                    # Keep a tail so a capture pattern split across chunks is found on the next feed
+                    position = max(position, len(data) - 3)
+                    break
+                position = index
+            page_length = self._page_length(data, position)
+            if page_length is None:
+                # The rest of the page hasn't arrived yet
+                break
+            if not self._is_valid_page(data, position, page_length):
+                # Lost or never had sync: look for the next verified page
+                self.synced = False
+                position += 1
+                continue
+            self.synced = True
+            if self.sample_rate is None:
+                self.sample_rate = self._detect_sample_rate(data, position)
+            granule = struct.unpack_from("<q", data, position + 6)[0]
+            if granule > self.granule:
+                self.granule = granule
+            position += page_length
+        self.buffer = data[position:]
+
+    def _page_length(self, data: bytes, position: int) -> Optional[int]:
+        """Header, segment table and body length of the page at position, or None if not all buffered."""
+        if len(data) - position < self.HEADER_SIZE:
+            return None
+        segments = data[position + 26]
+        header_length = self.HEADER_SIZE + segments
+        if len(data) - position < header_length:
+            return None
+        page_length = header_length + sum(data[position + self.HEADER_SIZE:position + header_length])
+        if len(data) - position < page_length:
+            return None
+        return page_length
+
+    def _is_valid_page(self, data: bytes, position: int, page_length: int) -> bool:
+        if data[position:position + 4] != b"OggS" or data[position + 4] != 0 or data[position + 5] & ~0x07:
+            return False
+        if self.synced:
+            # Skipped to by page length from a verified page; the checksum was only needed to find the first one
+            return True
+        page = data[position:position + page_length]
+        return struct.unpack_from("<I", page, 22)[0] == ogg_page_crc(page)
+
+    @property
+    def duration_seconds(self) -> Optional[float]:
+        if not self.sample_rate:
+            return None
+        return self.granule / self.sample_rate
+
+    def _detect_sample_rate(self, data: bytes, index: int) -> Optional[int]:
+        segments = data[index + 26]
+        packet_start = index + self.HEADER_SIZE + segments
+        packet = data[packet_start:packet_start + 16]
+        if packet.startswith(b"OpusHead"):
+            # Opus granule positions are always counted at 48 kHz
+            return 48000
+        if packet.startswith(b"\x01vorbis") and len(packet) >= 16:
+            return struct.unpack_from("<I", packet, 12)[0]
+        return None
+
+
+class MediaDownloader:
+    """
+    Streams media files over a shared keep-alive connection pool into spooled
+    temporary files, enforcing size and duration limits while downloading.
+    """
+
+    def __init__(
+        self,
+        max_bytes: int = MEDIA_MAX_BYTES,
+        max_duration_seconds: float = MEDIA_MAX_DURATION_SECONDS,
+        spool_bytes: int = MEDIA_SPOOL_BYTES,
+        timeout: float = MEDIA_DOWNLOAD_TIMEOUT,
+        transport: httpx.AsyncBaseTransport = None
+    ):
+        """
+        Initializes the MediaDownloader.
+
+        :param max_bytes: Largest accepted file size in bytes.
+        :param max_duration_seconds: Longest accepted audio duration, checked for Ogg files.
+        :param spool_bytes: Bytes kept in memory before the file is moved to disk.
+        :param timeout: Timeout in seconds for connecting and for each read.
+        :param transport: Optional httpx transport, e.g. httpx.MockTransport in tests.
+        """
+        self.max_bytes = max_bytes
+        self.max_duration_seconds = max_duration_seconds
+        self.spool_bytes = spool_bytes
+        self.client = httpx.AsyncClient(
+            transport=transport,
+            timeout=timeout,
+            follow_redirects=True,
+            limits=httpx.Limits(
+                max_connections=MEDIA_MAX_CONNECTIONS,
+                max_keepalive_connections=MEDIA_MAX_CONNECTIONS
+            )
+        )
+        self.downloads = 0
+        self.failures = 0
+        self.rejected = 0
+        self.bytes_downloaded = 0
+        self.seconds_downloading = 0.0
+        self.latencies: deque = deque(maxlen=256)
+        self.logger = logging.getLogger(f"{__name__}.MediaDownloader")
+
+    async def download(self, url: str, account_sid: str, auth_token: str) -> DownloadedMedia:
+        """
+        Download a media file.
+
+        :param url: The media URL.
+        :param account_sid: Twilio Account SID used for basic auth.
+        :param auth_token: Twilio Auth Token used for basic auth.
+        :return: The downloaded media. The caller closes it.
+        :raises MediaLimitError: If the file is too large or too long.
+        """
+        started = time.perf_counter()
+        spool = tempfile.SpooledTemporaryFile(max_size=self.spool_bytes)
+        digest = hashlib.sha256()
+        size = 0
+        duration_tracker = None
+        try:
+            async with self.client.stream("GET", url, auth=(account_sid, auth_token)) as response:
+                response.raise_for_status()
+                content_type = response.headers.get("Content-Type", "audio/ogg")
+                content_length = response.headers.get("Content-Length")
+                if content_length and int(content_length) > self.max_bytes:
+                    raise MediaLimitError(f"Media is {content_length} bytes, limit is {self.max_bytes}")
+                if "ogg" in content_type or "opus" in content_type:
+                    duration_tracker = OggDurationTracker()
+
+                async for chunk in response.aiter_bytes():
+                    size += len(chunk)
+                    if size > self.max_bytes:
+                        raise MediaLimitError(f"Media exceeds {self.max_bytes} bytes")
+                    if duration_tracker:
+                        duration_tracker.feed(chunk)
+                        duration = duration_tracker.duration_seconds
+                        if duration and duration > self.max_duration_seconds:
+                            raise MediaLimitError(
+                                f"Media exceeds {self.max_duration_seconds:.0f} seconds"
+                            )
+                    digest.update(chunk)
+                    spool.write(chunk)
+        except MediaLimitError:
+            self.rejected += 1
+            spool.close()
+            raise
+        except Exception:
+            self.failures += 1
+            spool.close()
+            raise
+
+        elapsed = time.perf_counter() - started
+        self.downloads += 1
+        self.bytes_downloaded += size
+        self.seconds_downloading += elapsed
+        self.latencies.append(elapsed)
+        spool.seek(0)
+        duration = duration_tracker.duration_seconds if duration_tracker else None
+        self.logger.info(
+            f"Downloaded {size} bytes in {elapsed:.2f}s"
+            + (f" ({duration:.0f}s of audio)" if duration else "")
+        )
+        return DownloadedMedia(spool, size, digest.hexdigest(), content_type, duration)
+
+    def stats(self) -> dict:
+        """Return download counters, throughput and recent latency percentiles."""
+        latencies = sorted(self.latencies)
+
+        def percentile(p: float) -> float:
+            if not latencies:
+                return 0.0
+            return round(latencies[min(len(latencies) - 1, int(p * len(latencies)))], 3)
+
+        return {
+            "downloads": self.downloads,
+            "failures": self.failures,
+            "rejected": self.rejected,
+            "bytes": self.bytes_downloaded,
+            "throughput_bytes_per_second": round(self.bytes_downloaded / self.seconds_downloading, 1)
+                if self.seconds_downloading else 0.0,
+            "latency_p50_seconds": percentile(0.5),
+            "latency_p95_seconds": percentile(0.95),
+        }
+
+    async def close(self):
+        await self.client.aclose()
+
+
+_downloader: Optional[MediaDownloader] = None
+
+
+def get_media_downloader() -> MediaDownloader:
+    """Return the process-wide MediaDownloader, creating it on first use."""
+    global _downloader
+    if _downloader is None:
+        _downloader = MediaDownloader()
+    return _downloader
+
+
+async def close_media_downloader():
+    """Close the process-wide downloader and its connection pool."""
+    global _downloader
+    if _downloader is not None:
+        await _downloader.close()
+        _downloader = None
@@ -2,13 +2,16 @@
 # The send_templated_message method is used to send a message to a WhatsApp number with a given template from message_templates.py
 from twilio.rest import Client #Client is the Twilio API client class that allows us to send messages via WhatsApp
 from config import TWILIO_WHATSAPP_NUMBER
+import asyncio
 import logging
 from message_templates import get_message_template #function that returns a message template from message_templates.py
 import json
+from handlers.metrics import TWILIO_MESSAGES, observe_stage
 
 class MessageSender:
-    def __init__(self, account_sid: str, auth_token: str):
-        self.client = Client(account_sid, auth_token)
+    def __init__(self, account_sid: str = None, auth_token: str = None, client: Client = None):
+        # Reuse an existing Twilio client when given one, so its HTTP session is shared
+        self.client = client or Client(account_sid, auth_token)
         self.twilio_whatsapp_number = TWILIO_WHATSAPP_NUMBER
         self.logger = logging.getLogger(f"{__name__}.MessageSender")
     
@@ -21,13 +24,18 @@ class MessageSender:
                 return
 
             message_body = template.format(**kwargs)
-            message = self.client.messages.create(  
-                body=message_body,
-                from_=self.twilio_whatsapp_number,
-                to=f'whatsapp:{to_number}'
-            )
+            # The Twilio client is blocking; run it in a thread so other stages keep going
+            with observe_stage("twilio_send"):
+                message = await asyncio.to_thread(
+                    self.client.messages.create,
+                    body=message_body,
+                    from_=self.twilio_whatsapp_number,
+                    to=f'whatsapp:{to_number}'
+                )
+            TWILIO_MESSAGES.labels(template_key, "ok").inc()
             self.logger.info(f"Message sent to {to_number}. Message SID: {message.sid}")
         except Exception as e:
+            TWILIO_MESSAGES.labels(template_key, "error").inc()
             self.logger.error(f"Failed to send message to {to_number}: {str(e)}")
 
     async def send_whatsapp_template(self, to_number: str, template_name: str, template_data: dict):
@@ -35,16 +43,19 @@ class MessageSender:
         try:
             self.logger.info(f"Sending template '{template_name}' to {to_number}")
             
-            message = self.client.messages.create(
-                from_=self.twilio_whatsapp_number,
-                to=f'whatsapp:{to_number}',
-                content_sid=template_name,
-                content_variables=json.dumps({
-                    "1": str(template_data["1"])
-                })
-            )
+            with observe_stage("twilio_send"):
+                message = self.client.messages.create(
+                    from_=self.twilio_whatsapp_number,
+                    to=f'whatsapp:{to_number}',
+                    content_sid=template_name,
+                    content_variables=json.dumps({
+                        "1": str(template_data["1"])
+                    })
+                )
+            TWILIO_MESSAGES.labels("whatsapp_template", "ok").inc()
             self.logger.info(f"Template message sent successfully. Message SID: {message.sid}")
         except Exception as e:
+            TWILIO_MESSAGES.labels("whatsapp_template", "error").inc()
             self.logger.error(f"Failed to send template message to {to_number}: {str(e)}")
             self.logger.error(f"Template name: {template_name}")
             self.logger.error(f"Template data: {template_data}")
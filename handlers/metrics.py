@@ -0,0 +1,152 @@
+# handlers/metrics.py
+
+import logging
+import time
+from contextlib import contextmanager
+
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Histogram, generate_latest
+from prometheus_client.core import REGISTRY, GaugeMetricFamily
+
+logger = logging.getLogger(__name__)
+
+# Requests range from sub-millisecond lookups to minute-long Whisper calls
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120)
+
+STAGE_SECONDS = Histogram(
+    "yayarecetas_stage_duration_seconds",
+    "Duration of each step of the recipe pipeline",
+    ["stage", "outcome"],
+    buckets=LATENCY_BUCKETS
+)
+PIPELINE_STAGE_SECONDS = Histogram(
+    "yayarecetas_pipeline_stage_duration_seconds",
+    "Duration of each stage of a StagePipeline run; stage=total is the whole run",
+    ["pipeline", "stage", "outcome"],
+    buckets=LATENCY_BUCKETS
+)
+TWILIO_MESSAGES = Counter(
+    "yayarecetas_twilio_messages_total",
+    "WhatsApp messages sent through Twilio",
+    ["template", "outcome"]
+)
+HTTP_REQUEST_SECONDS = Histogram(
+    "yayarecetas_http_request_duration_seconds",
+    "HTTP request latency per route",
+    ["method", "route", "status"],
+    buckets=LATENCY_BUCKETS
+)
+
+
+class StageTimer:
+    """Outcome holder yielded by observe_stage; set outcome for errors that are handled inside the block."""
+
+    def __init__(self):
+        self.outcome = "ok"
+
+
+@contextmanager
+def observe_stage(stage: str):
+    """
+    Time a block and record it in the stage histogram, labeled "error" if it raises.
+
+    Usage:
+        with observe_stage("embedding"):
+            ...
+    """
+    timer = StageTimer()
+    started = time.perf_counter()
+    try:
+        yield timer
+    except BaseException:
+        timer.outcome = "error"
+        raise
+    finally:
+        STAGE_SECONDS.labels(stage, timer.outcome).observe(time.perf_counter() - started)
+
+
+class HTTPMetricsMiddleware:
+    """
+    ASGI middleware recording request latency labeled by route template, so
+    /yaya12/my-recipe and /yaya13/other-recipe share one series.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+        started = time.perf_counter()
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            # The router stores the matched route in the shared scope
+            route = getattr(scope.get("route"), "path", "unmatched")
+            HTTP_REQUEST_SECONDS.labels(scope["method"], route, str(status_code))\
+                .observe(time.perf_counter() - started)
+
+
+class ServicesCollector:
+    """
+    Exports the stats() counters the services already keep as gauges, read at
+    scrape time so the hot path pays nothing for them. A component whose stats
+    fail is skipped and the others are still exported.
+
+    Numbers become yayarecetas_<component>_<name>; dicts of numbers become one
+    gauge with a "key" label.
+    """
+
+    def __init__(self, services):
+        self.services = services
+
+    def describe(self):
+        # Without describe() the registry calls collect() on registration, which
+        # would query the database from the event loop at startup
+        return []
+
+    def collect(self):
+        for component, source in self.services.metrics_sources().items():
+            try:
+                stats = source()
+            except Exception as e:
+                logger.error(f"Failed to collect {component} stats: {str(e)}")
+                continue
+            for name, value in stats.items():
+                metric_name = f"yayarecetas_{component}_{name}"
+                if isinstance(value, (bool, int, float)):
+                    gauge = GaugeMetricFamily(metric_name, f"{component} {name}")
+                    gauge.add_metric([], float(value))
+                    yield gauge
+                elif isinstance(value, dict) and all(isinstance(item, (int, float)) for item in value.values()):
+                    gauge = GaugeMetricFamily(metric_name, f"{component} {name}", labels=["key"])
+                    for key, item in value.items():
+                        gauge.add_metric([str(key)], float(item))
+                    yield gauge
+
+
+def register_services(services) -> ServicesCollector:
+    collector = ServicesCollector(services)
+    REGISTRY.register(collector)
+    return collector
+
+
+def unregister_services(collector: ServicesCollector):
+    REGISTRY.unregister(collector)
+
+
+def render_metrics() -> tuple[bytes, str]:
+    """
+    Return the Prometheus text exposition and its content type. Collecting
+    queries the database, so call it from a worker thread.
+    """
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
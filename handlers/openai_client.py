@@ -0,0 +1,72 @@
+# handlers/openai_client.py
+
+import logging
+from typing import Optional
+
+import httpx
+from openai import AsyncOpenAI
+
+from config import (
+    OPENAI_API_KEY, OPENAI_BASE_URL, OPENAI_TIMEOUT,
+    OPENAI_MAX_CONNECTIONS, OPENAI_MAX_KEEPALIVE_CONNECTIONS
+)
+
+logger = logging.getLogger(__name__)
+
+_client: Optional[AsyncOpenAI] = None
+
+
+def create_openai_client(
+    api_key: str = None,
+    base_url: str = None,
+    transport: httpx.AsyncBaseTransport = None,
+    timeout: float = OPENAI_TIMEOUT
+) -> AsyncOpenAI:
+    """
+    Creates an AsyncOpenAI client backed by its own connection pool.
+
+    :param api_key: The API key for OpenAI. Defaults to OPENAI_API_KEY.
+    :param base_url: API base URL, e.g. a local fake server. Defaults to OPENAI_BASE_URL.
+    :param transport: Optional httpx transport, e.g. httpx.MockTransport in tests.
+    :param timeout: Default timeout in seconds for calls that don't set their own.
+    :return: A new AsyncOpenAI client.
+    """
+    http_client = httpx.AsyncClient(
+        transport=transport,
+        timeout=timeout,
+        limits=httpx.Limits(
+            max_connections=OPENAI_MAX_CONNECTIONS,
+            max_keepalive_connections=OPENAI_MAX_KEEPALIVE_CONNECTIONS
+        )
+    )
+    return AsyncOpenAI(
+        api_key=api_key or OPENAI_API_KEY,
+        base_url=base_url or OPENAI_BASE_URL,
+        timeout=timeout,
+        # Retries are handled by handlers/resilience.py, which also tracks failures for the circuit breaker
+        max_retries=0,
+        http_client=http_client
+    )
+
+
+def get_openai_client() -> AsyncOpenAI:
+    """Return the process-wide AsyncOpenAI client, creating it on first use."""
+    global _client
+    if _client is None:
+        _client = create_openai_client()
+        logger.info("Created shared AsyncOpenAI client")
+    return _client
+
+
+def set_openai_client(client: Optional[AsyncOpenAI]):
+    """Replace the process-wide client, e.g. with one pointing at a fake server."""
+    global _client
+    _client = client
+
+
+async def close_openai_client():
+    """Close the process-wide client and its connection pool."""
+    global _client
+    if _client is not None:
+        await _client.close()
+        _client = None
@@ -0,0 +1,146 @@
+# handlers/pipeline.py
+
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Iterable, Optional
+
+from handlers.metrics import PIPELINE_STAGE_SECONDS
+
+
+@dataclass
+class Stage:
+    name: str
+    func: Callable[[], Awaitable[Any]]
+    after: list[str] = field(default_factory=list)
+
+
+class StageTimings:
+    """
+    Aggregates stage and end-to-end durations of every pipeline run, per
+    pipeline name. The end-to-end time is the critical path; comparing it with
+    the sum of the stage times shows how much work overlapped.
+    """
+
+    def __init__(self):
+        self.pipelines: dict[str, dict] = {}
+
+    def _pipeline(self, pipeline: str) -> dict:
+        return self.pipelines.setdefault(pipeline, {"runs": 0, "errors": 0, "total_seconds": 0.0, "stages": {}})
+
+    def record_stage(self, pipeline: str, stage: str, seconds: float, outcome: str):
+        stats = self._pipeline(pipeline)["stages"].setdefault(
+            stage, {"count": 0, "errors": 0, "total_seconds": 0.0, "max_seconds": 0.0}
+        )
+        stats["count"] += 1
+        if outcome == "error":
+            stats["errors"] += 1
+        stats["total_seconds"] += seconds
+        stats["max_seconds"] = max(stats["max_seconds"], seconds)
+
+    def record_run(self, pipeline: str, seconds: float, outcome: str):
+        stats = self._pipeline(pipeline)
+        stats["runs"] += 1
+        if outcome == "error":
+            stats["errors"] += 1
+        stats["total_seconds"] += seconds
+
+    def stats(self) -> dict:
+        result = {}
+        for pipeline, stats in self.pipelines.items():
+            stages = {
+                stage: {
+                    "count": values["count"],
+                    "errors": values["errors"],
+                    "average_seconds": round(values["total_seconds"] / values["count"], 3),
+                    "max_seconds": round(values["max_seconds"], 3),
+                }
+                for stage, values in stats["stages"].items()
+            }
+            runs = stats["runs"]
+            result[pipeline] = {
+                "runs": runs,
+                "errors": stats["errors"],
+                "average_seconds": round(stats["total_seconds"] / runs, 3) if runs else 0.0,
+                "average_stage_seconds": round(
+                    sum(values["total_seconds"] for values in stats["stages"].values()) / runs, 3
+                ) if runs else 0.0,
+                "stages": stages,
+            }
+        return result
+
+
+class StagePipeline:
+    """
+    Runs async stages as a dependency graph: every stage starts as soon as the
+    stages it comes after have finished, so independent stages overlap.
+
+    Dependencies on stages that were not added are treated as satisfied, which
+    lets a resumed job leave out the stages an earlier attempt completed. If a
+    stage fails, the stages depending on it fail with the same error, while
+    independent stages run to completion (a failed embedding must not cut off a
+    recipe halfway through being sent); the first error is then raised from run().
+    """
+
+    def __init__(self, name: str, timings: Optional[StageTimings] = None, logger: Optional[logging.Logger] = None):
+        self.name = name
+        self.timings = timings
+        self.stages: dict[str, Stage] = {}
+        self.results: dict[str, Any] = {}
+        self.durations: dict[str, float] = {}
+        self.logger = logger or logging.getLogger(f"{__name__}.StagePipeline")
+
+    def add(self, name: str, func: Callable[[], Awaitable[Any]], after: Iterable[str] = ()):
+        """
+        Add a stage. Stages must be added after the stages they depend on.
+
+        :param name: Unique stage name, also used for its result and timing.
+        :param func: Coroutine function run without arguments; its return value is stored in results.
+        :param after: Names of the stages that must finish first.
+        """
+        if name in self.stages:
+            raise ValueError(f"Stage {name} already added")
+        self.stages[name] = Stage(name, func, [stage for stage in after if stage in self.stages])
+
+    async def run(self) -> dict[str, Any]:
+        """Run all stages and return their results by name."""
+        started = time.perf_counter()
+        tasks: dict[str, asyncio.Task] = {}
+        for stage in self.stages.values():
+            tasks[stage.name] = asyncio.ensure_future(self._run_stage(stage, tasks))
+
+        outcomes = await asyncio.gather(*tasks.values(), return_exceptions=True)
+        errors = [outcome for outcome in outcomes if isinstance(outcome, BaseException)]
+
+        elapsed = time.perf_counter() - started
+        outcome = "error" if errors else "ok"
+        PIPELINE_STAGE_SECONDS.labels(self.name, "total", outcome).observe(elapsed)
+        if self.timings:
+            self.timings.record_run(self.name, elapsed, outcome)
+        stage_times = ", ".join(f"{name} {seconds:.2f}s" for name, seconds in self.durations.items())
+        self.logger.info(f"Pipeline {self.name} {outcome} in {elapsed:.2f}s ({stage_times})")
+        if errors:
+            raise errors[0]
+        return self.results
+
+    async def _run_stage(self, stage: Stage, tasks: dict[str, asyncio.Task]):
+        for dependency in stage.after:
+            await tasks[dependency]
+        started = time.perf_counter()
+        outcome = "ok"
+        try:
+            self.results[stage.name] = await stage.func()
+        except asyncio.CancelledError:
+            outcome = "cancelled"
+            raise
+        except Exception:
+            outcome = "error"
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            self.durations[stage.name] = elapsed
+            if outcome != "cancelled":
+                PIPELINE_STAGE_SECONDS.labels(self.name, stage.name, outcome).observe(elapsed)
+                if self.timings:
+                    self.timings.record_stage(self.name, stage.name, elapsed, outcome)
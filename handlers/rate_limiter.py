@@ -0,0 +1,223 @@
+# handlers/rate_limiter.py
+
+import asyncio
+import logging
+import random
+import time
+from datetime import datetime, timezone
+from typing import Callable, Optional
+
+from sqlalchemy import DateTime, func, literal
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from database import RateLimitBucket, SessionLocal
+from config import (
+    OPENAI_RATE_LIMIT_BACKEND, OPENAI_TRANSCRIPTION_RPM, OPENAI_CHAT_RPM, OPENAI_EMBEDDING_RPM,
+    OPENAI_RATE_LIMIT_BURST_SECONDS, OPENAI_RATE_LIMIT_MAX_WAIT
+)
+
+REQUESTS_PER_MINUTE = {
+    "transcription": OPENAI_TRANSCRIPTION_RPM,
+    "chat": OPENAI_CHAT_RPM,
+    "embeddings": OPENAI_EMBEDDING_RPM,
+}
+
+
+class RetryLaterError(Exception):
+    """
+    A call was not made because the dependency can't take it now. Voice jobs
+    failing with it are deferred by retry_after seconds without spending an attempt.
+    """
+
+    def __init__(self, name: str, retry_after: float, message: str):
+        super().__init__(message)
+        self.name = name
+        self.retry_after = retry_after
+
+
+class RateLimitExceeded(RetryLaterError):
+    """Raised when a call would have to wait longer than the limiter's max_wait."""
+
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(name, retry_after, f"Rate limit {name} exceeded, retry in {retry_after:.0f}s")
+
+
+class InMemoryTokenBucketStore:
+    """
+    Keeps token buckets in process memory. Only suitable for a single worker.
+    """
+
+    def __init__(self):
+        self.buckets: dict[str, tuple[float, float]] = {}
+
+    async def take(self, name: str, rate: float, capacity: float, cost: float = 1.0) -> float:
+        """
+        Take cost tokens from the bucket if it holds enough.
+
+        :return: 0 if the tokens were taken, otherwise the seconds until they will be available.
+        """
+        now = time.monotonic()
+        tokens, updated_at = self.buckets.get(name, (capacity, now))
+        tokens = min(capacity, tokens + rate * (now - updated_at))
+        if tokens >= cost:
+            self.buckets[name] = (tokens - cost, now)
+            return 0.0
+        self.buckets[name] = (tokens, now)
+        return (cost - tokens) / rate
+
+
+class DatabaseTokenBucketStore:
+    """
+    Keeps token buckets in the rate_limit_buckets table so the limits hold
+    across every worker and node.
+    """
+
+    def __init__(self, session_factory: Callable[[], Session]):
+        self.session_factory = session_factory
+
+    async def take(self, name: str, rate: float, capacity: float, cost: float = 1.0) -> float:
+        """
+        Take cost tokens from the bucket if it holds enough.
+
+        :return: 0 if the tokens were taken, otherwise the seconds until they will be available.
+        """
+        return await asyncio.to_thread(self._take, name, rate, capacity, cost)
+
+    def _take(self, name: str, rate: float, capacity: float, cost: float) -> float:
+        # The refill and the take happen in one INSERT ... ON CONFLICT, so concurrent
+        # workers can't both spend the same tokens
+        now = datetime.now(timezone.utc)
+        elapsed = func.greatest(0, func.extract("epoch", literal(now, DateTime(timezone=True)) - RateLimitBucket.updated_at))
+        refilled = func.least(capacity, RateLimitBucket.tokens + rate * elapsed)
+        statement = insert(RateLimitBucket).values(name=name, tokens=capacity - cost, updated_at=now)
+        statement = statement.on_conflict_do_update(
+            index_elements=[RateLimitBucket.name],
+            set_={"tokens": refilled - cost, "updated_at": now},
+            where=refilled >= cost
+        ).returning(RateLimitBucket.tokens)
+
+        db = self.session_factory()
+        try:
+            taken = db.execute(statement).first() is not None
+            if taken:
+                db.commit()
+                return 0.0
+            tokens, updated_at = db.query(RateLimitBucket.tokens, RateLimitBucket.updated_at)\
+                .filter(RateLimitBucket.name == name)\
+                .one()
+            db.commit()
+        finally:
+            db.close()
+        tokens = min(capacity, tokens + rate * max(0.0, (now - updated_at).total_seconds()))
+        return max(0.0, (cost - tokens) / rate)
+
+
+class TokenBucketLimiter:
+    """
+    Limits one operation to a number of requests per minute, allowing short
+    bursts up to the bucket's capacity. Callers over the limit wait for tokens.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        requests_per_minute: float,
+        store,
+        burst_seconds: float = 10,
+        max_wait: float = 60
+    ):
+        """
+        Initializes the TokenBucketLimiter.
+
+        :param name: Bucket name; limiters with the same name share a bucket.
+        :param requests_per_minute: Sustained rate allowed.
+        :param store: InMemoryTokenBucketStore or DatabaseTokenBucketStore.
+        :param burst_seconds: Capacity of the bucket, as seconds' worth of the rate.
+        :param max_wait: Seconds a call may wait for tokens before RateLimitExceeded is raised.
+        """
+        self.name = name
+        self.rate = requests_per_minute / 60
+        self.capacity = max(1.0, self.rate * burst_seconds)
+        self.store = store
+        self.max_wait = max_wait
+        self.acquired = 0
+        self.throttled = 0
+        self.rejected = 0
+        self.wait_seconds = 0.0
+        self.store_errors = 0
+        self.logger = logging.getLogger(f"{__name__}.TokenBucketLimiter")
+
+    async def acquire(self):
+        """
+        Wait until a request may be sent.
+
+        :raises RateLimitExceeded: If the wait would exceed max_wait.
+        """
+        waited = 0.0
+        while True:
+            wait = await self._take()
+            if wait <= 0:
+                self.acquired += 1
+                return
+            if waited + wait > self.max_wait:
+                self.rejected += 1
+                raise RateLimitExceeded(self.name, wait)
+            if waited == 0:
+                self.throttled += 1
+            # Jitter keeps throttled callers from all retrying at the same instant
+            wait *= random.uniform(1.0, 1.2)
+            await asyncio.sleep(wait)
+            waited += wait
+            self.wait_seconds += wait
+
+    async def try_acquire(self) -> bool:
+        """Take a token only if one is available now, e.g. for an optional hedged request."""
+        if await self._take() > 0:
+            return False
+        self.acquired += 1
+        return True
+
+    async def _take(self) -> float:
+        try:
+            return await self.store.take(self.name, self.rate, self.capacity)
+        except Exception as e:
+            # An unavailable store must not stop all OpenAI traffic
+            self.store_errors += 1
+            self.logger.error(f"Rate limit store failed for {self.name}, letting the call through: {str(e)}")
+            return 0.0
+
+    def stats(self) -> dict:
+        return {
+            "acquired": self.acquired,
+            "throttled": self.throttled,
+            "rejected": self.rejected,
+            "wait_seconds": round(self.wait_seconds, 3),
+            "store_errors": self.store_errors,
+        }
+
+
+_store = None
+
+
+def get_rate_limiter(name: str) -> Optional[TokenBucketLimiter]:
+    """
+    Build the limiter for an OpenAI operation from the configured rate, or
+    return None if the operation isn't limited.
+    """
+    global _store
+    requests_per_minute = REQUESTS_PER_MINUTE.get(name, 0)
+    if requests_per_minute <= 0:
+        return None
+    if _store is None:
+        if OPENAI_RATE_LIMIT_BACKEND == "memory":
+            _store = InMemoryTokenBucketStore()
+        else:
+            _store = DatabaseTokenBucketStore(SessionLocal)
+    return TokenBucketLimiter(
+        f"openai_{name}",
+        requests_per_minute,
+        _store,
+        burst_seconds=OPENAI_RATE_LIMIT_BURST_SECONDS,
+        max_wait=OPENAI_RATE_LIMIT_MAX_WAIT
+    )
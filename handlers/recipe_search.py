@@ -0,0 +1,356 @@
+# handlers/recipe_search.py
+
+import logging
+import re
+from typing import Optional
+
+import numpy as np
+from cachetools import TTLCache
+from sqlalchemy import event, func, inspect
+from sqlalchemy.orm import Session, load_only, object_session
+
+from database import EMBEDDING_DIMENSIONS, Message, SessionLocal
+from handlers.llm_handler import LLMHandler
+from handlers.metrics import observe_stage
+from handlers.vector_storage import FLOAT32, cosine_distance, to_float32
+from config import RECIPE_SEARCH_CACHE_USERS, RECIPE_SEARCH_CACHE_TTL_SECONDS
+
+# "buscar lentejas", "Busca: el bizcocho de la abuela", "búscame croquetas"
+SEARCH_COMMAND = re.compile(r"^\s*(?:buscar|busca|b[uú]scame)\b[\s:,.-]*(?P<query>.+)$", re.IGNORECASE | re.DOTALL)
+MAX_QUERY_LENGTH = 200
+# Spare rows allocated at once, so adding recipes one by one doesn't copy the matrix each time
+MIN_CAPACITY = 16
+
+
+def parse_search_command(text: str) -> Optional[str]:
+    """Return the query of a WhatsApp "buscar ..." message, or None if it isn't one."""
+    match = SEARCH_COMMAND.match(text or "")
+    if not match:
+        return None
+    query = " ".join(match.group("query").split())[:MAX_QUERY_LENGTH]
+    return query or None
+
+
+def unit_vector(vector) -> Optional[np.ndarray]:
+    vector = to_float32(vector)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm > 0 else None
+
+
+class UserEmbeddings:
+    """
+    One user's recipe embeddings as a contiguous float32 matrix of unit rows,
+    so ranking them against a query is a single matrix-vector product. Rows
+    are added in spare capacity; a removed row is replaced by the last one.
+    """
+
+    def __init__(self, dimensions: int, rows: list[tuple] = ()):
+        """
+        :param dimensions: Length of the embeddings; others are skipped.
+        :param rows: (recipe id, embedding, is_private) of the user's recipes.
+        """
+        self.dimensions = dimensions
+        self.max_id = max((row[0] for row in rows), default=0)
+        ranked_rows = [row for row in rows if np.shape(row[1]) == (dimensions,)]
+        # Embeddings in the database that can't be ranked, e.g. of another length
+        self.skipped = len(rows) - len(ranked_rows)
+        self.count = len(ranked_rows)
+        capacity = max(MIN_CAPACITY, self.count)
+        self.matrix = np.zeros((capacity, dimensions), dtype=FLOAT32)
+        self.ids = np.zeros(capacity, dtype=np.int64)
+        self.public = np.zeros(capacity, dtype=bool)
+        if ranked_rows:
+            # One vectorized normalization for the whole matrix
+            vectors = self.matrix[:self.count]
+            vectors[:] = np.stack([embedding for _, embedding, _ in ranked_rows])
+            norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+            np.divide(vectors, norms, out=vectors, where=norms > 0)
+            self.ids[:self.count] = [message_id for message_id, _, _ in ranked_rows]
+            self.public[:self.count] = [not is_private for _, _, is_private in ranked_rows]
+        self.positions: dict[int, int] = {int(message_id): i for i, message_id in enumerate(self.ids[:self.count])}
+
+    def signature(self) -> tuple[int, int]:
+        """Number of embeddings and highest recipe id, to compare with the database."""
+        return self.count + self.skipped, self.max_id
+
+    def upsert(self, message_id: int, embedding, is_private: bool):
+        self.max_id = max(self.max_id, message_id)
+        vector = unit_vector(embedding)
+        if vector is None or vector.shape != (self.dimensions,):
+            self.remove(message_id)
+            self.skipped += 1
+            return
+        position = self.positions.get(message_id)
+        if position is None:
+            if self.count == len(self.ids):
+                self._grow()
+            position = self.count
+            self.positions[message_id] = position
+            self.ids[position] = message_id
+            self.count += 1
+        self.matrix[position] = vector
+        self.public[position] = not is_private
+
+    def set_private(self, message_id: int, is_private: bool):
+        position = self.positions.get(message_id)
+        if position is not None:
+            self.public[position] = not is_private
+
+    def remove(self, message_id: int) -> bool:
+        position = self.positions.pop(message_id, None)
+        if position is None:
+            return False
+        last = self.count - 1
+        if position != last:
+            self.matrix[position] = self.matrix[last]
+            self.ids[position] = self.ids[last]
+            self.public[position] = self.public[last]
+            self.positions[int(self.ids[position])] = position
+        self.count = last
+        self.max_id = int(self.ids[:self.count].max()) if self.count else 0
+        return True
+
+    def _grow(self):
+        capacity = max(MIN_CAPACITY, 2 * len(self.ids))
+        self.matrix = np.concatenate([self.matrix, np.zeros((capacity - len(self.ids), self.dimensions), dtype=FLOAT32)])
+        self.ids = np.resize(self.ids, capacity)
+        self.public = np.resize(self.public, capacity)
+
+    def search(self, query: np.ndarray, limit: int, include_private: bool) -> list[tuple[int, float]]:
+        """
+        Rank the recipes by cosine similarity to a unit query vector.
+
+        :return: Up to limit (recipe id, similarity) pairs, most similar first.
+        """
+        count = self.count
+        if count == 0 or limit <= 0:
+            return []
+        scores = self.matrix[:count] @ query
+        if not include_private:
+            scores = np.where(self.public[:count], scores, -np.inf)
+        limit = min(limit, count)
+        # Only the top rows are sorted
+        top = np.argpartition(scores, count - limit)[count - limit:]
+        top = top[np.argsort(scores[top])[::-1]]
+        return [(int(self.ids[i]), float(scores[i])) for i in top if scores[i] > -np.inf]
+
+
+class RecipeEmbeddingIndex:
+    """
+    Per-user embedding matrices kept in process memory for semantic search.
+
+    Commits in this process update the cached matrices in place. Before each
+    search the number of embeddings and highest recipe id are checked against
+    the database, so recipes added or deleted by other processes, e.g. voice
+    workers, cause a reload. Privacy changes made elsewhere only reach the
+    cached flags once the user's entry expires; RecipeSearch checks privacy in
+    the database, so until then they can only affect the ranking.
+    """
+
+    def __init__(self, dimensions: int = 1536, max_users: int = 1000, ttl_seconds: float = 600):
+        """
+        Initializes the RecipeEmbeddingIndex.
+
+        :param dimensions: Length of the embeddings; others are left out of the search.
+        :param max_users: Users whose matrix is kept, least recently cached evicted first.
+        :param ttl_seconds: Seconds a user's matrix is kept before it is reloaded.
+        """
+        self.dimensions = dimensions
+        self.users = TTLCache(maxsize=max_users, ttl=ttl_seconds)
+        self.hits = 0
+        self.loads = 0
+        self.updates = 0
+        self.logger = logging.getLogger(f"{__name__}.RecipeEmbeddingIndex")
+
+    def get(self, db: Session, user_id: int) -> UserEmbeddings:
+        """The user's embeddings, loaded from the database if not cached or out of date."""
+        count, max_id = db.query(func.count(Message.id), func.max(Message.id))\
+            .filter(Message.user_id == user_id, Message.embedding.isnot(None))\
+            .one()
+        embeddings = self.users.get(user_id)
+        if embeddings is not None and embeddings.signature() == (count, max_id or 0):
+            self.hits += 1
+            return embeddings
+        return self._load(db, user_id)
+
+    def _load(self, db: Session, user_id: int) -> UserEmbeddings:
+        rows = db.query(Message.id, Message.embedding, Message.is_private)\
+            .filter(Message.user_id == user_id, Message.embedding.isnot(None))\
+            .order_by(Message.id)\
+            .all()
+        embeddings = UserEmbeddings(self.dimensions, rows)
+        if embeddings.skipped:
+            self.logger.warning(f"{embeddings.skipped} recipes of user {user_id} have embeddings that can't be searched")
+        self.users[user_id] = embeddings
+        self.loads += 1
+        return embeddings
+
+    def search(
+        self,
+        db: Session,
+        user_id: int,
+        query_embedding,
+        limit: int,
+        include_private: bool
+    ) -> list[tuple[int, float]]:
+        query = unit_vector(query_embedding)
+        if query is None or query.shape != (self.dimensions,):
+            return []
+        return self.get(db, user_id).search(query, limit, include_private)
+
+    def apply(self, changes: list[tuple]):
+        """Apply committed recipe changes to the users already cached."""
+        for action, user_id, message_id, *values in changes:
+            embeddings = self._cached_owner(user_id, message_id)
+            if embeddings is None:
+                continue
+            if action == "upsert":
+                embeddings.upsert(message_id, *values)
+            elif action == "privacy":
+                embeddings.set_private(message_id, *values)
+            else:
+                embeddings.remove(message_id)
+            self.updates += 1
+
+    def _cached_owner(self, user_id: Optional[int], message_id: int) -> Optional[UserEmbeddings]:
+        if user_id is not None:
+            return self.users.get(user_id)
+        # The owner wasn't loaded with the recipe, e.g. when deleting it
+        for embeddings in self.users.values():
+            if message_id in embeddings.positions:
+                return embeddings
+        return None
+
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "loads": self.loads,
+            "updates": self.updates,
+            "cached_users": len(self.users),
+        }
+
+
+recipe_embedding_index = RecipeEmbeddingIndex(
+    dimensions=EMBEDDING_DIMENSIONS,
+    max_users=RECIPE_SEARCH_CACHE_USERS,
+    ttl_seconds=RECIPE_SEARCH_CACHE_TTL_SECONDS
+)
+
+
+# As with the homepage feed, changes are collected on the session and applied
+# only once committed, so the index never holds a recipe that was rolled back
+def _note_embedding_change(target, change: tuple):
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault("recipe_embedding_changes", []).append(change)
+
+@event.listens_for(Message, "after_insert")
+def _recipe_added(mapper, connection, target):
+    embedding = target.__dict__.get("embedding")
+    user_id = target.__dict__.get("user_id")
+    if embedding is not None and user_id is not None:
+        _note_embedding_change(target, ("upsert", user_id, target.id, embedding, target.__dict__.get("is_private", True)))
+
+@event.listens_for(Message, "after_update")
+def _recipe_updated(mapper, connection, target):
+    # Attributes are read from the instance's dict so an unloaded column is never fetched mid-flush
+    # (an unknown privacy counts as private)
+    state = inspect(target)
+    user_id = state.dict.get("user_id")
+    is_private = state.dict.get("is_private", True)
+    if state.attrs.embedding.history.has_changes():
+        embedding = state.dict.get("embedding")
+        if embedding is None:
+            _note_embedding_change(target, ("remove", user_id, target.id))
+        else:
+            _note_embedding_change(target, ("upsert", user_id, target.id, embedding, is_private))
+    elif state.attrs.is_private.history.has_changes():
+        _note_embedding_change(target, ("privacy", user_id, target.id, is_private))
+
+@event.listens_for(Message, "after_delete")
+def _recipe_deleted(mapper, connection, target):
+    _note_embedding_change(target, ("remove", inspect(target).dict.get("user_id"), target.id))
+
+@event.listens_for(SessionLocal, "after_commit")
+def _apply_embedding_changes(session):
+    changes = session.info.pop("recipe_embedding_changes", None)
+    if changes:
+        recipe_embedding_index.apply(changes)
+
+@event.listens_for(SessionLocal, "after_rollback")
+def _discard_embedding_changes(session):
+    session.info.pop("recipe_embedding_changes", None)
+
+
+class RecipeSearch:
+    """
+    Finds a user's recipes by meaning rather than exact words: the query is
+    embedded once and ranked against the user's recipes. With the pgvector
+    backend the database ranks them, ordering by cosine distance so the ANN
+    index can answer; with float32 bytes the user's cached embedding matrix
+    is ranked in process memory.
+    """
+
+    def __init__(self, llm_handler: LLMHandler, index: RecipeEmbeddingIndex = None, max_results: int = 5):
+        """
+        Initializes the RecipeSearch.
+
+        :param llm_handler: Embeds the queries, with the same model as the recipes.
+        :param index: Cached per-user embeddings. Defaults to the process-wide index kept up to date on commit.
+        :param max_results: Recipes returned per search.
+        """
+        self.llm_handler = llm_handler
+        self.index = index or recipe_embedding_index
+        self.max_results = max_results
+        self.searches = 0
+        self.empty_results = 0
+        self.logger = logging.getLogger(f"{__name__}.RecipeSearch")
+
+    async def search(self, db: Session, user_id: int, query: str, include_private: bool) -> list[Message]:
+        """
+        Return the user's recipes most similar to the query, most similar first,
+        with only the listing columns loaded.
+
+        :param include_private: Whether private recipes may be returned, i.e. the owner is searching.
+        """
+        self.searches += 1
+        query_embedding = await self.llm_handler.generate_embedding(query)
+        with observe_stage("recipe_ranking"):
+            distance = cosine_distance(Message.embedding, query_embedding)
+            if distance is not None:
+                messages = self._rank_in_database(db, user_id, distance, include_private)
+            else:
+                messages = self._rank_in_memory(db, user_id, query_embedding, include_private)
+        if not messages:
+            self.empty_results += 1
+        return messages
+
+    def _listing_query(self, db: Session, user_id: int, include_private: bool):
+        query = db.query(Message)\
+            .options(load_only(Message.slug, Message.encrypted_title, Message.created_at))\
+            .filter(Message.user_id == user_id)
+        if not include_private:
+            query = query.filter(Message.is_private == False)
+        return query
+
+    def _rank_in_database(self, db: Session, user_id: int, distance, include_private: bool) -> list[Message]:
+        return self._listing_query(db, user_id, include_private)\
+            .filter(Message.embedding.isnot(None))\
+            .order_by(distance)\
+            .limit(self.max_results)\
+            .all()
+
+    def _rank_in_memory(self, db: Session, user_id: int, query_embedding, include_private: bool) -> list[Message]:
+        ranked = self.index.search(db, user_id, query_embedding, self.max_results, include_private)
+        if not ranked:
+            return []
+        # The cached privacy flags may be stale if another process changed them,
+        # so the database decides what may be shown and the cache only ranks
+        messages = self._listing_query(db, user_id, include_private)\
+            .filter(Message.id.in_([message_id for message_id, _ in ranked]))\
+            .all()
+        by_id = {message.id: message for message in messages}
+        return [by_id[message_id] for message_id, _ in ranked if message_id in by_id]
+
+    def stats(self) -> dict:
+        return {"searches": self.searches, "empty_results": self.empty_results, **self.index.stats()}
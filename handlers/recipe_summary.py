@@ -0,0 +1,56 @@
+# handlers/recipe_summary.py
+
+import re
+from typing import NamedTuple
+
+DEFAULT_TITLE = "Sin título"
+DEFAULT_DESCRIPTION = "Una receta familiar llena de sabor..."
+MAX_DESCRIPTION_LENGTH = 80
+
+LIST_ITEM = re.compile(r"^\s*(?:[-*•]|\d+[.)])\s+\S")
+
+
+class RecipeSummary(NamedTuple):
+    title: str
+    description: str
+    ingredient_count: int
+    # Character offset of each '## ' section heading in the recipe text
+    section_offsets: list[int]
+
+
+def summarize_recipe(text: str) -> RecipeSummary:
+    """
+    Derive the fields recipe listings show from a structured recipe, so they
+    can be stored at write time instead of decrypting the body on every view.
+
+    :param text: Recipe Markdown as produced by RECIPE_SYSTEM_PROMPT or edited by the user.
+    """
+    if not text:
+        return RecipeSummary(DEFAULT_TITLE, DEFAULT_DESCRIPTION, 0, [])
+
+    lines = text.splitlines(keepends=True)
+    # The title is the first line, as the listings have always shown it
+    title = lines[0].strip().replace('# ', '') or DEFAULT_TITLE
+
+    description = ""
+    ingredient_count = 0
+    section_offsets = []
+    section = None
+    offset = 0
+    for line in lines:
+        stripped = line.strip()
+        if line.startswith('## '):
+            section_offsets.append(offset)
+            section = stripped[3:].strip().lower()
+        elif section == "ingredientes" and LIST_ITEM.match(line):
+            ingredient_count += 1
+        elif section == "preparación" and not description and stripped.startswith('1.'):
+            # The first step describes the recipe on the homepage
+            description = stripped[2:].strip()
+        offset += len(line)
+
+    if not description:
+        description = DEFAULT_DESCRIPTION
+    if len(description) > MAX_DESCRIPTION_LENGTH:
+        description = description[:MAX_DESCRIPTION_LENGTH].rstrip() + "..."
+    return RecipeSummary(title, description, ingredient_count, section_offsets)
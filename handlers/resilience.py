@@ -0,0 +1,303 @@
+# handlers/resilience.py
+
+import asyncio
+import logging
+import random
+import time
+from collections import deque
+from typing import Awaitable, Callable, Optional, TypeVar
+
+import httpx
+import openai
+
+from config import (
+    OPENAI_RETRY_ATTEMPTS, OPENAI_RETRY_BACKOFF, OPENAI_RETRY_BACKOFF_MAX,
+    OPENAI_BREAKER_FAILURES, OPENAI_BREAKER_RESET_SECONDS,
+    OPENAI_HEDGING, OPENAI_HEDGE_MIN_DELAY, OPENAI_HEDGE_MIN_SAMPLES
+)
+from handlers.rate_limiter import RetryLaterError, TokenBucketLimiter, get_rate_limiter
+
+T = TypeVar("T")
+
+RETRYABLE_ERRORS = (
+    openai.APIConnectionError,  # includes APITimeoutError
+    openai.RateLimitError,
+    openai.InternalServerError,
+    httpx.TransportError,
+)
+
+
+class CircuitOpenError(RetryLaterError):
+    """Raised instead of calling a dependency whose circuit breaker is open."""
+
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(name, retry_after, f"Circuit {name} is open, retry in {retry_after:.0f}s")
+
+
+def is_retryable(error: BaseException) -> bool:
+    """Whether a failed call may succeed if repeated: timeouts, connection errors, 429 and 5xx."""
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code == 429 or error.status_code >= 500
+    return isinstance(error, RETRYABLE_ERRORS)
+
+
+class CircuitBreaker:
+    """
+    Stops calling a dependency after failure_threshold consecutive failures.
+    After reset_seconds one trial call is let through: success closes the
+    circuit, failure opens it again.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_seconds: float = 30):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.consecutive_failures = 0
+        self.opened_at: Optional[float] = None
+        self.trial_in_progress = False
+        self.opens = 0
+        self.logger = logging.getLogger(f"{__name__}.CircuitBreaker")
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_seconds:
+            return "half_open"
+        return "open"
+
+    def retry_after(self) -> float:
+        if self.opened_at is None:
+            return 0.0
+        return max(0.0, self.reset_seconds - (time.monotonic() - self.opened_at))
+
+    def before_call(self) -> bool:
+        """
+        Raise CircuitOpenError unless a call may go through now.
+
+        :return: Whether the call took the half-open trial slot.
+        """
+        state = self.state
+        if state == "closed":
+            return False
+        if state == "half_open" and not self.trial_in_progress:
+            self.trial_in_progress = True
+            return True
+        raise CircuitOpenError(self.name, self.retry_after() or self.reset_seconds)
+
+    def release_trial(self):
+        """Give back the trial slot of a call that ended without an outcome, e.g. cancelled."""
+        self.trial_in_progress = False
+
+    def record_success(self):
+        if self.opened_at is not None:
+            self.logger.info(f"Circuit {self.name} closed")
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.trial_in_progress = False
+
+    def record_failure(self):
+        self.consecutive_failures += 1
+        if self.trial_in_progress or (
+            self.opened_at is None and self.consecutive_failures >= self.failure_threshold
+        ):
+            self.opened_at = time.monotonic()
+            self.trial_in_progress = False
+            self.opens += 1
+            self.logger.warning(f"Circuit {self.name} opened after {self.consecutive_failures} consecutive failures")
+
+
+class ResilientCaller:
+    """
+    Wraps calls to one idempotent API operation with retries (exponential
+    backoff with full jitter), a circuit breaker, an optional rate limiter and,
+    optionally, hedging: if a call takes longer than the recent p95 latency a
+    second identical call is started and whichever finishes first wins.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        max_attempts: int = 3,
+        backoff: float = 0.5,
+        backoff_max: float = 8,
+        breaker: Optional[CircuitBreaker] = None,
+        hedge: bool = False,
+        hedge_min_delay: float = 0.5,
+        hedge_min_samples: int = 20,
+        latency_window: int = 200,
+        limiter: Optional[TokenBucketLimiter] = None
+    ):
+        """
+        :param name: Operation name used in logs and stats.
+        :param max_attempts: Attempts per call, including the first.
+        :param backoff: Upper bound of the first retry delay in seconds, doubled per retry.
+        :param backoff_max: Upper bound of any retry delay in seconds.
+        :param breaker: Circuit breaker shared by every call of this operation.
+        :param hedge: Whether slow calls are hedged.
+        :param hedge_min_delay: Never hedge earlier than this many seconds.
+        :param hedge_min_samples: Latency samples needed before hedging starts.
+        :param latency_window: Number of recent latencies the p95 is computed from.
+        :param limiter: Token bucket every attempt, retry and hedge takes a request from.
+        """
+        self.name = name
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.backoff_max = backoff_max
+        self.breaker = breaker or CircuitBreaker(name)
+        self.hedge = hedge
+        self.hedge_min_delay = hedge_min_delay
+        self.hedge_min_samples = hedge_min_samples
+        self.latencies: deque[float] = deque(maxlen=latency_window)
+        self.limiter = limiter
+        self.calls = 0
+        self.retries = 0
+        self.failures = 0
+        self.rejected = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.logger = logging.getLogger(f"{__name__}.ResilientCaller")
+
+    async def call(self, func: Callable[[], Awaitable[T]], hedge: Optional[bool] = None) -> T:
+        """
+        Run func, retrying retryable errors.
+
+        :param func: Coroutine function making one attempt; it must be safe to repeat.
+        :param hedge: Override the caller's hedging setting for this call.
+        :raises CircuitOpenError: If the breaker is open; the caller should retry later.
+        :raises RateLimitExceeded: If the rate limiter would make the call wait too long.
+        """
+        self.calls += 1
+        hedge = self.hedge if hedge is None else hedge
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                acquired_trial = self.breaker.before_call()
+            except CircuitOpenError:
+                self.rejected += 1
+                raise
+            if self.limiter:
+                try:
+                    await self.limiter.acquire()
+                except BaseException:
+                    if acquired_trial:
+                        self.breaker.release_trial()
+                    raise
+            try:
+                if hedge:
+                    return await self._hedged(func)
+                return await self._attempt(func)
+            except asyncio.CancelledError:
+                # Only the attempt that took the half-open trial slot gives it back;
+                # a cancelled hedge or a call let through a closed circuit holds none
+                if acquired_trial:
+                    self.breaker.release_trial()
+                raise
+            except Exception as e:
+                if not is_retryable(e) or attempt == self.max_attempts:
+                    self.failures += 1
+                    raise
+                delay = random.uniform(0, min(self.backoff_max, self.backoff * 2 ** (attempt - 1)))
+                self.retries += 1
+                self.logger.warning(
+                    f"{self.name} attempt {attempt} failed, retrying in {delay:.2f}s: {type(e).__name__}: {str(e)}"
+                )
+                await asyncio.sleep(delay)
+
+    async def _attempt(self, func: Callable[[], Awaitable[T]]) -> T:
+        started = time.perf_counter()
+        try:
+            result = await func()
+        except Exception as e:
+            if is_retryable(e):
+                self.breaker.record_failure()
+            else:
+                # The service answered; the request itself was wrong
+                self.breaker.record_success()
+            raise
+        self.latencies.append(time.perf_counter() - started)
+        self.breaker.record_success()
+        return result
+
+    def hedge_delay(self) -> Optional[float]:
+        """Seconds after which a hedge is sent, or None until there are enough samples."""
+        if len(self.latencies) < self.hedge_min_samples:
+            return None
+        ordered = sorted(self.latencies)
+        p95 = ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))]
+        return max(self.hedge_min_delay, p95)
+
+    async def _hedged(self, func: Callable[[], Awaitable[T]]) -> T:
+        delay = self.hedge_delay()
+        primary = asyncio.ensure_future(self._attempt(func))
+        if delay is None:
+            return await primary
+
+        done, _ = await asyncio.wait({primary}, timeout=delay)
+        if done:
+            return primary.result()
+
+        if self.limiter and not await self.limiter.try_acquire():
+            # Hedges are optional; under throttling the budget goes to first attempts
+            return await primary
+        self.hedges += 1
+        backup = asyncio.ensure_future(self._attempt(func))
+        pending = {primary, backup}
+        error = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is backup:
+                            self.hedge_wins += 1
+                        return task.result()
+                    error = error or task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def stats(self) -> dict:
+        delay = self.hedge_delay() if self.hedge else None
+        limiter_stats = self.limiter.stats() if self.limiter else {}
+        return {
+            "calls": self.calls,
+            "retries": self.retries,
+            "failures": self.failures,
+            "rejected": self.rejected,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "hedge_delay_seconds": round(delay, 3) if delay else 0.0,
+            "circuit_open": int(self.breaker.state != "closed"),
+            "circuit_opens": self.breaker.opens,
+            **{f"rate_limit_{name}": value for name, value in limiter_stats.items()},
+        }
+
+
+_callers: dict[str, ResilientCaller] = {}
+
+
+def get_resilient_caller(name: str, hedge: bool = False) -> ResilientCaller:
+    """
+    Return the process-wide caller for an OpenAI operation, creating it on
+    first use, so every handler shares one breaker and one latency history.
+    """
+    caller = _callers.get(name)
+    if caller is None:
+        caller = ResilientCaller(
+            name,
+            max_attempts=OPENAI_RETRY_ATTEMPTS,
+            backoff=OPENAI_RETRY_BACKOFF,
+            backoff_max=OPENAI_RETRY_BACKOFF_MAX,
+            breaker=CircuitBreaker(name, OPENAI_BREAKER_FAILURES, OPENAI_BREAKER_RESET_SECONDS),
+            hedge=hedge and OPENAI_HEDGING,
+            hedge_min_delay=OPENAI_HEDGE_MIN_DELAY,
+            hedge_min_samples=OPENAI_HEDGE_MIN_SAMPLES,
+            limiter=get_rate_limiter(name)
+        )
+        _callers[name] = caller
+    return caller
+
+
+def resilience_stats() -> dict:
+    return {name: caller.stats() for name, caller in _callers.items()}
@@ -0,0 +1,164 @@
+# handlers/services.py
+
+import logging
+
+from fastapi import Request
+from sqlalchemy.orm import Session
+from twilio.rest import Client
+
+from database import SessionLocal, VoiceJob
+from data.sample_data import recent_recipes_feed
+from handlers.audio_processor import AudioProcessor
+from handlers.auth_handler import AuthHandler
+from handlers.embedding_service import EmbeddingService
+from handlers.idempotency import DatabaseIdempotencyStore, InMemoryIdempotencyStore, WebhookDeduplicator
+from handlers.job_queue import VoiceJobQueue
+from handlers.llm_handler import LLMHandler
+from handlers.media_downloader import close_media_downloader, get_media_downloader
+from handlers.message_sender import MessageSender
+from handlers.openai_client import close_openai_client, get_openai_client
+from handlers.recipe_search import RecipeSearch
+from handlers.resilience import resilience_stats
+from handlers.stripe_handler import StripeHandler
+from handlers.text_intents import TextReplyCache
+from handlers.transcription_cache import TranscriptionCache
+from handlers.twilio_whatsapp_handler import TwilioWhatsAppHandler
+from handlers.voice_job_store import VoiceJobStore
+from config import (
+    TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN, TWILIO_API_BASE_URL, OPENAI_API_KEY,
+    VOICE_WORKER_CONCURRENCY, VOICE_QUEUE_DRAIN_TIMEOUT, VOICE_JOB_POLL_INTERVAL,
+    VOICE_JOB_MAX_ATTEMPTS, VOICE_JOB_LEASE_SECONDS, VOICE_JOB_RETRY_BACKOFF,
+    VOICE_JOB_RETRY_BACKOFF_MAX, VOICE_JOB_MAX_RUNNING_PER_PHONE, VOICE_JOB_RETENTION_SECONDS,
+    WEBHOOK_DEDUP_BACKEND, WEBHOOK_DEDUP_TTL_SECONDS,
+    TRANSCRIPTION_CACHE_MAX_ENTRIES, EMBEDDING_BATCH_SIZE, EMBEDDING_BATCH_WINDOW,
+    TEXT_INTENT_REPLIES, TEXT_REPLY_CACHE_MAX_ENTRIES, TEXT_REPLY_CACHE_TTL_SECONDS, RECIPE_SEARCH_RESULTS
+)
+
+
+class Services:
+    """
+    App-scoped clients and handlers, built once per process. Request handlers
+    get their DB session separately through get_db.
+    """
+
+    def __init__(self):
+        self.logger = logging.getLogger(f"{__name__}.Services")
+        self.openai_client = get_openai_client()
+        self.media_downloader = get_media_downloader()
+        self.twilio_client = Client(TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN)
+        if TWILIO_API_BASE_URL:
+            self.twilio_client.api.base_url = TWILIO_API_BASE_URL
+        self.message_sender = MessageSender(client=self.twilio_client)
+        self.embedding_service = EmbeddingService(
+            client=self.openai_client,
+            max_batch_size=EMBEDDING_BATCH_SIZE,
+            max_wait_seconds=EMBEDDING_BATCH_WINDOW
+        )
+        self.reply_cache = TextReplyCache(
+            max_entries=TEXT_REPLY_CACHE_MAX_ENTRIES,
+            ttl_seconds=TEXT_REPLY_CACHE_TTL_SECONDS
+        ) if TEXT_INTENT_REPLIES else None
+        self.llm_handler = LLMHandler(
+            api_key=OPENAI_API_KEY,
+            client=self.openai_client,
+            embedding_service=self.embedding_service,
+            reply_cache=self.reply_cache
+        )
+        self.recipe_search = RecipeSearch(llm_handler=self.llm_handler, max_results=RECIPE_SEARCH_RESULTS)
+        self.voice_job_store = VoiceJobStore(
+            max_attempts=VOICE_JOB_MAX_ATTEMPTS,
+            lease_seconds=VOICE_JOB_LEASE_SECONDS,
+            retry_backoff=VOICE_JOB_RETRY_BACKOFF,
+            retry_backoff_max=VOICE_JOB_RETRY_BACKOFF_MAX,
+            max_running_per_phone=VOICE_JOB_MAX_RUNNING_PER_PHONE,
+            retention_seconds=VOICE_JOB_RETENTION_SECONDS
+        )
+        self.voice_job_queue = VoiceJobQueue(
+            job_handler=self.run_voice_job,
+            job_store=self.voice_job_store,
+            session_factory=SessionLocal,
+            concurrency=VOICE_WORKER_CONCURRENCY,
+            poll_interval=VOICE_JOB_POLL_INTERVAL
+        )
+        if WEBHOOK_DEDUP_BACKEND == "memory":
+            dedup_store = InMemoryIdempotencyStore(ttl_seconds=WEBHOOK_DEDUP_TTL_SECONDS)
+        else:
+            dedup_store = DatabaseIdempotencyStore(ttl_seconds=WEBHOOK_DEDUP_TTL_SECONDS)
+        self.webhook_deduplicator = WebhookDeduplicator(dedup_store)
+        self.transcription_cache = TranscriptionCache(max_entries=TRANSCRIPTION_CACHE_MAX_ENTRIES)
+        self.audio_processor = AudioProcessor()
+        self.twilio_handler = TwilioWhatsAppHandler(
+            twilio_client=self.twilio_client,
+            llm_handler=self.llm_handler,
+            message_sender=self.message_sender,
+            job_queue=self.voice_job_queue,
+            deduplicator=self.webhook_deduplicator,
+            transcription_cache=self.transcription_cache,
+            audio_processor=self.audio_processor,
+            recipe_search=self.recipe_search
+        )
+        self.stripe_handler = StripeHandler(twilio_handler=self.twilio_handler)
+        self.auth_handler = AuthHandler(message_sender=self.message_sender)
+
+    def component_sources(self) -> dict:
+        """The stats() function of each component, keyed by component name."""
+        return {
+            "media_download": self.media_downloader.stats,
+            "audio_preprocessing": self.audio_processor.stats,
+            "recipe_structuring": self.twilio_handler.voice_message_processor.stats,
+            "pipeline": self.twilio_handler.pipeline_timings.stats,
+            "slug_allocation": self.twilio_handler.slug_allocator.stats,
+            "transcription_cache": self.transcription_cache.stats,
+            "embeddings": self.embedding_service.stats,
+            "openai_resilience": resilience_stats,
+            "text_replies": self.reply_cache.stats if self.reply_cache else dict,
+            "homepage_feed": recent_recipes_feed.stats,
+            "recipe_search": self.recipe_search.stats,
+        }
+
+    def component_stats(self) -> dict:
+        """In-process counters of each component, keyed by component name."""
+        return {component: stats() for component, stats in self.component_sources().items()}
+
+    def metrics_sources(self) -> dict:
+        """
+        Functions returning the counters exported on /metrics, keyed by component
+        name, so a failing one (e.g. the job counts while the database is down)
+        doesn't hide the others.
+        """
+        return {
+            "voice_jobs": self.voice_job_counts,
+            "voice_queue": self.voice_job_queue.stats,
+            "webhook": lambda: {
+                "duplicates": self.webhook_deduplicator.duplicates,
+                "busy_replies": self.twilio_handler.busy_replies,
+            },
+            **self.component_sources(),
+        }
+
+    def voice_job_counts(self) -> dict:
+        """Voice jobs by status, counted in the database with a session of its own."""
+        db = SessionLocal()
+        try:
+            return self.voice_job_store.stats(db)
+        finally:
+            db.close()
+
+    async def run_voice_job(self, job: VoiceJob, db: Session):
+        await self.twilio_handler.run_voice_job(job, db)
+
+    async def start(self, start_workers: bool = True):
+        if start_workers:
+            await self.voice_job_queue.start()
+
+    async def close(self):
+        await self.voice_job_queue.stop(timeout=VOICE_QUEUE_DRAIN_TIMEOUT)
+        await self.embedding_service.close()
+        await close_openai_client()
+        await close_media_downloader()
+        self.logger.info("Services closed")
+
+
+def get_services(request: Request) -> Services:
+    """FastAPI dependency returning the services built in the app lifespan."""
+    return request.app.state.services
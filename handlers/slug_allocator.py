@@ -0,0 +1,69 @@
+# handlers/slug_allocator.py
+
+import logging
+from typing import Optional
+
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from database import Message, SlugCounter
+
+
+def numbered_slug(base_slug: str, number: int) -> str:
+    """The first recipe with a title keeps the bare slug; later ones get -1, -2, ..."""
+    return base_slug if number == 0 else f"{base_slug}-{number}"
+
+
+class SlugAllocator:
+    """
+    Hands out recipe slugs from a counter per user and base slug in the
+    slug_counters table, so allocation costs one indexed upsert however many
+    recipes share a title, and a user's first "tortilla" is /tortilla whatever
+    other users called theirs. The counter row stays locked until the caller's
+    transaction ends, which serializes concurrent allocations of the same slug
+    for one user only; the unique index on (user_id, slug) catches the rest,
+    e.g. "sopa-2" as a title.
+    """
+
+    def __init__(self, max_attempts: int = 5):
+        """
+        :param max_attempts: Slugs tried before giving up when each one is already taken.
+        """
+        self.max_attempts = max_attempts
+        self.allocations = 0
+        self.collisions = 0
+        self.logger = logging.getLogger(f"{__name__}.SlugAllocator")
+
+    def next_slug(self, db: Session, user_id: Optional[int], base_slug: str) -> str:
+        """Increment the user's counter of base_slug and return the slug it yields."""
+        statement = insert(SlugCounter).values(user_id=user_id or 0, base_slug=base_slug, last_number=0)
+        statement = statement.on_conflict_do_update(
+            index_elements=[SlugCounter.user_id, SlugCounter.base_slug],
+            set_={"last_number": SlugCounter.last_number + 1}
+        ).returning(SlugCounter.last_number)
+        number = db.execute(statement).scalar_one()
+        return numbered_slug(base_slug, number)
+
+    def add_with_slug(self, db: Session, message: Message, base_slug: str) -> Message:
+        """
+        Give the message a slug unique among its user's recipes, add it to the
+        session and flush it. The caller commits.
+        """
+        for _ in range(self.max_attempts):
+            message.slug = self.next_slug(db, message.user_id, base_slug)
+            try:
+                with db.begin_nested():
+                    db.add(message)
+                    db.flush()
+            except IntegrityError:
+                # Taken by a recipe whose own title ends in a number, or by a legacy row
+                self.collisions += 1
+                self.logger.info(f"Slug {message.slug} is taken, allocating the next one")
+                continue
+            self.allocations += 1
+            return message
+        raise ValueError(f"No free slug for {base_slug} after {self.max_attempts} attempts")
+
+    def stats(self) -> dict:
+        return {"allocations": self.allocations, "collisions": self.collisions}
@@ -10,6 +10,7 @@ from config import (
     STRIPE_WEBHOOK_SECRET,
     STRIPE_PAYMENT_LINK,
     STRIPE_CUSTOMER_PORTAL_URL,
+    STRIPE_API_BASE,
 )
 
 logger = logging.getLogger(__name__)
@@ -30,6 +31,8 @@ class StripeHandler:
         self.customer_portal_url = STRIPE_CUSTOMER_PORTAL_URL
         self.twilio_handler = twilio_handler
         stripe.api_key = self.api_key
+        if STRIPE_API_BASE:
+            stripe.api_base = STRIPE_API_BASE
 
         if not all([self.api_key, self.webhook_secret, self.payment_link, self.customer_portal_url]):
             raise ValueError("Missing required environment variables for StripeHandler")
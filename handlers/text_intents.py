@@ -0,0 +1,163 @@
+# handlers/text_intents.py
+
+import logging
+import random
+import re
+import unicodedata
+from collections import Counter
+from typing import Optional
+
+from cachetools import TTLCache
+
+from config import STRIPE_PAYMENT_LINK
+from message_templates import INTENT_REPLIES
+
+GREETING_WORDS = {
+    "hola", "holi", "ola", "buenas", "buenos", "buen", "dia", "dias", "tardes", "noches",
+    "hey", "ey", "hi", "hello", "saludos", "que", "tal", "como", "estas", "esta", "va",
+}
+GREETING_CORE = {"hola", "holi", "ola", "buenas", "buenos", "hey", "ey", "hi", "hello", "saludos", "tal"}
+THANKS_WORDS = {
+    "gracias", "muchas", "muchisimas", "mil", "millon", "thanks", "thank", "you", "genial",
+    "perfecto", "estupendo", "fenomenal", "guay", "vale", "ok", "okay", "okey", "oki", "bien",
+    "muy", "super", "buenisimo", "buenisima", "riquisimo", "riquisima", "que", "bonito",
+}
+# "vale" or "ok" alone acknowledges something, often a question, rather than thanking
+THANKS_CORE = {
+    "gracias", "thanks", "thank", "genial", "perfecto", "estupendo", "fenomenal", "guay",
+    "buenisimo", "buenisima", "riquisimo", "riquisima",
+}
+# A bare request for help; with anything else the user is likely describing a problem
+HELP_WORDS = {"ayuda", "help", "instrucciones"}
+HELP_REQUEST_WORDS = {
+    "necesito", "quiero", "me", "ayudas", "ayudar", "puedes", "favor", "porfa", "porfavor", "unas", "las",
+}
+# Words that don't change the intent of a short message
+FILLER_WORDS = {
+    "yaya", "yayarecetas", "y", "a", "ti", "por", "todo", "la", "el", "de", "nada", "guapa",
+    "jaja", "jajaja", "jeje", "jiji", "senora", "amiga", "receta", "recetas", "eh", "oye",
+}
+
+HOW_IT_WORKS_PATTERNS = [
+    re.compile(r"\bcomo (funciona|funcionas|va esto|se usa|te uso|lo uso|uso esto)\b"),
+    re.compile(r"\bque (haces|eres|puedes hacer|sabes hacer)\b"),
+    re.compile(r"\bcomo (te )?(envio|mando|paso|grabo) (una |la |mi |las |mis )?recetas?\b"),
+]
+# Something going wrong needs the model, not a canned reply
+PROBLEM_PATTERN = re.compile(
+    r"\b(no (me )?(llega|llegan|funciona|va|sale|carga|puedo)|error|problema|falla|fallo|roto)\b"
+)
+PRICING_PATTERNS = [
+    re.compile(r"\bcuanto (cuesta|vale|cobras|es|sale)\b"),
+    re.compile(r"\b(precio|precios|coste|tarifa|tarifas|suscripcion|suscribirme|suscribirse|pagar|pago)\b"),
+]
+# Cancelling or a problem with a payment needs more than the sales pitch
+NOT_PRICING_PATTERN = re.compile(r"\b(cancelar|cancela|baja|devolucion|reembolso|cobrado|error|problema)\b")
+# Longer messages are likely to say something the canned replies would ignore
+MAX_PHRASE_INTENT_WORDS = 12
+
+THANKS_EMOJI = {"👍", "🙏", "❤", "😍", "😊", "🥰", "👏", "💕", "♥", "😘", "🤗", "💖", "👌"}
+GREETING_EMOJI = {"👋"}
+
+
+def normalize_message(text: str) -> str:
+    """
+    Lowercase, strip accents and punctuation, and squeeze letters repeated for
+    emphasis ("Holaaa!!" -> "hola"), so spelling variants share one cache key.
+    """
+    text = unicodedata.normalize("NFKD", text.lower())
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    text = re.sub(r"([a-z])\1{2,}", r"\1", text)
+    return " ".join(re.findall(r"[a-z0-9]+", text))
+
+
+def classify_intent(text: str) -> Optional[str]:
+    """
+    Return greeting, thanks, how_it_works or pricing for small talk that a
+    canned reply answers well, or None for anything else.
+    """
+    normalized = normalize_message(text)
+    words = normalized.split()
+    if not words:
+        # Variation selectors, joiners and skin tones don't change the meaning of an emoji
+        emoji = {
+            char for char in text
+            if not char.isspace() and char not in "\ufe0f\u200d" and not "\U0001F3FB" <= char <= "\U0001F3FF"
+        }
+        if emoji and emoji <= THANKS_EMOJI:
+            return "thanks"
+        if emoji and emoji <= GREETING_EMOJI:
+            return "greeting"
+        return None
+
+    if len(words) <= MAX_PHRASE_INTENT_WORDS:
+        if any(pattern.search(normalized) for pattern in PRICING_PATTERNS):
+            if NOT_PRICING_PATTERN.search(normalized) or PROBLEM_PATTERN.search(normalized):
+                return None
+            return "pricing"
+        if any(pattern.search(normalized) for pattern in HOW_IT_WORKS_PATTERNS):
+            return None if PROBLEM_PATTERN.search(normalized) else "how_it_works"
+
+    vocabulary = set(words) - FILLER_WORDS
+    if not vocabulary:
+        return None
+    if vocabulary <= THANKS_WORDS | GREETING_WORDS and vocabulary & THANKS_CORE:
+        # "hola, gracias" is a thank-you
+        return "thanks"
+    if vocabulary <= GREETING_WORDS and vocabulary & GREETING_CORE:
+        return "greeting"
+    if vocabulary & HELP_WORDS and vocabulary <= HELP_WORDS | HELP_REQUEST_WORDS | GREETING_WORDS:
+        # "hola, necesito ayuda" but not "no me llega la receta, ayuda"
+        return "how_it_works"
+    return None
+
+
+class TextReplyCache:
+    """
+    Answers text messages without calling the LLM when possible: common intents
+    get one of several pre-written replies, and a message already answered by
+    the LLM in the same context reuses that answer until it expires.
+    """
+
+    def __init__(self, max_entries: int = 1000, ttl_seconds: float = 3600, reply_values: dict = None):
+        """
+        Initializes the TextReplyCache.
+
+        :param max_entries: LLM replies kept, keyed by normalized message and context. 0 disables reuse.
+        :param ttl_seconds: Seconds an LLM reply is reused for.
+        :param reply_values: Values filled into the intent replies. Defaults to the payment link.
+        """
+        self.replies = TTLCache(maxsize=max_entries, ttl=ttl_seconds) if max_entries else None
+        self.reply_values = reply_values or {"payment_link": STRIPE_PAYMENT_LINK}
+        self.intent_hits = Counter()
+        self.cache_hits = 0
+        self.misses = 0
+        self.logger = logging.getLogger(f"{__name__}.TextReplyCache")
+
+    def get(self, message: str, context: str) -> Optional[str]:
+        """Return a reply without calling the LLM, or None if the message needs the model."""
+        intent = classify_intent(message)
+        if intent:
+            self.intent_hits[intent] += 1
+            return random.choice(INTENT_REPLIES[intent]).format(**self.reply_values)
+        if self.replies is not None:
+            reply = self.replies.get((normalize_message(message), context))
+            if reply is not None:
+                self.cache_hits += 1
+                return reply
+        self.misses += 1
+        return None
+
+    def put(self, message: str, context: str, reply: str):
+        """Remember the LLM's reply to a message that had none."""
+        key = normalize_message(message)
+        if self.replies is not None and key:
+            self.replies[(key, context)] = reply
+
+    def stats(self) -> dict:
+        return {
+            "intent_hits": dict(self.intent_hits),
+            "cache_hits": self.cache_hits,
+            "misses": self.misses,
+            "cached_replies": len(self.replies) if self.replies is not None else 0,
+        }
@@ -0,0 +1,73 @@
+# handlers/token_counter.py
+
+import logging
+import re
+from functools import lru_cache
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+logger = logging.getLogger(__name__)
+
+SENTENCE_END = re.compile(r"(?<=[.!?…])\s+")
+# Rough average for Spanish text when tiktoken is not installed
+CHARS_PER_TOKEN = 4
+
+
+@lru_cache(maxsize=None)
+def _encoding(model: str):
+    if tiktoken is None:
+        return None
+    try:
+        return tiktoken.encoding_for_model(model)
+    except Exception as e:
+        logger.warning(f"No tiktoken encoding for {model}, estimating token counts: {str(e)}")
+        return None
+
+
+def count_tokens(text: str, model: str) -> int:
+    """
+    Count the tokens of text for model. Uses tiktoken when it is installed and
+    otherwise estimates from the character count.
+    """
+    encoding = _encoding(model)
+    if encoding is None:
+        return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+    return len(encoding.encode(text))
+
+
+def split_by_tokens(text: str, max_tokens: int, model: str) -> list[str]:
+    """
+    Split text into pieces of at most max_tokens tokens, breaking between
+    sentences where possible and between words otherwise.
+    """
+    pieces = []
+    current: list[str] = []
+    current_tokens = 0
+
+    def flush():
+        nonlocal current, current_tokens
+        if current:
+            pieces.append(" ".join(current))
+        current, current_tokens = [], 0
+
+    for sentence in SENTENCE_END.split(text.strip()):
+        sentence_tokens = count_tokens(sentence, model)
+        if sentence_tokens > max_tokens:
+            flush()
+            for word in sentence.split():
+                word_tokens = count_tokens(word + " ", model)
+                if current_tokens + word_tokens > max_tokens:
+                    flush()
+                current.append(word)
+                current_tokens += word_tokens
+            flush()
+            continue
+        if current_tokens + sentence_tokens > max_tokens:
+            flush()
+        current.append(sentence)
+        current_tokens += sentence_tokens
+    flush()
+    return pieces
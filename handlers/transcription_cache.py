@@ -0,0 +1,111 @@
+# handlers/transcription_cache.py
+
+import logging
+from datetime import datetime, timezone
+from typing import Optional
+
+from sqlalchemy import func, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from database import TranscriptionCacheEntry, fernet
+
+
+class TranscriptionCache:
+    """
+    Caches the raw transcript, structured recipe and embedding of a voice note
+    by the SHA-256 of its audio, so a forwarded voice note skips Whisper, the
+    LLM and the embedding call. The table size is checked every evict_every
+    puts and least recently used entries beyond max_entries are evicted in
+    batches, so the cap can be exceeded by up to evict_every entries.
+    """
+
+    def __init__(self, max_entries: int = 10000, evict_every: int = 100, evict_batch_size: int = 500):
+        """
+        Initializes the TranscriptionCache.
+
+        :param max_entries: Maximum number of cached voice notes. 0 disables the cache.
+        :param evict_every: Number of puts between two checks of the table size.
+        :param evict_batch_size: Most entries deleted by one eviction.
+        """
+        self.max_entries = max_entries
+        self.evict_every = max(1, evict_every)
+        self.evict_batch_size = evict_batch_size
+        # Starts due so the first put after startup checks the size
+        self.puts_since_check = self.evict_every
+        self.hits = 0
+        self.misses = 0
+        self.evicted = 0
+        self.logger = logging.getLogger(f"{__name__}.TranscriptionCache")
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    def get(self, db: Session, audio_hash: str) -> Optional[TranscriptionCacheEntry]:
+        """
+        Look up a voice note by audio hash and mark it as recently used.
+        """
+        if not self.enabled or not audio_hash:
+            return None
+        entry = db.get(TranscriptionCacheEntry, audio_hash)
+        if entry is None or entry.embedding is None:
+            self.misses += 1
+            return None
+        entry.hits += 1
+        entry.last_used_at = datetime.now(timezone.utc)
+        db.commit()
+        self.hits += 1
+        self.logger.info(f"Transcription cache hit for {audio_hash[:12]}")
+        return entry
+
+    def put(self, db: Session, audio_hash: str, transcript: str, recipe: str, embedding: list[float]):
+        """
+        Store the results for a voice note and, every evict_every puts, evict the
+        least recently used entries beyond max_entries.
+        """
+        if not self.enabled or not audio_hash:
+            return
+        now = datetime.now(timezone.utc)
+        values = {
+            "encrypted_transcript": fernet.encrypt(transcript.encode()),
+            "encrypted_recipe": fernet.encrypt(recipe.encode()),
+            "embedding": embedding,
+            "last_used_at": now,
+        }
+        statement = insert(TranscriptionCacheEntry).values(audio_hash=audio_hash, hits=0, **values)
+        statement = statement.on_conflict_do_update(
+            index_elements=[TranscriptionCacheEntry.audio_hash],
+            set_=values
+        )
+        db.execute(statement)
+        self.puts_since_check += 1
+        if self.puts_since_check >= self.evict_every:
+            self._evict(db)
+        db.commit()
+
+    def _evict(self, db: Session):
+        self.puts_since_check = 0
+        excess = db.scalar(select(func.count()).select_from(TranscriptionCacheEntry)) - self.max_entries
+        if excess <= 0:
+            return
+        batch_size = min(excess, self.evict_batch_size)
+        stale = select(TranscriptionCacheEntry.audio_hash)\
+            .order_by(TranscriptionCacheEntry.last_used_at)\
+            .limit(batch_size)
+        evicted = db.query(TranscriptionCacheEntry)\
+            .filter(TranscriptionCacheEntry.audio_hash.in_(stale))\
+            .delete(synchronize_session=False)
+        self.evicted += evicted
+        if excess > batch_size:
+            # Keep trimming on the next put instead of one long delete
+            self.puts_since_check = self.evict_every
+        self.logger.info(f"Evicted {evicted} transcription cache entries")
+
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evicted": self.evicted,
+            "max_entries": self.max_entries,
+        }
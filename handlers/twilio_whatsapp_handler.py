@@ -1,9 +1,9 @@
+import asyncio
 import logging
 import uuid
 from datetime import datetime, timezone
-import re
+from typing import Callable, Optional
 
-from openai import OpenAI
 from fastapi import HTTPException, Request
 from fastapi.responses import JSONResponse
 from sqlalchemy.orm import Session
@@ -11,64 +11,116 @@ from twilio.request_validator import RequestValidator
 from twilio.rest import Client
 
 from handlers.llm_handler import LLMHandler
+from handlers.openai_client import get_openai_client
 from handlers.voice_message_processor import VoiceMessageProcessor
 from handlers.message_sender import MessageSender
 from handlers.user_manager import UserManager
-from handlers.stripe_handler import StripeHandler
+from handlers.job_queue import VoiceJobQueue
+from handlers.voice_job_store import VoiceJobStore
+from handlers.media_downloader import MediaLimitError
+from handlers.audio_processor import AudioProcessor
+from handlers.idempotency import WebhookDeduplicator
+from handlers.transcription_cache import TranscriptionCache
+from handlers.pipeline import StagePipeline, StageTimings
+from handlers.slug_allocator import SlugAllocator
+from handlers.recipe_search import RecipeSearch, parse_search_command
+from handlers.recipe_summary import DEFAULT_TITLE
+from handlers.metrics import TWILIO_MESSAGES, observe_stage
 
-from database import Message
+from database import Message, VoiceJob
 from config import (
     BASE_URL, TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN, OPENAI_API_KEY,
     TWILIO_WHATSAPP_NUMBER, MAX_WHATSAPP_MESSAGE_LENGTH, ADMIN_PHONE_NUMBER,
-    STRIPE_API_KEY, STRIPE_PAYMENT_LINK, STRIPE_CUSTOMER_PORTAL_URL
+    STRIPE_API_KEY, STRIPE_PAYMENT_LINK, STRIPE_CUSTOMER_PORTAL_URL, STREAM_RECIPE_SECTIONS,
+    VOICE_BACKLOG_BUSY_THRESHOLD
 )
 from message_templates import get_message_template
 
 class TwilioWhatsAppHandler:
-    def __init__(self, db: Session):
+    def __init__(
+        self,
+        twilio_client: Client = None,
+        llm_handler: LLMHandler = None,
+        message_sender: MessageSender = None,
+        job_queue: VoiceJobQueue = None,
+        job_store: VoiceJobStore = None,
+        deduplicator: WebhookDeduplicator = None,
+        transcription_cache: TranscriptionCache = None,
+        audio_processor: AudioProcessor = None,
+        recipe_search: RecipeSearch = None
+    ):
+        """
+        Initializes the TwilioWhatsAppHandler. Build it once per process and pass a
+        DB session to each call; clients not given are created here.
+
+        :param twilio_client: Shared Twilio REST client.
+        :param llm_handler: Shared LLMHandler.
+        :param message_sender: Shared MessageSender.
+        :param job_queue: Worker pool voice jobs are handed to. Without it voice messages are processed inline.
+        :param job_store: Store for durable voice jobs. Defaults to the job queue's store.
+        :param deduplicator: Drops Twilio retries of a MessageSid that was already received.
+        :param transcription_cache: Reuses results for voice notes whose audio was seen before.
+        :param audio_processor: Shared ffmpeg wrapper used to trim and split audio.
+        :param recipe_search: Answers "buscar ..." text messages. Without it they go to the LLM.
+        """
         self.account_sid = TWILIO_ACCOUNT_SID
         self.auth_token = TWILIO_AUTH_TOKEN
         self.openai_api_key = OPENAI_API_KEY
         self.twilio_whatsapp_number = TWILIO_WHATSAPP_NUMBER
         self.base_url = BASE_URL
+        if not all([self.account_sid, self.auth_token, self.openai_api_key, self.twilio_whatsapp_number]):
+            raise ValueError("Missing required environment variables for TwilioWhatsAppHandler")
         self.validator = RequestValidator(self.auth_token)
-        self.twilio_client = Client(self.account_sid, self.auth_token)
-        self.llm_handler = LLMHandler(api_key=self.openai_api_key)
-        self.openai_client = OpenAI(api_key=self.openai_api_key)
+        self.twilio_client = twilio_client or Client(self.account_sid, self.auth_token)
+        self.openai_client = get_openai_client()
+        self.llm_handler = llm_handler or LLMHandler(api_key=self.openai_api_key, client=self.openai_client)
         self.logger = logging.getLogger(f"{__name__}.TwilioWhatsAppHandler")
-        self.stripe_handler = StripeHandler(twilio_handler=self)
         self.voice_message_processor = VoiceMessageProcessor(
             openai_client=self.openai_client,
             llm_handler=self.llm_handler,
-            logger=self.logger
-        )
-        self.message_sender = MessageSender(
-            account_sid=self.account_sid,
-            auth_token=self.auth_token
+            logger=self.logger,
+            audio_processor=audio_processor
         )
-        self.user_manager = UserManager(db)
-        if not all([self.account_sid, self.auth_token, self.openai_api_key, self.twilio_whatsapp_number]):
-            raise ValueError("Missing required environment variables for TwilioWhatsAppHandler")
+        self.message_sender = message_sender or MessageSender(client=self.twilio_client)
+        self.job_queue = job_queue
+        self.job_store = job_store or (job_queue.job_store if job_queue else None)
+        self.deduplicator = deduplicator
+        self.transcription_cache = transcription_cache
+        self.pipeline_timings = StageTimings()
+        self.busy_replies = 0
+        self.slug_allocator = SlugAllocator()
+        self.recipe_search = recipe_search
 
     async def handle_whatsapp_request(self, request: Request, db: Session) -> JSONResponse:
+        message_sid = None
         try:
             form_data = await request.form()
             url = str(request.url)
             signature = request.headers.get('X-Twilio-Signature', '')
             
-            if not self.validator.validate(url, form_data, signature):
+            with observe_stage("signature_validation"):
+                valid_signature = self.validator.validate(url, form_data, signature)
+            if not valid_signature:
                 self.logger.warning("Invalid request signature")
                 return JSONResponse(content={"message": "Invalid request"}, status_code=400)
 
+            # Twilio retries on timeouts and 5xx; a MessageSid we've seen is acknowledged without work
+            if self.deduplicator:
+                message_sid = form_data.get('MessageSid')
+                if not self.deduplicator.first_delivery(db, message_sid):
+                    return JSONResponse(content={"message": "Duplicate delivery ignored"}, status_code=200)
+
             phone_number = form_data.get('From', '').replace('whatsapp:', '')
-            user = self.user_manager.get_user_by_phone(phone_number)
+            user_manager = UserManager(db)
+            with observe_stage("user_lookup"):
+                user = user_manager.get_user_by_phone(phone_number)
 
             media_type = form_data.get('MediaContentType0', '')
             is_voice_message = media_type.startswith('audio/')
 
             if not user:
                 # New user
-                user = self.user_manager.create_user(phone_number)
+                user = user_manager.create_user(phone_number)
                 if is_voice_message:
                     await self.send_templated_message(phone_number, "welcome_with_transcription")
                 else:
@@ -79,6 +131,10 @@ class TwilioWhatsAppHandler:
             if not media_type:
                 # Handle text message
                 user_message = form_data.get('Body', '')
+                search_query = parse_search_command(user_message) if self.recipe_search else None
+                if search_query:
+                    await self.send_search_results(phone_number, user.id, search_query, db)
+                    return JSONResponse(content={"message": "Search results sent"}, status_code=200)
                 context = "User sent a text message. Encourage them to send a voice message with a recipe."
                 ai_response = await self.llm_handler.generate_response(user_message, context)
                 await self.send_templated_message(phone_number, "ai_response", response=ai_response)
@@ -86,11 +142,27 @@ class TwilioWhatsAppHandler:
 
             if is_voice_message:
                 voice_message_url = form_data.get('MediaUrl0')
-                try:
-                    transcription = await self.process_voice_message(phone_number, voice_message_url, db)
-                except ValueError as e:
-                    return JSONResponse(content={"message": str(e)}, status_code=400)
-                return JSONResponse(content={"message": "Voice message processed successfully"}, status_code=200)
+                if self.job_queue is None:
+                    try:
+                        transcription = await self.process_voice_message(phone_number, voice_message_url, db)
+                    except ValueError as e:
+                        return JSONResponse(content={"message": str(e)}, status_code=400)
+                    return JSONResponse(content={"message": "Voice message processed successfully"}, status_code=200)
+
+                if not voice_message_url:
+                    self.logger.error("No media found")
+                    return JSONResponse(content={"message": "No media found"}, status_code=400)
+                job = self.job_store.enqueue(
+                    db,
+                    message_sid=form_data.get('MessageSid'),
+                    media_url=voice_message_url,
+                    phone_number=phone_number
+                )
+                # Acknowledged before a worker is woken, so the user never gets both replies
+                await self.acknowledge_if_busy(job, db)
+                self.job_queue.notify()
+                self.logger.info(f"Queued voice job {job.id} for {phone_number}")
+                return JSONResponse(content={"message": "Voice message queued"}, status_code=200)
             else:
                 await self.send_templated_message(phone_number, "unsupported_media")
                 return JSONResponse(content={"message": f"Unsupported media type: {media_type}"}, status_code=400)
@@ -98,11 +170,34 @@ class TwilioWhatsAppHandler:
         except Exception as e:
             self.logger.exception("Error handling WhatsApp request")
             db.rollback()
+            if self.deduplicator:
+                self.deduplicator.failed(db, message_sid)
             return JSONResponse(content={"message": "Internal server error"}, status_code=500)
 
+    async def send_search_results(self, to_number: str, user_id: int, query: str, db: Session):
+        """Send the sender's recipes that best match a "buscar ..." query, private ones included."""
+        messages = await self.recipe_search.search(db, user_id, query, include_private=True)
+        if not messages:
+            await self.send_templated_message(to_number, "search_no_results", query=query)
+            return
+        results = "\n".join(
+            get_message_template("search_result").format(
+                title=message.title or DEFAULT_TITLE,
+                url=f"{self.base_url}/yaya{user_id}/{message.slug}"
+            )
+            for message in messages
+        )
+        await self.send_templated_message(
+            to_number,
+            "search_results",
+            query=query,
+            results=results,
+            user_recipes_url=f"{self.base_url}/yaya{user_id}"
+        )
+
     async def send_admin_notification(self, user_phone: str, is_split_message: bool, db: Session):
         try:
-            user = self.user_manager.get_user_by_phone(user_phone)
+            user = UserManager(db).get_user_by_phone(user_phone)
             
             status = "📥 NEW USER" if not user else "👤 USER"
             
@@ -114,57 +209,84 @@ class TwilioWhatsAppHandler:
             if is_split_message:
                 message += "\nℹ️ Long message split into multiple parts"
 
-            self.twilio_client.messages.create(
-                body=message,
-                from_=self.twilio_whatsapp_number,
-                to=ADMIN_PHONE_NUMBER
-            )
+            with observe_stage("twilio_send"):
+                await asyncio.to_thread(
+                    self.twilio_client.messages.create,
+                    body=message,
+                    from_=self.twilio_whatsapp_number,
+                    to=ADMIN_PHONE_NUMBER
+                )
+            TWILIO_MESSAGES.labels("admin_notification", "ok").inc()
         except Exception as e:
+            TWILIO_MESSAGES.labels("admin_notification", "error").inc()
             self.logger.error(f"Failed to send admin notification: {str(e)}")
 
-    async def send_transcription(self, to_number: str, transcription: str, embedding: list[float], db: Session):
+    def store_recipe(self, to_number: str, transcription: str, embedding: list[float], db: Session) -> Message:
+        """Add the recipe to the session with a unique slug. The caller commits."""
         try:
-            # Get user from database
-            user = self.user_manager.get_user_by_phone(to_number)
-            user_id = user.id if user else '0'
-            
             # Get base recipe slug
             base_slug = self.get_recipe_slug(transcription, datetime.now(timezone.utc))
-            
-            # Query existing slugs that start with this base_slug
-            existing_slugs = db.query(Message.slug)\
-                .filter(Message.slug.like(f"{base_slug}%"))\
-                .all()
-            
-            # Determine final slug
-            if not existing_slugs:
-                recipe_slug = base_slug
-            else:
-                # Find the highest number and increment
-                max_number = 0
-                for slug in existing_slugs:
-                    match = re.search(r'-(\d+)$', slug[0])
-                    if match:
-                        max_number = max(max_number, int(match.group(1)))
-                recipe_slug = f"{base_slug}-{max_number + 1}"
-            
+
+            user = UserManager(db).get_user_by_phone(to_number)
+
             # Create message record
             db_message = Message(
                 phone_number=to_number, 
+                user_id=user.id if user else None,
                 embedding=embedding,
-                hash=uuid.uuid4().hex,
-                slug=recipe_slug
+                hash=uuid.uuid4().hex
             )
             db_message.text = transcription
-            
-            # Save to database
-            db.add(db_message)
-            db.commit()
-            
+
+            # Add to the session with the next free slug; flushed so the id is available before commit
+            with observe_stage("slug_allocation"):
+                return self.slug_allocator.add_with_slug(db, db_message, base_slug)
+
+        except Exception as e:
+            self.logger.error(f"Failed to store recipe for {to_number}: {str(e)}")
+            raise
+
+    async def send_recipe(
+        self,
+        to_number: str,
+        db_message: Message,
+        db: Session,
+        include_body: bool = True,
+        notify_admin: bool = True
+    ):
+        """
+        Send the recipe link, the recipe itself and the admin notification.
+
+        :param include_body: False when the recipe was already streamed to the user, so only the link is sent.
+        :param notify_admin: False when the caller sends the admin notification itself.
+        """
+        try:
+            user_id = db_message.user_id
+            if user_id is None:
+                user = UserManager(db).get_user_by_phone(to_number)
+                user_id = user.id if user else '0'
+            transcription = db_message.text
+            recipe_slug = db_message.slug
+
             # Generate URL using slug
             transcription_url = f"{self.base_url}/yaya{user_id}/{recipe_slug}"
             user_recipes_url = f"{self.base_url}/yaya{user_id}"
             
+            message_parts = self.split_message(transcription, MAX_WHATSAPP_MESSAGE_LENGTH)
+            is_split_message = len(message_parts) > 1
+
+            if not include_body:
+                # The sections already arrived while the recipe was being written
+                await self.send_templated_message(
+                    to_number,
+                    "recipe_link",
+                    transcription_url=transcription_url,
+                    user_recipes_url=user_recipes_url
+                )
+                if notify_admin:
+                    await self.send_admin_notification(to_number, is_split_message, db)
+                return
+
             # Always send the web link first
             await self.send_templated_message(
                 to_number,
@@ -174,9 +296,6 @@ class TwilioWhatsAppHandler:
             )
             
             # Then send the transcription (either full or split)
-            message_parts = self.split_message(transcription, MAX_WHATSAPP_MESSAGE_LENGTH)
-            is_split_message = len(message_parts) > 1
-            
             if not is_split_message:
                 await self.send_templated_message(
                     to_number, 
@@ -200,50 +319,261 @@ class TwilioWhatsAppHandler:
                     )
             
             # Send admin notification
-            await self.send_admin_notification(to_number, is_split_message, db)
+            if notify_admin:
+                await self.send_admin_notification(to_number, is_split_message, db)
             
         except Exception as e:
-            self.logger.error(f"Failed to send transcription to {to_number}: {str(e)}")
+            self.logger.error(f"Failed to send recipe to {to_number}: {str(e)}")
             raise
 
+    async def acknowledge_if_busy(self, job: VoiceJob, db: Session):
+        """
+        When the backlog is over VOICE_BACKLOG_BUSY_THRESHOLD, tell the user the
+        recipe is queued now instead of confirming once a worker starts on it,
+        which could take a while.
+        """
+        if not VOICE_BACKLOG_BUSY_THRESHOLD or job.acknowledged or job.stage is not None:
+            return
+        backlog = self.job_store.backlog(db)
+        if backlog < VOICE_BACKLOG_BUSY_THRESHOLD:
+            return
+        self.logger.warning(f"Voice backlog at {backlog} jobs, telling {job.phone_number} the recipe is queued")
+        await self.send_templated_message(job.phone_number, "voice_queue_busy")
+        job.acknowledged = True
+        db.commit()
+        self.busy_replies += 1
+
     async def send_templated_message(self, to_number: str, template_key: str, **kwargs):
         await self.message_sender.send_templated_message(to_number, template_key, **kwargs)
 
     async def process_voice_message(self, phone_number: str, voice_message_url: str, db: Session) -> str:
+        """
+        Process a voice message inline, without a job queue. The confirmation is
+        sent while the audio is processed, and the embedding and admin
+        notification run alongside the sends to the user.
+        """
         try:
-            await self.send_templated_message(phone_number, "processing_confirmation")
-
             if not voice_message_url:
                 self.logger.error("No media found")
                 raise ValueError("No media found")
 
             # Log the start of transcription
             self.logger.info(f"Starting transcription for {phone_number}")
+            pipeline = StagePipeline("voice_message", self.pipeline_timings, self.logger)
+            results = pipeline.results
 
-            transcription = await self.voice_message_processor.process_voice_message(
-                voice_message_url,
-                self.account_sid,
-                self.auth_token
-            )
-            
-            # Log the transcription length and first few characters
-            self.logger.info(f"Transcription length: {len(transcription)}")
-            self.logger.info(f"Transcription start: {transcription[:100]}")
+            async def structure() -> str:
+                transcription = await self.voice_message_processor.process_voice_message(
+                    voice_message_url,
+                    self.account_sid,
+                    self.auth_token
+                )
+                # Log the transcription length and first few characters
+                self.logger.info(f"Transcription length: {len(transcription)}")
+                self.logger.info(f"Transcription start: {transcription[:100]}")
+                return transcription
 
-            # Generate embedding
-            embedding = self.llm_handler.generate_embedding(transcription)
+            async def store() -> Message:
+                db_message = self.store_recipe(phone_number, results["structure"], None, db)
+                with observe_stage("db_commit"):
+                    db.commit()
+                return db_message
 
-            # Send transcription with more detailed logging
-            self.logger.info("Sending transcription to user...")
-            await self.send_transcription(phone_number, transcription, embedding, db)
-            self.logger.info("Transcription sent successfully")
+            async def send():
+                self.logger.info("Sending transcription to user...")
+                await self.send_recipe(phone_number, results["store"], db, notify_admin=False)
+                self.logger.info("Transcription sent successfully")
 
-            return transcription
+            async def save_embedding():
+                results["store"].embedding = results["embed"]
+                with observe_stage("db_commit"):
+                    db.commit()
+
+            pipeline.add("confirm", lambda: self.send_templated_message(phone_number, "processing_confirmation"))
+            pipeline.add("structure", structure)
+            pipeline.add("store", store, after=["structure"])
+            pipeline.add("send", send, after=["store"])
+            pipeline.add("notify_admin", lambda: self.notify_admin_of_recipe(phone_number, results["structure"], db),
+                         after=["structure"])
+            pipeline.add("embed", lambda: self.llm_handler.generate_embedding(results["structure"]),
+                         after=["structure"])
+            pipeline.add("save_embedding", save_embedding, after=["store", "embed"])
+            await pipeline.run()
+
+            return results["structure"]
 
         except Exception as e:
             self.logger.error(f"Error in process_voice_message: {str(e)}")
             raise
 
+    async def run_voice_job(self, job: VoiceJob, db: Session):
+        """
+        Run a durable voice job, resuming after the last completed stage.
+
+        Each stage's output is committed with the stage name, so a job picked up
+        again after a crash skips the work that already finished. The audio is
+        not persisted: a job that stopped after downloading fetches it again.
+
+        Stages run as a dependency graph: the confirmation is sent while the
+        audio downloads, and the recipe is stored and sent while its embedding
+        is computed, so neither the confirmation nor the embedding delays the
+        recipe reaching the user. Stages running alongside each other share the
+        session, so the embedding is only held in memory until save_embedding,
+        which runs after the others, commits it.
+        """
+        store = self.job_store
+        pipeline = StagePipeline("voice_job", self.pipeline_timings, self.logger)
+        results = pipeline.results
+
+        async def download():
+            self.logger.info(f"Starting transcription for {job.phone_number}")
+            media = await self.voice_message_processor.download_voice_message(
+                job.media_url,
+                self.account_sid,
+                self.auth_token
+            )
+            job.audio_hash = media.sha256
+            store.complete_stage(db, job, "downloaded")
+            cached = self.transcription_cache.get(db, media.sha256) if self.transcription_cache else None
+            if cached:
+                # Same audio seen before: skip Whisper, post-processing and embedding
+                media.close()
+                job.transcript = cached.transcript
+                job.recipe = cached.recipe
+                job.embedding = list(cached.embedding)
+                store.complete_stage(db, job, "structured")
+                return None
+            return media
+
+        async def transcribe():
+            media = results["download"]
+            if media is None:
+                return
+            with media:
+                job.transcript = await self.voice_message_processor.transcribe_voice_message(
+                    media.file,
+                    media.filename,
+                    media.duration_seconds
+                )
+            store.complete_stage(db, job, "transcribed")
+
+        async def structure():
+            if store.has_reached(job, "structured"):
+                return
+            # Stream only on the first attempt and only once: a deferred job is claimed again
+            # with attempts back at 1, and a retry sends the stored recipe in one go
+            if STREAM_RECIPE_SECTIONS and job.attempts == 1 and not job.recipe_streamed:
+                def mark_streamed():
+                    # Saved as soon as a section reached the user, so a retry after a
+                    # partial stream sends only the link instead of the sections again
+                    job.recipe_streamed = True
+                    store.save_progress(db, job)
+
+                job.recipe = await self.stream_recipe_sections(
+                    job.phone_number,
+                    job.transcript,
+                    on_first_sent=mark_streamed
+                )
+            else:
+                job.recipe = await self.voice_message_processor.post_process_transcription(job.transcript)
+            store.complete_stage(db, job, "structured")
+            self.logger.info(f"Transcription length: {len(job.recipe)}")
+
+        async def store_message():
+            # The recipe and the stage are committed together so a retry never stores it twice
+            db_message = self.store_recipe(job.phone_number, job.recipe, job.embedding, db)
+            job.message_id = db_message.id
+            store.complete_stage(db, job, "stored")
+
+        async def send():
+            db_message = db.get(Message, job.message_id)
+            if db_message is None:
+                raise ValueError(f"Recipe {job.message_id} for voice job {job.id} no longer exists")
+            await self.send_recipe(
+                job.phone_number,
+                db_message,
+                db,
+                include_body=not job.recipe_streamed,
+                notify_admin=False
+            )
+            store.complete_stage(db, job, "sent")
+
+        async def embed():
+            # Only computes the vector: it runs alongside store and send, which share
+            # the session, so committing here could commit their changes early
+            if job.embedding is not None:
+                return None
+            return await self.llm_handler.generate_embedding(job.recipe)
+
+        async def save_embedding():
+            if results.get("embed") is not None:
+                job.embedding = results["embed"]
+            db_message = db.get(Message, job.message_id)
+            if db_message is not None and db_message.embedding is None:
+                db_message.embedding = job.embedding
+            if results.get("embed") is not None and self.transcription_cache:
+                self.transcription_cache.put(db, job.audio_hash, job.transcript, job.recipe, job.embedding)
+            store.complete_stage(db, job, "embedded")
+
+        if job.stage is None and job.attempts == 1 and not job.acknowledged:
+            pipeline.add("confirm", lambda: self.send_templated_message(job.phone_number, "processing_confirmation"))
+        if not store.has_reached(job, "transcribed"):
+            pipeline.add("download", download)
+            pipeline.add("transcribe", transcribe, after=["download"])
+        if not store.has_reached(job, "structured"):
+            pipeline.add("structure", structure, after=["transcribe"])
+        if not store.has_reached(job, "stored"):
+            pipeline.add("store", store_message, after=["structure"])
+        if not store.has_reached(job, "sent"):
+            pipeline.add("send", send, after=["store"])
+            pipeline.add("notify_admin", lambda: self.notify_admin_of_recipe(job.phone_number, job.recipe, db),
+                         after=["structure"])
+        if not store.has_reached(job, "embedded"):
+            pipeline.add("embed", embed, after=["structure"])
+            # Recorded last, so "embedded" never claims the recipe was sent when it wasn't
+            pipeline.add("save_embedding", save_embedding, after=["store", "embed", "send"])
+
+        try:
+            await pipeline.run()
+        except MediaLimitError as e:
+            # Retrying won't make the audio shorter: tell the user and finish the job
+            self.logger.warning(f"Rejected voice message for job {job.id}: {str(e)}")
+            await self.send_templated_message(job.phone_number, "voice_message_too_long")
+
+    async def notify_admin_of_recipe(self, to_number: str, recipe: str, db: Session):
+        is_split_message = len(self.split_message(recipe, MAX_WHATSAPP_MESSAGE_LENGTH)) > 1
+        await self.send_admin_notification(to_number, is_split_message, db)
+
+    async def stream_recipe_sections(
+        self,
+        to_number: str,
+        transcription: str,
+        on_first_sent: Optional[Callable[[], None]] = None
+    ) -> str:
+        """
+        Structure the transcription and send each recipe section as soon as it is complete.
+
+        :param on_first_sent: Called once, right after the first part reaches the user.
+        """
+        async def send_section(section: str, index: int, is_last: bool):
+            parts = self.split_message(section, MAX_WHATSAPP_MESSAGE_LENGTH)
+            for i, part in enumerate(parts):
+                is_first = index == 0 and i == 0
+                if is_first:
+                    template_key = "recipe_section_first"
+                elif is_last and i == len(parts) - 1:
+                    template_key = "recipe_section_last"
+                else:
+                    template_key = "recipe_section"
+                await self.send_templated_message(to_number, template_key, section=part)
+                if is_first and on_first_sent is not None:
+                    on_first_sent()
+
+        return await self.voice_message_processor.stream_post_process_transcription(
+            transcription,
+            send_section
+        )
+
     def split_message(self, text: str, max_length: int) -> list[str]:
         """
         Split a long message into parts that don't exceed max_length.
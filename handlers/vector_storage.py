@@ -0,0 +1,109 @@
+# handlers/vector_storage.py
+
+from typing import Optional
+
+import numpy as np
+from sqlalchemy import Float, LargeBinary
+from sqlalchemy.types import TypeDecorator, UserDefinedType
+
+# Little-endian float32, whatever the byte order of the host
+FLOAT32 = np.dtype("<f4")
+BACKENDS = ("float32", "pgvector")
+# Approximate nearest-neighbour indexes pgvector offers
+PGVECTOR_INDEX_METHODS = ("hnsw", "ivfflat")
+
+
+def to_float32(vector) -> np.ndarray:
+    """A contiguous little-endian float32 copy of an embedding given as a list or array."""
+    return np.ascontiguousarray(vector, dtype=FLOAT32)
+
+
+class Float32Vector(TypeDecorator):
+    """
+    Stores an embedding as the raw bytes of a float32 array: half the size of a
+    double precision ARRAY and portable to any database. Values load as
+    read-only float32 NumPy arrays.
+    """
+
+    impl = LargeBinary
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        return to_float32(value).tobytes()
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        return np.frombuffer(value, dtype=FLOAT32)
+
+    def compare_values(self, x, y):
+        if x is None or y is None:
+            return x is y
+        return np.array_equal(x, y)
+
+
+class PgVector(UserDefinedType):
+    """
+    The vector type of the pgvector extension, which Postgres can index for
+    approximate nearest-neighbour search. Only the extension is needed, not
+    the pgvector Python package. Values load as float32 NumPy arrays.
+    """
+
+    cache_ok = True
+
+    class comparator_factory(UserDefinedType.Comparator):
+        def cosine_distance(self, other):
+            return self.op("<=>", return_type=Float)(other)
+
+    def __init__(self, dimensions: int):
+        self.dimensions = dimensions
+
+    def get_col_spec(self, **kw):
+        return f"vector({self.dimensions})"
+
+    def bind_processor(self, dialect):
+        def process(value):
+            if value is None:
+                return None
+            return "[" + ",".join(repr(float(x)) for x in to_float32(value)) + "]"
+        return process
+
+    def result_processor(self, dialect, coltype):
+        def process(value):
+            if value is None:
+                return None
+            return np.array(value[1:-1].split(","), dtype=FLOAT32)
+        return process
+
+    def compare_values(self, x, y):
+        if x is None or y is None:
+            return x is y
+        return np.array_equal(x, y)
+
+
+def embedding_type(backend: str, dimensions: int):
+    """
+    The column type recipe embeddings are stored with.
+
+    :param backend: 'float32' for float32 bytes in a bytea column, or 'pgvector'
+        for the vector type with an ANN index (needs the extension in Postgres).
+    :param dimensions: Length of the embeddings, fixed by the embedding model.
+    """
+    if backend == "pgvector":
+        return PgVector(dimensions)
+    if backend == "float32":
+        return Float32Vector()
+    raise ValueError(f"Unknown vector storage backend {backend}, expected one of {', '.join(BACKENDS)}")
+
+
+def cosine_distance(column, vector) -> Optional[object]:
+    """
+    SQL expression of the cosine distance between an embedding column and a
+    vector, for ordering nearest neighbours in the database. None when the
+    column's backend can't compare vectors in SQL, i.e. float32 bytes.
+    """
+    if isinstance(column.type, PgVector):
+        return column.cosine_distance(to_float32(vector))
+    return None
@@ -0,0 +1,214 @@
+# handlers/voice_job_store.py
+
+import logging
+import random
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from sqlalchemy import and_, func, or_, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, aliased
+
+from database import VoiceJob
+from handlers.metrics import observe_stage
+
+# The recipe is stored and sent before its embedding is saved, so embedding never delays the user
+VOICE_JOB_STAGES = ["downloaded", "transcribed", "structured", "stored", "sent", "embedded"]
+
+
+class VoiceJobStore:
+    """
+    Persists voice jobs in the voice_jobs table so they survive worker crashes
+    and can be shared between worker processes on several nodes.
+    """
+
+    def __init__(
+        self,
+        max_attempts: int = 5,
+        lease_seconds: float = 600,
+        retry_backoff: float = 10,
+        retry_backoff_max: float = 600,
+        max_running_per_phone: int = 0,
+        retention_seconds: float = 7 * 24 * 3600,
+        purge_probability: float = 0.01
+    ):
+        """
+        Initializes the VoiceJobStore.
+
+        :param max_attempts: Attempts before a job is marked as failed.
+        :param lease_seconds: Seconds without progress after which a running job is considered abandoned.
+        :param retry_backoff: Base delay in seconds before the first retry, doubled on each attempt.
+        :param retry_backoff_max: Upper bound for the retry delay in seconds.
+        :param max_running_per_phone: Running jobs allowed per phone number; further jobs wait. 0 disables the cap.
+        :param retention_seconds: How long done and failed jobs are kept before being purged.
+        :param purge_probability: Chance that an enqueue also purges expired jobs.
+        """
+        self.max_attempts = max_attempts
+        self.lease_seconds = lease_seconds
+        self.retry_backoff = retry_backoff
+        self.retry_backoff_max = retry_backoff_max
+        self.max_running_per_phone = max_running_per_phone
+        self.retention = timedelta(seconds=retention_seconds)
+        self.purge_probability = purge_probability
+        self.logger = logging.getLogger(f"{__name__}.VoiceJobStore")
+
+    def enqueue(self, db: Session, message_sid: str, media_url: str, phone_number: str) -> VoiceJob:
+        """
+        Record a new voice job. A MessageSid that is already known returns the existing job.
+        """
+        job = VoiceJob(
+            message_sid=message_sid or f"local-{uuid.uuid4().hex}",
+            media_url=media_url,
+            phone_number=phone_number,
+            status="pending",
+            attempts=0,
+            next_attempt_at=datetime.now(timezone.utc)
+        )
+        db.add(job)
+        if random.random() < self.purge_probability:
+            self.purge_expired(db)
+        try:
+            db.commit()
+        except IntegrityError:
+            db.rollback()
+            self.logger.info(f"Voice job for MessageSid {message_sid} already exists")
+            return db.query(VoiceJob).filter(VoiceJob.message_sid == message_sid).first()
+        return job
+
+    def claim(self, db: Session) -> Optional[VoiceJob]:
+        """
+        Claim the next due job, skipping rows locked by other workers.
+
+        Pending jobs whose retry time has come are picked first; running jobs whose
+        lease expired (their worker died) are picked up again and resume from the
+        last completed stage.
+
+        Jobs of a phone number that already has max_running_per_phone jobs
+        running are left for later, so one sender can't occupy every worker.
+        The count is read from the table, so the cap holds across processes,
+        although two workers claiming at the same instant may both pass it.
+        """
+        while True:
+            now = datetime.now(timezone.utc)
+            lease_cutoff = now - timedelta(seconds=self.lease_seconds)
+            query = db.query(VoiceJob)\
+                .filter(or_(
+                    and_(VoiceJob.status == "pending", VoiceJob.next_attempt_at <= now),
+                    and_(VoiceJob.status == "running", VoiceJob.locked_at < lease_cutoff)
+                ))
+            if self.max_running_per_phone:
+                running = aliased(VoiceJob)
+                busy_phones = select(running.phone_number)\
+                    .where(running.status == "running", running.locked_at >= lease_cutoff)\
+                    .group_by(running.phone_number)\
+                    .having(func.count(running.id) >= self.max_running_per_phone)
+                query = query.filter(VoiceJob.phone_number.not_in(busy_phones))
+            job = query\
+                .order_by(VoiceJob.next_attempt_at)\
+                .with_for_update(skip_locked=True)\
+                .first()
+            if job is None:
+                db.commit()
+                return None
+
+            if job.attempts >= self.max_attempts:
+                job.status = "failed"
+                job.locked_at = None
+                job.last_error = job.last_error or "Lease expired after last attempt"
+                db.commit()
+                self.logger.error(f"Voice job {job.id} abandoned after {job.attempts} attempts")
+                continue
+
+            job.status = "running"
+            job.locked_at = now
+            job.attempts += 1
+            db.commit()
+            self.logger.info(f"Claimed voice job {job.id} (attempt {job.attempts}, stage {job.stage})")
+            return job
+
+    def has_reached(self, job: VoiceJob, stage: str) -> bool:
+        """Whether the job already completed the given stage."""
+        if job.stage is None:
+            return False
+        current = job.stage
+        if current == "embedded" and job.message_id is None:
+            # Jobs from before the stage reorder were embedded before being stored
+            current = "structured"
+        return VOICE_JOB_STAGES.index(current) >= VOICE_JOB_STAGES.index(stage)
+
+    def complete_stage(self, db: Session, job: VoiceJob, stage: str):
+        """Record a completed stage together with any pending changes and renew the lease."""
+        job.stage = stage
+        self.save_progress(db, job)
+        self.logger.debug(f"Voice job {job.id} reached stage {stage}")
+
+    def save_progress(self, db: Session, job: VoiceJob):
+        """Commit pending changes and renew the lease without moving the stage."""
+        job.locked_at = datetime.now(timezone.utc)
+        with observe_stage("db_commit"):
+            db.commit()
+
+    def mark_done(self, db: Session, job: VoiceJob):
+        """
+        Finish a job and drop its transcript, recipe and embedding: the recipe
+        lives on in messages, where the user can delete it.
+        """
+        job.status = "done"
+        job.locked_at = None
+        job.last_error = None
+        job.encrypted_transcript = None
+        job.encrypted_recipe = None
+        job.embedding = None
+        db.commit()
+
+    def mark_failed(self, db: Session, job: VoiceJob, error: str):
+        """Schedule a retry with exponential backoff, or give up after max_attempts."""
+        job.last_error = error
+        job.locked_at = None
+        if job.attempts >= self.max_attempts:
+            job.status = "failed"
+            self.logger.error(f"Voice job {job.id} failed after {job.attempts} attempts: {error}")
+        else:
+            delay = min(self.retry_backoff_max, self.retry_backoff * 2 ** (job.attempts - 1))
+            delay *= random.uniform(0.8, 1.2)
+            job.status = "pending"
+            job.next_attempt_at = datetime.now(timezone.utc) + timedelta(seconds=delay)
+            self.logger.warning(f"Voice job {job.id} failed at attempt {job.attempts}, retrying in {delay:.0f}s: {error}")
+        db.commit()
+
+    def defer(self, db: Session, job: VoiceJob, delay: float, reason: str):
+        """
+        Put a job back in the queue without spending an attempt, e.g. while a
+        dependency's circuit breaker is open.
+        """
+        job.status = "pending"
+        job.attempts = max(0, job.attempts - 1)
+        job.locked_at = None
+        job.last_error = reason
+        job.next_attempt_at = datetime.now(timezone.utc) + timedelta(seconds=delay)
+        db.commit()
+        self.logger.warning(f"Voice job {job.id} deferred for {delay:.0f}s: {reason}")
+
+    def purge_expired(self, db: Session):
+        """Delete done and failed jobs last updated more than retention_seconds ago."""
+        cutoff = datetime.now(timezone.utc) - self.retention
+        deleted = db.query(VoiceJob)\
+            .filter(VoiceJob.status.in_(["done", "failed"]), VoiceJob.updated_at < cutoff)\
+            .delete(synchronize_session=False)
+        if deleted:
+            self.logger.info(f"Purged {deleted} finished voice jobs")
+
+    def backlog(self, db: Session) -> int:
+        """Number of jobs waiting for a worker, including those waiting for a retry."""
+        return db.query(func.count(VoiceJob.id)).filter(VoiceJob.status == "pending").scalar()
+
+    def stats(self, db: Session) -> dict:
+        """Count jobs by status."""
+        counts = dict(
+            db.query(VoiceJob.status, func.count(VoiceJob.id))
+            .filter(VoiceJob.status.in_(["pending", "running", "failed"]))
+            .group_by(VoiceJob.status)
+            .all()
+        )
+        return {status: counts.get(status, 0) for status in ("pending", "running", "failed")}
@@ -1,49 +1,30 @@
 # handlers/voice_message_processor.py
 
+import asyncio
 import logging
-import requests
-import io
-from openai import OpenAI
+import os
+import tempfile
+from typing import Awaitable, BinaryIO, Callable, NamedTuple, Optional
+from openai import AsyncOpenAI
 from handlers.llm_handler import LLMHandler
-from config import LLM_MODEL, TRANSCRIPTION_MODEL
+from handlers.media_downloader import DownloadedMedia, MediaDownloader, get_media_downloader
+from handlers.audio_processor import AudioProcessor, stitch_transcripts, write_temp_audio
+from handlers.token_counter import count_tokens, split_by_tokens
+from handlers.metrics import observe_stage
+from handlers.resilience import RetryLaterError, get_resilient_caller
+from config import (
+    LLM_MODEL, TRANSCRIPTION_MODEL, OPENAI_TRANSCRIPTION_TIMEOUT, OPENAI_CHAT_TIMEOUT,
+    TRANSCRIPTION_CHUNKING, TRANSCRIPTION_CHUNKING_THRESHOLD_SECONDS, TRANSCRIPTION_CHUNK_SECONDS,
+    TRANSCRIPTION_CHUNK_OVERLAP_SECONDS, TRANSCRIPTION_CHUNK_CONCURRENCY, TRANSCRIPTION_MAX_UPLOAD_BYTES,
+    AUDIO_PREPROCESSING, AUDIO_SILENCE_THRESHOLD_DB, AUDIO_SILENCE_MIN_SECONDS, AUDIO_PREPROCESS_BITRATE,
+    RECIPE_MAX_TOKENS, RECIPE_MAP_REDUCE_THRESHOLD_TOKENS, RECIPE_FRAGMENT_TOKENS, RECIPE_FRAGMENT_MAX_TOKENS,
+    RECIPE_MERGE_MODEL, RECIPE_MERGE_MAX_TOKENS
+)
 
-class VoiceMessageProcessor:
-    def __init__(self, openai_client: OpenAI, llm_handler: LLMHandler, logger: logging.Logger):
-        self.openai_client = openai_client
-        self.llm_handler = llm_handler
-        self.logger = logger
+# Shorter processed audio is most likely a failed trim of a note that is all silence
+MIN_PREPROCESSED_SECONDS = 0.5
 
-    async def process_voice_message(self, voice_message_url: str, account_sid: str, auth_token: str) -> str:
-        try:
-            audio_data = await self.download_voice_message(voice_message_url, account_sid, auth_token)
-            raw_transcription = await self.transcribe_voice_message(audio_data)
-            post_processed_transcript = await self.post_process_transcription(raw_transcription)
-            return post_processed_transcript
-        except Exception as e:
-            self.logger.exception("Error processing voice message")
-            return f"Error processing voice message: {str(e)}"
-
-    async def download_voice_message(self, voice_message_url: str, account_sid: str, auth_token: str) -> bytes:
-        self.logger.info(f"Downloading voice message from URL: {voice_message_url}")
-        response = requests.get(voice_message_url, auth=(account_sid, auth_token))
-        response.raise_for_status()
-        self.logger.info("Voice message downloaded successfully")
-        return response.content
-
-    async def transcribe_voice_message(self, audio_data: bytes) -> str:
-        self.logger.info("Transcribing voice message using OpenAI")
-        audio_file = io.BytesIO(audio_data)
-        audio_file.name = "voice_message.ogg"
-        transcript = self.openai_client.audio.transcriptions.create(model=TRANSCRIPTION_MODEL, file=audio_file)
-        self.logger.info("Transcription successful")
-        return transcript.text
-
-    async def post_process_transcription(self, transcription: str) -> str:
-        try:
-            response = self.openai_client.chat.completions.create(
-                model=LLM_MODEL,
-                messages=[
-                    {"role": "system", "content": """Eres un asistente especializado en estructurar recetas de cocina familiares manteniendo su carácter personal y casero. Tu tarea es organizar recetas transmitidas por mensajes de voz (normalmente de abuelas o cocineros caseros) en un formato claro y fácil de seguir.
+RECIPE_SYSTEM_PROMPT = """Eres un asistente especializado en estructurar recetas de cocina familiares manteniendo su carácter personal y casero. Tu tarea es organizar recetas transmitidas por mensajes de voz (normalmente de abuelas o cocineros caseros) en un formato claro y fácil de seguir.
 
 FORMATO DE SALIDA:
 # [Nombre de la Receta]
@@ -93,12 +74,363 @@ EJEMPLOS DE EXPRESIONES A MANTENER:
 - "Cuando veas que ya está en su punto..."
 - "Hasta que esté doradito..."
 
-Recuerda: El objetivo es organizar la receta manteniendo su carácter casero y personal. La receta debe sonar como si la estuviera contando la persona que la compartió."""},
-                    {"role": "user", "content": f"Por favor, convierte este mensaje de voz en una receta estructurada, manteniendo su carácter auténtico y personal:\n\n{transcription}"}
-                ],
-                max_tokens=1500
+Recuerda: El objetivo es organizar la receta manteniendo su carácter casero y personal. La receta debe sonar como si la estuviera contando la persona que la compartió."""
+
+
+def recipe_messages(transcription: str) -> list[dict]:
+    """Chat messages asking the LLM to structure a transcription as a recipe."""
+    return [
+        {"role": "system", "content": RECIPE_SYSTEM_PROMPT},
+        {"role": "user", "content": f"Por favor, convierte este mensaje de voz en una receta estructurada, manteniendo su carácter auténtico y personal:\n\n{transcription}"}
+    ]
+
+
+FRAGMENT_SYSTEM_PROMPT = """Eres un asistente especializado en recetas de cocina familiares. Vas a recibir un fragmento de la transcripción de un mensaje de voz largo; puede empezar o terminar a mitad de frase.
+
+Extrae SOLO lo que aparece en este fragmento con este formato:
+# [Nombre de la Receta] (solo si se menciona en el fragmento)
+
+## Ingredientes
+- [ingrediente con cantidad]
+
+## Preparación
+1. [paso]
+
+## Notas
+- [nota]
+
+REGLAS:
+1. Mantén TODAS las expresiones exactamente como fueron dichas, incluidas las medidas imprecisas
+2. Omite las secciones que no aparezcan en el fragmento
+3. NUNCA añadas información que no estaba en el fragmento"""
+
+MERGE_SYSTEM_PROMPT = """Eres un asistente especializado en estructurar recetas de cocina familiares. Vas a recibir varias partes de UNA MISMA receta, extraídas en orden de fragmentos consecutivos de un mensaje de voz.
+
+Únelas en una sola receta con exactamente este formato:
+# [Nombre de la Receta]
+
+## Ingredientes
+- [ingrediente 1 con cantidad]
+
+## Preparación
+1. [Primer paso]
+
+## Notas
+- [Nota 1]
+
+REGLAS:
+1. Cada ingrediente aparece una sola vez; si se repite en varias partes, conserva la versión más completa
+2. Mantén el orden de los pasos y numéralos de nuevo desde 1
+3. Conserva las expresiones, medidas imprecisas y comentarios personales tal cual
+4. Omite la sección "Notas" si no hay notas
+5. NUNCA añadas información que no estaba en las partes"""
+
+
+def fragment_messages(fragment: str, index: int, total: int) -> list[dict]:
+    """Chat messages asking the LLM to structure one fragment of a long transcription."""
+    return [
+        {"role": "system", "content": FRAGMENT_SYSTEM_PROMPT},
+        {"role": "user", "content": f"Fragmento {index + 1} de {total}:\n\n{fragment}"}
+    ]
+
+
+def merge_messages(partial_recipes: list[str]) -> list[dict]:
+    """Chat messages asking the LLM to merge partial recipes into one."""
+    parts = "\n\n".join(
+        f"--- Parte {index + 1} ---\n{partial}" for index, partial in enumerate(partial_recipes)
+    )
+    return [
+        {"role": "system", "content": MERGE_SYSTEM_PROMPT},
+        {"role": "user", "content": f"Une estas partes en una sola receta:\n\n{parts}"}
+    ]
+
+
+class RecipeRequest(NamedTuple):
+    """The chat completion that produces the final recipe."""
+    model: str
+    messages: list[dict]
+    max_tokens: int
+    step: str
+
+
+class RecipeSectionSplitter:
+    """
+    Splits streamed recipe Markdown into sections at '## ' headings. The title
+    stays with the first section, and a section is complete once the next
+    heading arrives.
+    """
+
+    def __init__(self):
+        self.partial_line = ""
+        self.current: list[str] = []
+
+    def feed(self, text: str) -> list[str]:
+        """Add streamed text and return the sections it completed."""
+        completed = []
+        lines = (self.partial_line + text).split("\n")
+        self.partial_line = lines.pop()
+        for line in lines:
+            if line.startswith("## ") and any(existing.startswith("## ") for existing in self.current):
+                section = "\n".join(self.current).strip()
+                if section:
+                    completed.append(section)
+                self.current = []
+            self.current.append(line)
+        return completed
+
+    def close(self) -> str:
+        """Return the last section once the stream has ended."""
+        if self.partial_line:
+            self.current.append(self.partial_line)
+            self.partial_line = ""
+        section = "\n".join(self.current).strip()
+        self.current = []
+        return section
+
+
+class VoiceMessageProcessor:
+    def __init__(
+        self,
+        openai_client: AsyncOpenAI,
+        llm_handler: LLMHandler,
+        logger: logging.Logger,
+        media_downloader: MediaDownloader = None,
+        audio_processor: AudioProcessor = None
+    ):
+        self.openai_client = openai_client
+        self.llm_handler = llm_handler
+        self.logger = logger
+        self.media_downloader = media_downloader or get_media_downloader()
+        self.audio_processor = audio_processor or AudioProcessor()
+        # Shared by all jobs in the process, so chunked transcriptions can't flood the API
+        self.chunk_semaphore = asyncio.Semaphore(TRANSCRIPTION_CHUNK_CONCURRENCY)
+        self.map_reduce_runs = 0
+        self.truncations = {"recipe": 0, "fragment": 0, "merge": 0}
+        self.transcription_resilience = get_resilient_caller("transcription")
+        self.chat_resilience = get_resilient_caller("chat", hedge=True)
+
+    async def process_voice_message(self, voice_message_url: str, account_sid: str, auth_token: str) -> str:
+        try:
+            with await self.download_voice_message(voice_message_url, account_sid, auth_token) as media:
+                raw_transcription = await self.transcribe_voice_message(
+                    media.file,
+                    media.filename,
+                    media.duration_seconds
+                )
+            post_processed_transcript = await self.post_process_transcription(raw_transcription)
+            return post_processed_transcript
+        except Exception:
+            # Raised rather than returned, so an error message is never stored as a recipe
+            self.logger.exception("Error processing voice message")
+            raise
+
+    async def download_voice_message(self, voice_message_url: str, account_sid: str, auth_token: str) -> DownloadedMedia:
+        self.logger.info(f"Downloading voice message from URL: {voice_message_url}")
+        with observe_stage("media_download"):
+            media = await self.media_downloader.download(voice_message_url, account_sid, auth_token)
+        self.logger.info("Voice message downloaded successfully")
+        return media
+
+    async def transcribe_voice_message(
+        self,
+        audio_file: BinaryIO,
+        filename: str = "voice_message.ogg",
+        duration_seconds: Optional[float] = None
+    ) -> str:
+        preprocess = AUDIO_PREPROCESSING and self.audio_processor.available
+        if not preprocess and not self._should_chunk(audio_file, duration_seconds):
+            return await self._transcribe_file(audio_file, filename)
+
+        with tempfile.TemporaryDirectory(prefix="yayarecetas-audio-") as directory:
+            path = write_temp_audio(audio_file, filename, directory)
+            duration = None
+            if preprocess:
+                path, duration = await self.preprocess_audio(path, directory)
+            if duration is None:
+                duration = await self.audio_processor.get_duration(path)
+
+            if not TRANSCRIPTION_CHUNKING or (
+                duration <= TRANSCRIPTION_CHUNKING_THRESHOLD_SECONDS
+                and os.path.getsize(path) <= TRANSCRIPTION_MAX_UPLOAD_BYTES
+            ):
+                with open(path, "rb") as processed_file:
+                    return await self._transcribe_file(processed_file, os.path.basename(path))
+            return await self.transcribe_in_chunks(path, duration, directory)
+
+    async def preprocess_audio(self, path: str, directory: str) -> tuple[str, Optional[float]]:
+        """
+        Trim silences and downmix the audio before it is uploaded. Falls back to
+        the original file if ffmpeg fails or trims everything away.
+
+        :return: The path to transcribe and its duration, if known.
+        """
+        output_path = os.path.join(directory, "preprocessed.ogg")
+        try:
+            duration = await self.audio_processor.preprocess(
+                path,
+                output_path,
+                silence_db=AUDIO_SILENCE_THRESHOLD_DB,
+                min_silence_seconds=AUDIO_SILENCE_MIN_SECONDS,
+                bitrate=AUDIO_PREPROCESS_BITRATE
             )
-            return response.choices[0].message.content.strip()
         except Exception as e:
-            self.logger.error(f"Error post-processing transcription: {str(e)}")
-            return transcription
\ No newline at end of file
+            self.logger.warning(f"Audio preprocessing failed, using the original audio: {str(e)}")
+            return path, None
+        if duration < MIN_PREPROCESSED_SECONDS:
+            self.logger.warning("Audio preprocessing removed almost everything, using the original audio")
+            return path, None
+        return output_path, duration
+
+    async def transcribe_in_chunks(self, path: str, duration: float, directory: str) -> str:
+        """
+        Split long audio at silences into overlapping chunks, transcribe them
+        concurrently and stitch the texts back together.
+        """
+        chunk_paths = await self.audio_processor.split(
+            path,
+            duration,
+            TRANSCRIPTION_CHUNK_SECONDS,
+            TRANSCRIPTION_CHUNK_OVERLAP_SECONDS,
+            directory
+        )
+
+        async def transcribe_chunk(chunk_path: str) -> str:
+            async with self.chunk_semaphore:
+                with open(chunk_path, "rb") as chunk_file:
+                    return await self._transcribe_file(chunk_file, os.path.basename(chunk_path))
+
+        texts = await asyncio.gather(*[transcribe_chunk(chunk_path) for chunk_path in chunk_paths])
+        self.logger.info(f"Transcribed {len(texts)} chunks of {duration:.0f}s of audio")
+        return stitch_transcripts(texts)
+
+    def _should_chunk(self, audio_file: BinaryIO, duration_seconds: Optional[float]) -> bool:
+        if not TRANSCRIPTION_CHUNKING or not self.audio_processor.available:
+            return False
+        if duration_seconds is not None and duration_seconds > TRANSCRIPTION_CHUNKING_THRESHOLD_SECONDS:
+            return True
+        audio_file.seek(0, os.SEEK_END)
+        size = audio_file.tell()
+        audio_file.seek(0)
+        # Without a known duration, only files too big for a single upload are probed
+        return size > TRANSCRIPTION_MAX_UPLOAD_BYTES
+
+    async def _transcribe_file(self, audio_file: BinaryIO, filename: str) -> str:
+        self.logger.info("Transcribing voice message using OpenAI")
+
+        async def attempt():
+            # Each retry uploads the file again from the start
+            audio_file.seek(0)
+            return await self.openai_client.audio.transcriptions.create(
+                model=TRANSCRIPTION_MODEL,
+                file=(filename, audio_file),
+                timeout=OPENAI_TRANSCRIPTION_TIMEOUT
+            )
+
+        with observe_stage("transcription"):
+            transcript = await self.transcription_resilience.call(attempt)
+        self.logger.info("Transcription successful")
+        return transcript.text
+
+    async def post_process_transcription(self, transcription: str) -> str:
+        with observe_stage("post_processing") as timer:
+            try:
+                request = await self.build_recipe_request(transcription)
+                response = await self.chat_resilience.call(lambda: self.openai_client.chat.completions.create(
+                    model=request.model,
+                    timeout=OPENAI_CHAT_TIMEOUT,
+                    messages=request.messages,
+                    max_tokens=request.max_tokens
+                ))
+                choice = response.choices[0]
+                self._check_truncation(choice.finish_reason, request.step)
+                return choice.message.content.strip()
+            except RetryLaterError:
+                # Storing the raw transcript would be permanent; let the job be retried instead
+                timer.outcome = "error"
+                raise
+            except Exception as e:
+                timer.outcome = "error"
+                self.logger.error(f"Error post-processing transcription: {str(e)}")
+                return transcription
+
+    async def stream_post_process_transcription(
+        self,
+        transcription: str,
+        on_section: Callable[[str, int, bool], Awaitable[None]]
+    ) -> str:
+        """
+        Structure a transcription while streaming the completion, handing each
+        finished section to on_section as soon as the next heading arrives.
+
+        :param transcription: The raw transcription.
+        :param on_section: Coroutine called with the section text, its index and whether it is the last one.
+        :return: The full structured recipe.
+        """
+        # Includes sending the sections, which overlaps with generating them
+        with observe_stage("post_processing_streamed"):
+            request = await self.build_recipe_request(transcription)
+            # Only opening the stream is retried; hedging would send every section twice
+            stream = await self.chat_resilience.call(lambda: self.openai_client.chat.completions.create(
+                model=request.model,
+                timeout=OPENAI_CHAT_TIMEOUT,
+                messages=request.messages,
+                max_tokens=request.max_tokens,
+                stream=True
+            ), hedge=False)
+            splitter = RecipeSectionSplitter()
+            parts = []
+            index = 0
+            async for chunk in stream:
+                if not chunk.choices:
+                    continue
+                self._check_truncation(chunk.choices[0].finish_reason, request.step)
+                delta = chunk.choices[0].delta.content or ""
+                parts.append(delta)
+                for section in splitter.feed(delta):
+                    await on_section(section, index, False)
+                    index += 1
+
+            # Whatever remains when the stream ends is the last section
+            last_section = splitter.close()
+            if last_section:
+                await on_section(last_section, index, True)
+            return "".join(parts).strip()
+
+    async def build_recipe_request(self, transcription: str) -> RecipeRequest:
+        """
+        Decide how the final recipe is produced. Transcriptions that fit the
+        output budget are structured in one call. Longer ones are split into
+        fragments that are structured in parallel, and the final call only
+        merges the partial recipes.
+        """
+        tokens = count_tokens(transcription, LLM_MODEL)
+        if tokens <= RECIPE_MAP_REDUCE_THRESHOLD_TOKENS:
+            return RecipeRequest(LLM_MODEL, recipe_messages(transcription), RECIPE_MAX_TOKENS, "recipe")
+
+        fragments = split_by_tokens(transcription, RECIPE_FRAGMENT_TOKENS, LLM_MODEL)
+        self.logger.info(f"Structuring a {tokens}-token transcription in {len(fragments)} fragments")
+        partial_recipes = await asyncio.gather(*[
+            self._structure_fragment(fragment, index, len(fragments))
+            for index, fragment in enumerate(fragments)
+        ])
+        self.map_reduce_runs += 1
+        return RecipeRequest(RECIPE_MERGE_MODEL, merge_messages(partial_recipes), RECIPE_MERGE_MAX_TOKENS, "merge")
+
+    async def _structure_fragment(self, fragment: str, index: int, total: int) -> str:
+        response = await self.chat_resilience.call(lambda: self.openai_client.chat.completions.create(
+            model=LLM_MODEL,
+            timeout=OPENAI_CHAT_TIMEOUT,
+            messages=fragment_messages(fragment, index, total),
+            max_tokens=RECIPE_FRAGMENT_MAX_TOKENS
+        ))
+        choice = response.choices[0]
+        self._check_truncation(choice.finish_reason, "fragment")
+        return choice.message.content.strip()
+
+    def _check_truncation(self, finish_reason: Optional[str], step: str):
+        if finish_reason == "length":
+            self.truncations[step] += 1
+            self.logger.warning(f"Recipe {step} output was truncated at the max_tokens limit")
+
+    def stats(self) -> dict:
+        return {"map_reduce_runs": self.map_reduce_runs, "truncations": dict(self.truncations)}
@@ -0,0 +1,274 @@
+"""
+Local stand-ins for the Twilio, OpenAI and Stripe APIs the app calls, with
+configurable latency and error injection, for load tests that run offline.
+
+One server answers for all three providers:
+  Twilio  POST /2010-04-01/Accounts/{sid}/Messages.json, GET /media/{name}
+  OpenAI  POST /v1/audio/transcriptions, /v1/chat/completions (also streamed), /v1/embeddings
+  Stripe  GET /v1/customers/{id}, GET /v1/subscriptions/{id}
+  Stats   GET /_stats returns request and injected error counts per endpoint
+
+Point the app at it with:
+  TWILIO_API_BASE_URL=http://127.0.0.1:8099
+  OPENAI_BASE_URL=http://127.0.0.1:8099/v1
+  STRIPE_API_BASE=http://127.0.0.1:8099
+
+Run with: python -m loadtest.fake_providers [--port 8099] [--latency openai_transcriptions=4]
+          [--error-rate twilio_messages=0.02] [--jitter 0.2]
+"""
+import argparse
+import asyncio
+import base64
+import hashlib
+import json
+import random
+import struct
+import time
+import uuid
+from collections import Counter
+
+from aiohttp import web
+
+# Typical provider latencies in seconds; override with --latency endpoint=seconds
+DEFAULT_LATENCIES = {
+    "twilio_messages": 0.15,
+    "twilio_media": 0.1,
+    "openai_transcriptions": 3.0,
+    "openai_chat": 4.0,
+    "openai_embeddings": 0.2,
+    "stripe_customers": 0.15,
+    "stripe_subscriptions": 0.15,
+}
+EMBEDDING_DIMENSIONS = 1536
+
+RECIPE = """# Tortilla de patatas de la abuela
+
+## Ingredientes
+- 6 huevos
+- 4 patatas medianas
+- 1 cebolla
+- Aceite de oliva, un buen chorro
+- Sal al gusto
+
+## Preparación
+1. Pelar las patatas y cortarlas finitas.
+2. Freírlas a fuego lento con la cebolla hasta que estén blanditas.
+3. Batir los huevos con una pizca de sal y mezclar con las patatas.
+4. Cuajar la tortilla por los dos lados, que quede jugosita por dentro.
+
+## Notas
+- La abuela siempre decía que la paciencia es el ingrediente secreto."""
+
+TRANSCRIPT = (
+    "Bueno, esta es la tortilla de mi abuela. Necesitas seis huevos, cuatro patatas medianas, "
+    "una cebolla, un buen chorro de aceite de oliva y sal al gusto. Pelas las patatas, las cortas "
+    "finitas y las fríes a fuego lento con la cebolla hasta que estén blanditas."
+)
+
+
+class FaultInjector:
+    """Delays responses and fails a share of them, per endpoint."""
+
+    def __init__(self, latencies: dict[str, float], error_rates: dict[str, float], jitter: float, error_status: int):
+        self.latencies = latencies
+        self.error_rates = error_rates
+        self.jitter = jitter
+        self.error_status = error_status
+        self.requests = Counter()
+        self.errors = Counter()
+
+    async def apply(self, endpoint: str) -> bool:
+        """Sleep for the endpoint's latency and return True if this request should fail."""
+        self.requests[endpoint] += 1
+        latency = self.latencies.get(endpoint, 0.0)
+        if latency:
+            await asyncio.sleep(max(0.0, latency * random.uniform(1 - self.jitter, 1 + self.jitter)))
+        if random.random() < self.error_rates.get(endpoint, 0.0):
+            self.errors[endpoint] += 1
+            return True
+        return False
+
+    def error_response(self, message: str) -> web.Response:
+        return web.json_response(
+            {"error": {"message": message, "type": "server_error"}, "code": 20500, "message": message, "status": self.error_status},
+            status=self.error_status
+        )
+
+
+def fake_embedding(text: str) -> list[float]:
+    # Deterministic per text, so repeated recipes embed identically
+    rng = random.Random(hashlib.sha256(text.encode()).digest())
+    return [rng.uniform(-0.05, 0.05) for _ in range(EMBEDDING_DIMENSIONS)]
+
+
+def build_app(faults: FaultInjector, media: bytes, repeat_media: bool = False) -> web.Application:
+    routes = web.RouteTableDef()
+
+    @routes.post("/2010-04-01/Accounts/{account_sid}/Messages.json")
+    async def twilio_messages(request: web.Request):
+        form = await request.post()
+        if await faults.apply("twilio_messages"):
+            return faults.error_response("Injected Twilio error")
+        return web.json_response({
+            "sid": f"SM{uuid.uuid4().hex}",
+            "account_sid": request.match_info["account_sid"],
+            "from": form.get("From"),
+            "to": form.get("To"),
+            "body": form.get("Body"),
+            "status": "queued",
+            "num_segments": "1",
+            "direction": "outbound-api",
+            "api_version": "2010-04-01",
+        }, status=201)
+
+    @routes.get("/media/{name}")
+    async def twilio_media(request: web.Request):
+        if await faults.apply("twilio_media"):
+            return faults.error_response("Injected media error")
+        body = media
+        if not repeat_media:
+            # A per-URL suffix gives every voice note its own hash, so the transcription cache misses
+            body = media + request.match_info["name"].encode()
+        return web.Response(body=body, content_type="audio/ogg")
+
+    @routes.post("/v1/audio/transcriptions")
+    async def openai_transcriptions(request: web.Request):
+        await request.read()
+        if await faults.apply("openai_transcriptions"):
+            return faults.error_response("Injected transcription error")
+        return web.json_response({"text": TRANSCRIPT})
+
+    @routes.post("/v1/chat/completions")
+    async def openai_chat(request: web.Request):
+        payload = await request.json()
+        if await faults.apply("openai_chat"):
+            return faults.error_response("Injected chat error")
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        created = int(time.time())
+        if not payload.get("stream"):
+            return web.json_response({
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": created,
+                "model": payload.get("model"),
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": RECIPE},
+                    "finish_reason": "stop",
+                }],
+                "usage": {"prompt_tokens": 500, "completion_tokens": 200, "total_tokens": 700},
+            })
+
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+        lines = RECIPE.splitlines(keepends=True)
+        for index, line in enumerate(lines):
+            chunk = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": payload.get("model"),
+                "choices": [{
+                    "index": 0,
+                    "delta": {"content": line},
+                    "finish_reason": "stop" if index == len(lines) - 1 else None,
+                }],
+            }
+            await response.write(f"data: {json.dumps(chunk)}\n\n".encode())
+            await asyncio.sleep(0.02)
+        await response.write(b"data: [DONE]\n\n")
+        await response.write_eof()
+        return response
+
+    @routes.post("/v1/embeddings")
+    async def openai_embeddings(request: web.Request):
+        payload = await request.json()
+        if await faults.apply("openai_embeddings"):
+            return faults.error_response("Injected embeddings error")
+        texts = payload["input"] if isinstance(payload["input"], list) else [payload["input"]]
+        data = []
+        for index, text in enumerate(texts):
+            vector = fake_embedding(str(text))
+            if payload.get("encoding_format") == "base64":
+                # The OpenAI SDK asks for base64 float32 when numpy is installed
+                embedding = base64.b64encode(struct.pack(f"<{len(vector)}f", *vector)).decode()
+            else:
+                embedding = vector
+            data.append({"object": "embedding", "index": index, "embedding": embedding})
+        return web.json_response({
+            "object": "list",
+            "data": data,
+            "model": payload.get("model"),
+            "usage": {"prompt_tokens": 100 * len(texts), "total_tokens": 100 * len(texts)},
+        })
+
+    @routes.get("/v1/customers/{customer_id}")
+    async def stripe_customers(request: web.Request):
+        if await faults.apply("stripe_customers"):
+            return faults.error_response("Injected Stripe error")
+        customer_id = request.match_info["customer_id"]
+        # cus_34600000001 belongs to +34600000001, matching the replay harness
+        digits = customer_id.split("_", 1)[-1]
+        return web.json_response({
+            "id": customer_id,
+            "object": "customer",
+            "phone": f"+{digits}" if digits.isdigit() else "+34600000000",
+        })
+
+    @routes.get("/v1/subscriptions/{subscription_id}")
+    async def stripe_subscriptions(request: web.Request):
+        if await faults.apply("stripe_subscriptions"):
+            return faults.error_response("Injected Stripe error")
+        now = int(time.time())
+        return web.json_response({
+            "id": request.match_info["subscription_id"],
+            "object": "subscription",
+            "status": "active",
+            "current_period_start": now,
+            "current_period_end": now + 30 * 24 * 3600,
+        })
+
+    @routes.get("/_stats")
+    async def stats(request: web.Request):
+        return web.json_response({"requests": dict(faults.requests), "errors": dict(faults.errors)})
+
+    app = web.Application(client_max_size=64 * 1024 * 1024)
+    app.add_routes(routes)
+    return app
+
+
+def parse_overrides(values: list[str]) -> dict[str, float]:
+    overrides = {}
+    for value in values:
+        endpoint, _, number = value.partition("=")
+        if endpoint not in DEFAULT_LATENCIES:
+            raise argparse.ArgumentTypeError(f"Unknown endpoint {endpoint}; use one of {', '.join(DEFAULT_LATENCIES)}")
+        overrides[endpoint] = float(number)
+    return overrides
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--latency", action="append", default=[], help="endpoint=seconds, repeatable")
+    parser.add_argument("--error-rate", action="append", default=[], help="endpoint=fraction, repeatable")
+    parser.add_argument("--jitter", type=float, default=0.2, help="Latency varies by up to this fraction")
+    parser.add_argument("--error-status", type=int, default=500)
+    parser.add_argument("--media-file", help="Audio served for every media URL; zero bytes by default")
+    parser.add_argument("--media-bytes", type=int, default=64 * 1024)
+    parser.add_argument("--repeat-media", action="store_true", help="Serve identical audio so repeats hit the cache")
+    args = parser.parse_args()
+
+    latencies = {**DEFAULT_LATENCIES, **parse_overrides(args.latency)}
+    faults = FaultInjector(latencies, parse_overrides(args.error_rate), args.jitter, args.error_status)
+    if args.media_file:
+        with open(args.media_file, "rb") as media_file:
+            media = media_file.read()
+    else:
+        media = bytes(args.media_bytes)
+    web.run_app(build_app(faults, media, args.repeat_media), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,212 @@
+"""
+Replays signed Twilio and Stripe webhook traffic against a running app at a
+target rate and reports throughput, latency percentiles and error rates.
+
+Requests are sent open-loop: they start on schedule whether or not earlier
+ones have finished, as real webhook traffic does. Start the app against
+loadtest.fake_providers first, with the same TWILIO_AUTH_TOKEN and
+STRIPE_WEBHOOK_SECRET this harness signs with.
+
+Run with: python -m loadtest.replay [--target http://127.0.0.1:8000] [--rate 20]
+          [--duration 60] [--mix voice=0.6,text=0.3,stripe=0.1]
+          [--media-base-url http://127.0.0.1:8099]
+"""
+import argparse
+import asyncio
+import hashlib
+import hmac
+import json
+import random
+import time
+import uuid
+from collections import defaultdict
+
+import httpx
+from twilio.request_validator import RequestValidator
+
+from config import TWILIO_AUTH_TOKEN, STRIPE_WEBHOOK_SECRET
+
+
+class Results:
+    def __init__(self):
+        self.latencies: dict[str, list[float]] = defaultdict(list)
+        self.errors: dict[str, int] = defaultdict(int)
+        self.statuses: dict[str, dict[int, int]] = defaultdict(lambda: defaultdict(int))
+        self.dropped = 0
+
+    def record(self, kind: str, seconds: float, status: int):
+        self.latencies[kind].append(seconds)
+        self.statuses[kind][status] += 1
+        if status >= 400 or status == 0:
+            self.errors[kind] += 1
+
+    def summary(self, elapsed: float) -> dict:
+        report = {}
+        for kind in sorted(self.latencies) + ["all"]:
+            if kind == "all":
+                latencies = [seconds for values in self.latencies.values() for seconds in values]
+                errors = sum(self.errors.values())
+                statuses = {}
+            else:
+                latencies = self.latencies[kind]
+                errors = self.errors[kind]
+                statuses = dict(self.statuses[kind])
+            latencies = sorted(latencies)
+            report[kind] = {
+                "requests": len(latencies),
+                "throughput_per_second": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+                "error_rate": round(errors / len(latencies), 4) if latencies else 0.0,
+                "p50_ms": percentile(latencies, 0.50),
+                "p95_ms": percentile(latencies, 0.95),
+                "p99_ms": percentile(latencies, 0.99),
+                "statuses": statuses,
+            }
+        report["dropped"] = self.dropped
+        return report
+
+
+def percentile(sorted_values: list[float], p: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return round(sorted_values[min(len(sorted_values) - 1, int(p * len(sorted_values)))] * 1000, 1)
+
+
+class WebhookFactory:
+    """Builds signed webhook requests the way Twilio and Stripe send them."""
+
+    def __init__(self, target: str, media_base_url: str, users: int):
+        self.whatsapp_url = f"{target.rstrip('/')}/whatsapp"
+        self.stripe_url = f"{target.rstrip('/')}/webhook"
+        self.media_base_url = media_base_url.rstrip("/")
+        self.phone_numbers = [f"+34600{index:06d}" for index in range(users)]
+        self.validator = RequestValidator(TWILIO_AUTH_TOKEN)
+
+    def twilio(self, voice: bool) -> tuple[str, dict, dict]:
+        message_sid = f"SM{uuid.uuid4().hex}"
+        params = {
+            "MessageSid": message_sid,
+            "AccountSid": "AC" + "0" * 32,
+            "From": f"whatsapp:{random.choice(self.phone_numbers)}",
+            "To": "whatsapp:+14155238886",
+            "Body": "" if voice else "hola, ¿cómo funciona?",
+            "NumMedia": "1" if voice else "0",
+        }
+        if voice:
+            params["MediaContentType0"] = "audio/ogg"
+            params["MediaUrl0"] = f"{self.media_base_url}/media/{message_sid}.ogg"
+        headers = {"X-Twilio-Signature": self.validator.compute_signature(self.whatsapp_url, params)}
+        return self.whatsapp_url, params, headers
+
+    def stripe(self) -> tuple[str, bytes, dict]:
+        phone_number = random.choice(self.phone_numbers)
+        event = {
+            "id": f"evt_{uuid.uuid4().hex}",
+            "object": "event",
+            "type": "checkout.session.completed",
+            "data": {"object": {
+                "id": f"cs_{uuid.uuid4().hex}",
+                "object": "checkout.session",
+                "mode": "subscription",
+                "customer": f"cus_{phone_number.lstrip('+')}",
+                "subscription": f"sub_{uuid.uuid4().hex[:14]}",
+            }},
+        }
+        payload = json.dumps(event).encode()
+        timestamp = int(time.time())
+        signature = hmac.new(
+            STRIPE_WEBHOOK_SECRET.encode(),
+            f"{timestamp}.".encode() + payload,
+            hashlib.sha256
+        ).hexdigest()
+        headers = {"Stripe-Signature": f"t={timestamp},v1={signature}", "Content-Type": "application/json"}
+        return self.stripe_url, payload, headers
+
+
+async def send(client: httpx.AsyncClient, factory: WebhookFactory, kind: str, results: Results):
+    if kind == "stripe":
+        url, payload, headers = factory.stripe()
+        request = client.post(url, content=payload, headers=headers)
+    else:
+        url, params, headers = factory.twilio(voice=kind == "voice")
+        request = client.post(url, data=params, headers=headers)
+    started = time.perf_counter()
+    try:
+        response = await request
+        status = response.status_code
+    except httpx.HTTPError:
+        status = 0
+    results.record(kind, time.perf_counter() - started, status)
+
+
+def parse_mix(value: str) -> dict[str, float]:
+    mix = {}
+    for item in value.split(","):
+        kind, _, weight = item.partition("=")
+        if kind not in ("voice", "text", "stripe"):
+            raise argparse.ArgumentTypeError(f"Unknown traffic kind {kind}")
+        mix[kind] = float(weight)
+    return mix
+
+
+async def run(args) -> dict:
+    factory = WebhookFactory(args.target, args.media_base_url, args.users)
+    results = Results()
+    kinds, weights = zip(*args.mix.items())
+    limits = httpx.Limits(max_connections=args.max_in_flight, max_keepalive_connections=args.max_in_flight)
+    in_flight: set[asyncio.Task] = set()
+
+    async with httpx.AsyncClient(timeout=args.timeout, limits=limits) as client:
+        started = time.perf_counter()
+        total = int(args.rate * args.duration)
+        for index in range(total):
+            # Open loop: keep to the schedule instead of waiting for responses
+            delay = started + index / args.rate - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            if len(in_flight) >= args.max_in_flight:
+                results.dropped += 1
+                continue
+            task = asyncio.create_task(send(client, factory, random.choices(kinds, weights)[0], results))
+            in_flight.add(task)
+            task.add_done_callback(in_flight.discard)
+        if in_flight:
+            await asyncio.wait(in_flight)
+        elapsed = time.perf_counter() - started
+    return results.summary(elapsed)
+
+
+def print_report(report: dict):
+    print(f"{'kind':<8} {'requests':>8} {'req/s':>8} {'errors':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for kind, stats in report.items():
+        if kind == "dropped":
+            continue
+        print(
+            f"{kind:<8} {stats['requests']:>8} {stats['throughput_per_second']:>8.2f} "
+            f"{stats['error_rate']:>8.2%} {stats['p50_ms']:>9.1f} {stats['p95_ms']:>9.1f} {stats['p99_ms']:>9.1f}"
+        )
+    if report["dropped"]:
+        print(f"dropped {report['dropped']} requests at the in-flight limit")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--target", default="http://127.0.0.1:8000")
+    parser.add_argument("--media-base-url", default="http://127.0.0.1:8099")
+    parser.add_argument("--rate", type=float, default=10, help="Requests per second")
+    parser.add_argument("--duration", type=float, default=30, help="Seconds of traffic")
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix("voice=0.6,text=0.3,stripe=0.1"))
+    parser.add_argument("--users", type=int, default=200, help="Distinct phone numbers sending messages")
+    parser.add_argument("--max-in-flight", type=int, default=500)
+    parser.add_argument("--timeout", type=float, default=30)
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,31 +1,34 @@
 # Standard library imports
 import logging
+from contextlib import asynccontextmanager
 from datetime import datetime, timedelta
+from typing import Optional
 from cachetools import TTLCache
 
 # Third-party imports
 import stripe
 from fastapi import Depends, FastAPI, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.responses import JSONResponse, RedirectResponse, Response
 from fastapi.templating import Jinja2Templates
 from fastapi.staticfiles import StaticFiles
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, load_only
 import markdown2
 from starlette.middleware.sessions import SessionMiddleware
 
 # Local imports
-from handlers.stripe_handler import StripeHandler
-from handlers.twilio_whatsapp_handler import TwilioWhatsAppHandler
+from handlers.services import Services, get_services
+from handlers.metrics import HTTPMetricsMiddleware, register_services, render_metrics, unregister_services
 from database import DATABASE_URL, Message, User, get_db
 from config import (
     BASE_URL, STRIPE_PAYMENT_LINK, STRIPE_CUSTOMER_PORTAL_URL,
     TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN, OPENAI_API_KEY,
     TWILIO_WHATSAPP_NUMBER, LOG_LEVEL, MAX_WHATSAPP_MESSAGE_LENGTH,
     STRIPE_WEBHOOK_SECRET, STRIPE_API_KEY,
-    ADMIN_PHONE_NUMBER, WHATSAPP_LINK
+    ADMIN_PHONE_NUMBER, WHATSAPP_LINK, VOICE_WORKERS_IN_WEB
 )
 from data.sample_data import get_sample_recipes
-from handlers.auth_handler import AuthHandler
+from handlers.recipe_summary import DEFAULT_TITLE
 
 # Configure logging
 logging.basicConfig(
@@ -34,7 +37,18 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Clients and handlers are built once per process and shared by all requests
+    services = Services()
+    app.state.services = services
+    metrics_collector = register_services(services)
+    await services.start(start_workers=VOICE_WORKERS_IN_WEB)
+    yield
+    await services.close()
+    unregister_services(metrics_collector)
+
+app = FastAPI(lifespan=lifespan)
 
 # Mount static files directory
 app.mount("/static", StaticFiles(directory="static"), name="static")
@@ -55,12 +69,32 @@ def markdown_to_html(text):
 
 templates.env.filters["markdown"] = markdown_to_html
 
-# Create an instance of TwilioWhatsAppHandler with dependency injection
+# The app-scoped TwilioWhatsAppHandler gets a per-request DB session
 @app.post("/whatsapp", response_model=None)
-async def whatsapp(request: Request, db: Session = Depends(get_db)):
-    twilio_whatsapp_handler = TwilioWhatsAppHandler(db)
+async def whatsapp(
+    request: Request,
+    db: Session = Depends(get_db),
+    services: Services = Depends(get_services)
+):
     logger.debug("Received request to /whatsapp endpoint")
-    return await twilio_whatsapp_handler.handle_whatsapp_request(request, db)
+    return await services.twilio_handler.handle_whatsapp_request(request, db)
+
+@app.get("/jobs/stats")
+async def voice_job_stats(
+    db: Session = Depends(get_db),
+    services: Services = Depends(get_services)
+):
+    return {
+        **services.voice_job_store.stats(db),
+        **services.voice_job_queue.stats(),
+        **services.component_stats()
+    }
+
+@app.get("/metrics")
+async def metrics():
+    # Collecting runs a database query, which must not block the event loop
+    content, content_type = await run_in_threadpool(render_metrics)
+    return Response(content=content, media_type=content_type)
 
 logger.info(f"TWILIO_ACCOUNT_SID: {TWILIO_ACCOUNT_SID[:8]}...")
 logger.info(f"TWILIO_AUTH_TOKEN: {TWILIO_AUTH_TOKEN[:8]}...")
@@ -68,13 +102,6 @@ logger.info(f"OPENAI_API_KEY: {OPENAI_API_KEY[:8]}...")
 logger.info(f"STRIPE_WEBHOOK_SECRET: {STRIPE_WEBHOOK_SECRET[:16]}...")
 logger.info(f"DEBUG MODE: {LOG_LEVEL}")
 
-# Initialize StripeHandler with TwilioWhatsAppHandler
-twilio_whatsapp_handler = TwilioWhatsAppHandler(get_db())
-stripe_handler = StripeHandler(twilio_handler=twilio_whatsapp_handler)
-
-# Add this near the top of main.py with other initializations
-auth_handler = AuthHandler()
-
 RATE_LIMIT_WINDOW = timedelta(minutes=5)
 
 # Create a cache that expires entries after 5 minutes
@@ -84,11 +111,16 @@ verification_cache = TTLCache(maxsize=100, ttl=300)  # 300 seconds = 5 minutes
 verification_attempts = TTLCache(maxsize=100, ttl=300)  # 5 minutes timeout
 
 @app.post("/create-checkout-session")
-async def create_checkout_session():
-    return stripe_handler.create_checkout_session()
+async def create_checkout_session(services: Services = Depends(get_services)):
+    return services.stripe_handler.create_checkout_session()
 
 @app.post("/webhook")
-async def webhook_received(request: Request, db: Session = Depends(get_db)):
+async def webhook_received(
+    request: Request,
+    db: Session = Depends(get_db),
+    services: Services = Depends(get_services)
+):
+    stripe_handler = services.stripe_handler
     payload = await request.body()
     sig_header = request.headers.get('Stripe-Signature')
 
@@ -133,6 +165,23 @@ async def success(request: Request):
 async def cancel(request: Request):
     return templates.TemplateResponse("cancel.html", {"request": request})
 
+def get_user_recipe(db: Session, user_id: int, recipe_slug: str, *columns) -> Optional[Message]:
+    """
+    Look up a recipe by its owner and slug, through the (user_id, slug) index.
+    Recipes left without a user_id, because no user had their phone number
+    when it was backfilled, are found by slug alone so their old URLs keep
+    working; their slugs are unique among themselves.
+
+    :param columns: The only Message columns to load; any other is fetched if accessed.
+    """
+    query = db.query(Message)
+    if columns:
+        query = query.options(load_only(*columns))
+    message = query.filter(Message.user_id == user_id, Message.slug == recipe_slug).first()
+    if message is None:
+        message = query.filter(Message.user_id.is_(None), Message.slug == recipe_slug).first()
+    return message
+
 @app.get("/yaya{user_id}/{recipe_slug}")
 async def get_transcription(
     user_id: int,
@@ -141,7 +190,7 @@ async def get_transcription(
     db: Session = Depends(get_db)
 ):
     try:
-        message = db.query(Message).filter(Message.slug == recipe_slug).first()
+        message = get_user_recipe(db, user_id, recipe_slug, Message.encrypted_text, Message.is_private, Message.hash)
         if not message:
             raise HTTPException(status_code=404, detail="Recipe not found")
             
@@ -202,7 +251,7 @@ async def get_user_recipes(
 ):
     try:
         # Get user from database
-        user = db.query(User).filter(User.id == user_id).first()
+        user = db.get(User, user_id)
         if not user:
             return templates.TemplateResponse("recipe_index.html", {
                 "request": request,
@@ -213,8 +262,10 @@ async def get_user_recipes(
 
         # Get all messages for this user
         is_verified = request.session.get(f"verified_{user_id}", False)
+        # Only the listing fields are loaded; the recipe bodies stay encrypted in the database
         messages_query = db.query(Message)\
-            .filter(Message.phone_number == user.phone_number)
+            .options(load_only(Message.slug, Message.encrypted_title, Message.created_at))\
+            .filter(Message.user_id == user.id)
 
         if not is_verified:
             messages_query = messages_query.filter(Message.is_private == False)
@@ -223,9 +274,8 @@ async def get_user_recipes(
 
         recipes = []
         for message in messages:
-            first_line = message.text.splitlines()[0].replace('# ', '') if message.text else "Sin título"
             recipes.append({
-                "title": first_line,
+                "title": message.title or DEFAULT_TITLE,
                 "url": f"/yaya{user_id}/{message.slug}",
                 "created_at": message.created_at
             })
@@ -233,6 +283,7 @@ async def get_user_recipes(
         return templates.TemplateResponse("recipe_index.html", {
             "request": request,
             "recipes": recipes,
+            "user_id": user_id,
             "error_message": None,
             "whatsapp_link": WHATSAPP_LINK
         })
@@ -246,6 +297,47 @@ async def get_user_recipes(
             "whatsapp_link": WHATSAPP_LINK
         })
 
+@app.get("/search/{user_id}")
+async def search_user_recipes(
+    user_id: int,
+    request: Request,
+    q: str = "",
+    db: Session = Depends(get_db),
+    services: Services = Depends(get_services)
+):
+    query = " ".join(q.split())
+    if not query:
+        return RedirectResponse(f"/yaya{user_id}", status_code=302)
+    try:
+        # Private recipes only show to a verified owner, as in the listing
+        is_verified = request.session.get(f"verified_{user_id}", False)
+        messages = await services.recipe_search.search(db, user_id, query, include_private=is_verified)
+        recipes = [{
+            "title": message.title or DEFAULT_TITLE,
+            "url": f"/yaya{user_id}/{message.slug}",
+            "created_at": message.created_at
+        } for message in messages]
+
+        return templates.TemplateResponse("recipe_index.html", {
+            "request": request,
+            "recipes": recipes,
+            "user_id": user_id,
+            "search_query": query,
+            "error_message": None,
+            "whatsapp_link": WHATSAPP_LINK
+        })
+
+    except Exception as e:
+        logger.error(f"Error searching recipes for user {user_id}: {str(e)}")
+        return templates.TemplateResponse("recipe_index.html", {
+            "request": request,
+            "recipes": [],
+            "user_id": user_id,
+            "search_query": query,
+            "error_message": "Ha ocurrido un error al buscar las recetas",
+            "whatsapp_link": WHATSAPP_LINK
+        })
+
 @app.get("/edit/{user_id}/{recipe_slug}")
 async def edit_recipe_page(
     user_id: int,
@@ -255,7 +347,7 @@ async def edit_recipe_page(
 ):
     try:
         # Get recipe from database
-        message = db.query(Message).filter(Message.slug == recipe_slug).first()
+        message = get_user_recipe(db, user_id, recipe_slug, Message.encrypted_text, Message.is_private)
         if not message:
             raise HTTPException(status_code=404, detail="Recipe not found")
             
@@ -292,15 +384,16 @@ async def update_recipe(
     user_id: int,
     recipe_slug: str,
     request: Request,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    services: Services = Depends(get_services)
 ):
     try:
         form = await request.form()
         recipe_text = form.get("recipe_text")
         is_private = form.get("is_private") == "true"  # Checkbox value
         
-        # Get recipe from database
-        message = db.query(Message).filter(Message.slug == recipe_slug).first()
+        # Get recipe from database; the old text is only compared with the new one
+        message = get_user_recipe(db, user_id, recipe_slug, Message.encrypted_text, Message.is_private)
         if not message:
             raise HTTPException(status_code=404, detail="Recipe not found")
             
@@ -313,8 +406,13 @@ async def update_recipe(
                 status_code=302
             )
         
-        # Update recipe
-        message.text = recipe_text
+        # Update recipe; an edited text is embedded again so search finds it by its new content
+        if recipe_text != message.text:
+            message.text = recipe_text
+            try:
+                message.embedding = await services.llm_handler.generate_embedding(recipe_text)
+            except Exception as e:
+                logger.warning(f"Keeping the previous embedding of recipe {message.id}: {str(e)}")
         message.is_private = is_private
         db.commit()
         
@@ -375,7 +473,10 @@ async def view_shared_recipe(
     db: Session = Depends(get_db)
 ):
     # Get recipe by hash
-    message = db.query(Message).filter(Message.hash == hash).first()
+    message = db.query(Message)\
+        .options(load_only(Message.encrypted_text))\
+        .filter(Message.hash == hash)\
+        .first()
     if not message:
         raise HTTPException(status_code=404, detail="Recipe not found")
         
@@ -397,7 +498,11 @@ async def login_page(request: Request):
     })
 
 @app.post("/login")
-async def login(request: Request, db: Session = Depends(get_db)):
+async def login(
+    request: Request,
+    db: Session = Depends(get_db),
+    services: Services = Depends(get_services)
+):
     form = await request.form()
     phone_number = form.get("phone_number")
     
@@ -416,7 +521,7 @@ async def login(request: Request, db: Session = Depends(get_db)):
         db.commit()
     
     # Generate and store verification code
-    auth_handler = AuthHandler()
+    auth_handler = services.auth_handler
     code = auth_handler.generate_verification_code()
     request.session[f"pending_login_{phone_number}"] = code
     
@@ -495,7 +600,7 @@ async def delete_recipe(
         raise HTTPException(status_code=403, detail="Not authorized")
     
     # Get the recipe
-    message = db.query(Message).filter(Message.slug == recipe_slug).first()
+    message = get_user_recipe(db, user_id, recipe_slug, Message.id, Message.user_id)
     if not message:
         raise HTTPException(status_code=404, detail="Recipe not found")
     
@@ -513,4 +618,7 @@ print(f"CONNECTED TO DATABASE: {DATABASE_URL}")
 app.add_middleware(
     SessionMiddleware,
     secret_key="your-secret-key"  # Use environment variable in production
-)
\ No newline at end of file
+)
+
+# Outermost, so request latency includes every other middleware
+app.add_middleware(HTTPMetricsMiddleware)
\ No newline at end of file
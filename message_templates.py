@@ -11,13 +11,22 @@ MESSAGE_TEMPLATES = {
 ¡Empieza enviándome tu primera receta! 🌟""",
     "welcome_with_transcription": "👋 ¡Bienvenido/a a Yayarecetas! Veo que ya has enviado un mensaje de voz. ¡Genial! Estoy preparando tu receta ahora mismo. Te llegará por WhatsApp y además podrás verla en ayarecetas.com 📝",
     "processing_confirmation": "🎙️ ¡Receta recibida! La estoy escribiendo ahora mismo. En un momento te la envío. ⏳✨",
+    "voice_queue_busy": "🎙️ ¡Receta recibida! Ahora mismo tengo la cocina llena de recetas 👩‍🍳, pero la tuya ya está en la cola. Te la envío en cuanto esté lista. ⏳✨",
+    "voice_message_too_long": "¡Uy! 😅 Ese mensaje de voz es demasiado largo para mí. ¿Puedes enviarme la receta en mensajes de voz más cortos? 🎙️✨",
     "unsupported_media": "¡Ups! 😅 Por ahora solo puedo procesar mensajes de voz. Por favor, cuéntame tu receta en un mensaje de voz y ¡estaré encantada de organizarla! 🎙️✨",
     "transcription": "🧑‍🍳 ```TU RECETA DE YAYARECETAS:```\n\n{transcription}\n--------------\n```¿TE GUSTÓ ESTA RECETA? ¡PRUEBA YAYARECETAS! https://bit.ly/Yayarecetas\u200B```",
     "long_transcription_initial": "📝 ¡Aquí está tu receta!\n\n✨ Puedes verla completa aquí: {transcription_url}\n\n👩‍🍳 Todas tus recetas las encontrarás aquí: {user_recipes_url}\n\nY ahora te la enviaré por WhatsApp ❤️:",
     "long_transcription_summary": "```[RECETA ORGANIZADA CON YAYARECETAS 👩‍🍳]```\n\n{summary}\n\n--------------\n```¿TE GUSTÓ ESTA RECETA? ¡PRUEBA YAYARECETAS! https://bit.ly/Yayarecetas\u200B```",
+    "recipe_section_first": "🧑‍🍳 ```TU RECETA DE YAYARECETAS:```\n\n{section}",
+    "recipe_section": "{section}",
+    "recipe_section_last": "{section}\n--------------\n```¿TE GUSTÓ ESTA RECETA? ¡PRUEBA YAYARECETAS! https://bit.ly/Yayarecetas\u200B```",
+    "recipe_link": "📝 ¡Tu receta ya está guardada!\n\n✨ Puedes verla completa aquí: {transcription_url}\n\n👩‍🍳 Todas tus recetas las encontrarás aquí: {user_recipes_url}",
     "split_transcription_initial": "Te la paso en {total_parts} partes:",
     "split_transcription_part": "Parte {part_number}/{total_parts}:\n\n{transcription}",
     "ai_response": "{response}",
+    "search_results": "🔎 Esto es lo que he encontrado para «{query}»:\n\n{results}\n\n👩‍🍳 Todas tus recetas: {user_recipes_url}",
+    "search_result": "📝 {title}: {url}",
+    "search_no_results": "🔎 No he encontrado ninguna receta tuya para «{query}». ¿Me la envías en un mensaje de voz? 🎙️✨",
     "verification_code": """🔐 Tu código de verificación para Yayarecetas es:
 
 *{code}*
@@ -25,6 +34,34 @@ MESSAGE_TEMPLATES = {
 Este código expira en 5 minutos.""",
 }
 
+# Pre-written replies to common text messages, picked at random so they don't
+# sound repetitive (handlers/text_intents.py). {payment_link} is filled in.
+INTENT_REPLIES = {
+    "greeting": [
+        "¡Hola! 👋 ¿Tienes alguna receta familiar que quieras guardar? Envíamela en un mensaje de voz y la organizo para ti 🎙️✨",
+        "¡Qué alegría verte por aquí! 😊 Cuéntame tu receta en un mensaje de voz y te la devuelvo bien escrita 👩‍🍳",
+        "¡Hola, hola! 🍳 Estoy lista para cocinar contigo. Mándame una receta por audio y la guardo para siempre 📝",
+        "¡Buenas! 👩‍🍳 ¿Qué receta de la familia guardamos hoy? Solo tienes que enviármela en un mensaje de voz 🎙️",
+    ],
+    "thanks": [
+        "¡A ti! 😊 Cuando quieras, mándame otra receta en un mensaje de voz 🎙️",
+        "¡Un placer! 👩‍🍳 Aquí estaré para la próxima receta ✨",
+        "¡De nada! 🥰 Que la disfrutes, y si tienes otra receta familiar, ya sabes dónde estoy 🎙️",
+        "¡Me alegro mucho! 😊 Las recetas de casa son un tesoro. ¿Guardamos otra? 📝",
+    ],
+    "how_it_works": [
+        """¡Es muy fácil! 👩‍🍳
+1. Envíame un mensaje de voz contando tu receta 🎙️
+2. Yo la escribo ordenada, con ingredientes y pasos 📝
+3. Te la mando por aquí y la guardo en tu página de recetas ✨""",
+        "¡Muy sencillo! 🎙️ Cuéntame tu receta en un mensaje de voz, como se la contarías a un nieto, y yo te la devuelvo escrita y ordenada, lista para guardar 📝✨",
+    ],
+    "pricing": [
+        "Con la suscripción a Yayarecetas puedes enviarme todas las recetas que quieras y tenerlas siempre guardadas 👩‍🍳✨ Puedes suscribirte aquí: {payment_link}",
+        "¡Guardar las recetas de la familia es fácil! 📝 Aquí tienes los detalles de la suscripción y puedes apuntarte: {payment_link}",
+    ],
+}
+
 def get_message_template(template_key: str) -> str:
     """Get message template by key"""
     return MESSAGE_TEMPLATES.get(template_key, "Template not found")
\ No newline at end of file
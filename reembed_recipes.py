@@ -0,0 +1,55 @@
+# reembed_recipes.py recomputes the embedding of every stored recipe through the
+# batching EmbeddingService, e.g. after changing EMBEDDING_MODEL.
+# Run with: python reembed_recipes.py [--batch-size 256] [--missing-only]
+import argparse
+import asyncio
+import logging
+import time
+
+from sqlalchemy.orm import load_only
+
+from database import Message, SessionLocal
+from handlers.embedding_service import EmbeddingService
+from handlers.openai_client import close_openai_client, get_openai_client
+from config import LOG_LEVEL
+
+logging.basicConfig(
+    level=LOG_LEVEL,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+async def reembed(batch_size: int, missing_only: bool):
+    service = EmbeddingService(client=get_openai_client(), max_batch_size=batch_size)
+    db = SessionLocal()
+    last_id = 0
+    total = 0
+    started = time.perf_counter()
+    try:
+        while True:
+            query = db.query(Message)\
+                .options(load_only(Message.id, Message.encrypted_text))\
+                .filter(Message.id > last_id)
+            if missing_only:
+                query = query.filter(Message.embedding.is_(None))
+            messages = query.order_by(Message.id).limit(batch_size).all()
+            if not messages:
+                break
+            vectors = await service.embed_many([message.text for message in messages])
+            for message, vector in zip(messages, vectors):
+                message.embedding = vector
+            db.commit()
+            last_id = messages[-1].id
+            total += len(messages)
+            logger.info(f"Re-embedded {total} recipes ({total / (time.perf_counter() - started):.1f}/s)")
+    finally:
+        db.close()
+        await close_openai_client()
+    logger.info(f"Done: {total} recipes, {service.stats()}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Recompute recipe embeddings in batches")
+    parser.add_argument("--batch-size", type=int, default=256)
+    parser.add_argument("--missing-only", action="store_true")
+    args = parser.parse_args()
+    asyncio.run(reembed(args.batch_size, args.missing_only))
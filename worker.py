@@ -0,0 +1,29 @@
+# worker.py runs voice job workers without the web server, so transcription can be
+# scaled out on separate nodes. Start with: python worker.py
+import asyncio
+import logging
+import signal
+
+from handlers.services import Services
+from config import LOG_LEVEL
+
+logging.basicConfig(
+    level=LOG_LEVEL,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+async def main():
+    services = Services()
+    stop_requested = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop_requested.set)
+
+    await services.start()
+    logger.info("Voice worker running")
+    await stop_requested.wait()
+    await services.close()
+
+if __name__ == "__main__":
+    asyncio.run(main())